@@ -0,0 +1,222 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import torch
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def current_rss_mb() -> float:
+    statm = Path("/proc/self/statm")
+    if statm.exists():
+        resident_pages = int(statm.read_text().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2**20
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """
+    RSS đỉnh của tiến trình (MB); 0 khi hệ điều hành không cho đọc (Windows
+    không có psutil), lúc đó batcher chỉ dựa vào lỗi OOM để lùi.
+    """
+
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS reports bytes, Linux kilobytes.
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        # Windows exposes the peak working set; elsewhere current RSS is the best bound.
+        return getattr(info, "peak_wset", info.rss) / 2**20
+    return 0.0
+
+
+# Measured batches in flight across all batchers. Memory counters are
+# process- or device-wide, so a reading taken while another measured batch
+# overlapped it mixes both and is not used as an estimate.
+_measure_lock = threading.Lock()
+_measuring = 0
+_measure_starts = 0
+
+
+def _begin_measure() -> Tuple[bool, int]:
+    global _measuring, _measure_starts
+    with _measure_lock:
+        _measuring += 1
+        _measure_starts += 1
+        return _measuring == 1, _measure_starts
+
+
+def _end_measure(alone: bool, started_as: int) -> bool:
+    # True when no other measured batch ran at any point during this one.
+    global _measuring
+    with _measure_lock:
+        _measuring -= 1
+        return alone and _measure_starts == started_as
+
+
+def _memory_mb(cuda: bool) -> Tuple[float, float]:
+    # (current, peak) without resetting the peak, which other batches read too.
+    if cuda:
+        return torch.cuda.memory_allocated() / 2**20, torch.cuda.max_memory_allocated() / 2**20
+    return current_rss_mb(), peak_rss_mb()
+
+
+def is_oom_error(exc: BaseException) -> bool:
+    if isinstance(exc, MemoryError):
+        return True
+    if isinstance(exc, getattr(torch.cuda, "OutOfMemoryError", ())):
+        return True
+    return isinstance(exc, RuntimeError) and "out of memory" in str(exc).lower()
+
+
+@dataclass
+class BatchStats:
+    rows: int
+    tokens: int
+    seconds: float
+    activation_mb: float
+    rss_mb: float
+
+
+class AdaptiveBatcher:
+    """
+    Chọn kích thước batch và token budget theo ngân sách bộ nhớ cho các batch
+    của một lần phân tích (không tính bộ nhớ của phiên khác trong tiến trình).
+    Sau mỗi batch, phần bộ nhớ tăng thêm trong lúc nó chạy (CUDA hoặc RSS) cập
+    nhật ước lượng MB/token; batch tiếp theo lấy vừa phần ngân sách chưa bị
+    các batch đang chạy của chính lần phân tích này giữ. Khi gần OOM, batcher
+    lùi một nửa và chỉ chạy lại đúng đoạn bị lỗi.
+    """
+
+    def __init__(
+        self,
+        memory_budget_mb: float,
+        initial_batch: int = 32,
+        min_batch: int = 1,
+        max_batch: int = 512,
+        target_fraction: float = 0.8,
+        history: int = 1000,
+    ) -> None:
+        self.memory_budget_mb = memory_budget_mb
+        self.batch_size = initial_batch
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.target_fraction = target_fraction
+        self.per_token_mb: Optional[float] = None
+        self.token_cap: Optional[int] = None
+        self.backoffs = 0
+        self.stats: Deque[BatchStats] = deque(maxlen=history)
+        # Estimated MB of this batcher's batches currently running.
+        self._reserved_mb = 0.0
+        # Pipelined batches run the aspect and sentiment forwards concurrently.
+        self._lock = threading.Lock()
+
+    def _headroom_mb(self) -> float:
+        headroom = max(self.memory_budget_mb - self._reserved_mb, 0.0)
+        if torch.cuda.is_available():
+            free, _ = torch.cuda.mem_get_info()
+            headroom = min(headroom, free / 2**20)
+        return headroom * self.target_fraction
+
+    def plan(self, sorted_lengths: np.ndarray, start: int) -> int:
+        """
+        Trả về `end` của batch kế tiếp bắt đầu tại `start` (độ dài tăng dần).
+        """
+
+        n = len(sorted_lengths)
+        token_cap = self.token_cap
+        if self.per_token_mb:
+            fits = int(self._headroom_mb() / self.per_token_mb)
+            token_cap = fits if token_cap is None else min(token_cap, fits)
+        end = min(n, start + self.batch_size)
+        if token_cap is not None:
+            while end - start > 1 and (end - start) * sorted_lengths[end - 1] > token_cap:
+                end -= 1
+        return end
+
+    @contextmanager
+    def measure(self, rows: int, tokens: int) -> Iterator[None]:
+        reserve = (self.per_token_mb or 0.0) * tokens
+        with self._lock:
+            self._reserved_mb += reserve
+        cuda = torch.cuda.is_available()
+        alone, started_as = _begin_measure()
+        before, peak_before = _memory_mb(cuda)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._reserved_mb -= reserve
+            alone = _end_measure(alone, started_as)
+        seconds = time.perf_counter() - started
+        after, peak_after = _memory_mb(cuda)
+        activation = 0.0
+        if alone:
+            # A new peak means this batch set it; otherwise the delta is the
+            # best (lower-bound) estimate without resetting the peak.
+            peak = peak_after if peak_after > peak_before else after
+            activation = max(peak - before, 0.0)
+        self._record(BatchStats(rows, tokens, seconds, activation, current_rss_mb()))
+
+    def _record(self, stats: BatchStats) -> None:
+        with self._lock:
+            self._update(stats)
+
+    def _update(self, stats: BatchStats) -> None:
+        self.stats.append(stats)
+        if stats.activation_mb > 0 and stats.tokens:
+            observed = stats.activation_mb / stats.tokens
+            self.per_token_mb = (
+                observed
+                if self.per_token_mb is None
+                else 0.7 * self.per_token_mb + 0.3 * observed
+            )
+        # This batch's own share of the budget, not the process-wide RSS.
+        used = max(stats.activation_mb, (self.per_token_mb or 0.0) * stats.tokens)
+        usage = used / self.memory_budget_mb if self.memory_budget_mb else 0.0
+        if usage > 0.9:
+            self.batch_size = max(self.min_batch, self.batch_size // 2)
+        elif usage < 0.6:
+            if stats.rows >= self.batch_size:
+                self.batch_size = min(self.max_batch, int(self.batch_size * 1.25) + 1)
+            if self.token_cap is not None:
+                self.token_cap = int(self.token_cap * 1.25) + 1
+
+    def back_off(self, rows: int, tokens: int) -> None:
+        with self._lock:
+            self.backoffs += 1
+            self.batch_size = max(self.min_batch, rows // 2)
+            self.token_cap = max(1, tokens // 2)
+            if self.per_token_mb:
+                self.per_token_mb *= 2
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "batches": len(self.stats),
+            "batch_size": self.batch_size,
+            "token_cap": self.token_cap or 0,
+            "per_token_mb": self.per_token_mb or 0.0,
+            "peak_activation_mb": max((s.activation_mb for s in self.stats), default=0.0),
+            "peak_rss_mb": max((s.rss_mb for s in self.stats), default=0.0),
+            "backoffs": self.backoffs,
+        }
@@ -0,0 +1,454 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Upper bound on points sent to the browser for a single chart.
+MAX_CHART_POINTS = 2000
+
+NEG_LABELS = ("NEG", "NEGATIVE")
+POS_LABELS = ("POS", "POSITIVE")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: chọn `n_out` điểm giữ hình dạng chuỗi.
+    Trả về vị trí (theo thứ tự tăng dần) của các điểm được giữ lại.
+    """
+
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (n_out - 2)
+    # Bucket i covers [edges[i], edges[i + 1]) for i in 0..n_out-3.
+    edges = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bx = x[start:end]
+        by = y[start:end]
+        area = np.abs(
+            (x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Giữ điểm nhỏ nhất và lớn nhất của mỗi bucket (tối đa `n_out` điểm).
+    """
+
+    n = len(y)
+    n_buckets = max(1, n_out // 2)
+    if n <= n_out:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    bucket = np.arange(n, dtype=np.int64) * n_buckets // n
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets), side="left")
+    ends = np.append(starts[1:], n)
+    keep = np.concatenate([order[starts], order[ends - 1]])
+    return np.unique(keep)
+
+
+def downsample_frame(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    max_points: int = MAX_CHART_POINTS,
+    method: str = "lttb",
+    group: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Giảm số điểm của `df` xuống tối đa `max_points` trước khi vẽ biểu đồ.
+    Nếu có `group`, ngân sách điểm được chia theo tỉ lệ kích thước từng nhóm
+    (mỗi nhóm ít nhất 3 điểm để vẫn giữ được hình dạng đường); khi có quá
+    nhiều nhóm so với ngân sách thì bỏ các nhóm nhỏ nhất.
+    """
+
+    if len(df) <= max_points:
+        return df
+
+    def _pick(part: pd.DataFrame, budget: int) -> pd.DataFrame:
+        budget = max(3, budget)
+        if method == "minmax":
+            idx = minmax_indices(part[y].to_numpy(), budget)
+        else:
+            idx = lttb_indices(part[x].to_numpy(), part[y].to_numpy(), budget)
+        return part.iloc[idx]
+
+    if group is None:
+        return _pick(df, max_points)
+
+    groups = sorted(
+        (part for _, part in df.groupby(group, sort=False)), key=len, reverse=True
+    )
+    sizes = np.array([len(part) for part in groups], dtype=np.int64)
+    floors = np.minimum(sizes, 3)
+    # Largest groups first; whatever no longer fits its floor is left out.
+    kept = int(np.searchsorted(np.cumsum(floors), max_points, side="right"))
+    sizes, floors = sizes[:kept], floors[:kept]
+    spare = sizes - floors
+    extra = max_points - int(floors.sum())
+    budgets = floors + (extra * spare // max(int(spare.sum()), 1))
+    parts = [_pick(part, int(budget)) for part, budget in zip(groups, budgets)]
+    if not parts:
+        return df.iloc[:0]
+    plotted = pd.concat(parts).sort_values(x)
+    # Budgets already add up to at most `max_points`; this only guards it.
+    return plotted.iloc[:max_points]
+
+
+def rolling_sentiment(
+    df: pd.DataFrame,
+    window: int,
+    score_col: str = "sentiment_score",
+    label_col: str = "sentiment_label",
+) -> pd.DataFrame:
+    """
+    Tính confidence trung bình và tỉ lệ NEG trên cửa sổ trượt `window` review.
+    """
+
+    window = max(1, int(window))
+    is_neg = df[label_col].astype(str).str.upper().isin(NEG_LABELS).astype(float)
+    rolled = pd.DataFrame(
+        {
+            "index": np.arange(1, len(df) + 1),
+            "mean_confidence": df[score_col]
+            .astype(float)
+            .rolling(window, min_periods=1)
+            .mean()
+            .to_numpy(),
+            "neg_share": is_neg.rolling(window, min_periods=1).mean().to_numpy(),
+        }
+    )
+    return rolled
+
+
+def downsample_rolling(
+    rolled: pd.DataFrame, max_points: int = MAX_CHART_POINTS
+) -> pd.DataFrame:
+    if len(rolled) <= max_points:
+        return rolled
+    x = rolled["index"].to_numpy()
+    half = max(3, max_points // 2)
+    keep = np.union1d(
+        lttb_indices(x, rolled["mean_confidence"].to_numpy(), half),
+        lttb_indices(x, rolled["neg_share"].to_numpy(), half),
+    )
+    return rolled.iloc[keep]
+
+
+SENTIMENT_ALIASES = {"NEGATIVE": "NEG", "POSITIVE": "POS", "NEUTRAL": "NEU"}
+
+
+def canonical_sentiment(label: Optional[str]) -> str:
+    if not label:
+        return "NEU"
+    upper = str(label).upper()
+    return SENTIMENT_ALIASES.get(upper, upper)
+
+
+def parse_review_dates(
+    values: Sequence[object],
+    date_format: Optional[str] = None,
+    dayfirst: bool = True,
+) -> Tuple[pd.Series, int]:
+    """
+    Đọc cột ngày review. Có `date_format` (ví dụ "%d/%m/%Y") thì chỉ theo
+    định dạng đó; không thì nhận dạng ISO (yyyy-mm-dd) trước, phần còn lại
+    đoán với `dayfirst` (mặc định ngày trước tháng như dd/mm/yyyy, nên 03/04
+    là ngày 3 tháng 4). Trả về ngày (NaT nếu không đọc được) và số dòng có
+    giá trị nhưng không đọc được.
+    """
+
+    raw = pd.Series(values).reset_index(drop=True)
+    if pd.api.types.is_datetime64_any_dtype(raw):
+        return raw, 0
+    if date_format:
+        dates = pd.to_datetime(raw, format=date_format, errors="coerce")
+    else:
+        dates = pd.to_datetime(raw, format="ISO8601", errors="coerce")
+        rest = dates.isna() & raw.notna()
+        if rest.any():
+            # Parsed one by one: files mixing layouts would otherwise be
+            # read with whatever format the first value suggests.
+            dates[rest] = pd.to_datetime(
+                raw[rest], format="mixed", dayfirst=dayfirst, errors="coerce"
+            )
+    present = raw.notna() & raw.astype(str).str.strip().ne("")
+    return dates, int((dates.isna() & present).sum())
+
+
+def aspect_stats(
+    aspects: Sequence[str],
+    sentiments: Sequence[Optional[str]],
+    sentiment_scores: Sequence[Optional[float]],
+) -> pd.DataFrame:
+    """
+    Số lượt nhắc, số NEG/POS và confidence trung bình theo aspect từ các mảng
+    phẳng review × aspect; cùng cột với `ResultsStore.aspect_stats` (trừ `run_id`).
+    """
+
+    canonical = pd.Series([canonical_sentiment(s) for s in sentiments], dtype=object)
+    detail = pd.DataFrame(
+        {
+            "aspect": pd.Series(aspects, dtype=object),
+            "is_neg": canonical == "NEG",
+            "is_pos": canonical == "POS",
+            "score": pd.Series(sentiment_scores, dtype=float).fillna(0.0),
+        }
+    )
+    return (
+        detail.groupby("aspect")
+        .agg(
+            mentions=("aspect", "count"),
+            neg=("is_neg", "sum"),
+            pos=("is_pos", "sum"),
+            avg_score=("score", "mean"),
+        )
+        .reset_index()
+    )
+
+
+def aspect_stats_from_frame(analysis_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Như `aspect_stats` nhưng đọc cột `aspects_detail` của bảng kết quả.
+    """
+
+    details = [
+        d for items in analysis_df["aspects_detail"] if isinstance(items, list)
+        for d in items
+    ]
+    return aspect_stats(
+        [d.get("aspect") for d in details],
+        [d.get("sentiment") for d in details],
+        [d.get("sentiment_score") for d in details],
+    )
+
+
+@dataclass
+class ExemplarIndex:
+    """
+    Top-k review tiêu biểu cho từng cặp (aspect, sentiment).
+    Mọi nhóm nằm chung trong hai mảng phẳng `rows`/`weights`; `slots` giữ
+    vị trí [start, end) của từng nhóm nên tra cứu là O(1).
+    """
+
+    k: int
+    rows: np.ndarray
+    weights: np.ndarray
+    slots: Dict[Tuple[str, str], Tuple[int, int]] = field(default_factory=dict)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        row_ids: Sequence[int],
+        aspects: Sequence[str],
+        sentiments: Sequence[Optional[str]],
+        weights: Sequence[float],
+        k: int = 3,
+    ) -> "ExemplarIndex":
+        """
+        Xây index từ các mảng phẳng (mỗi phần tử là một cặp review × aspect).
+        `weights` nên là aspect_score * sentiment_score, cùng trọng số với
+        `ABSAService.aggregate_sentiment`.
+        """
+
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        if row_ids.size == 0:
+            return cls(
+                k=k,
+                rows=np.empty(0, dtype=np.int64),
+                weights=np.empty(0, dtype=np.float32),
+            )
+
+        weights = np.nan_to_num(np.asarray(weights, dtype=np.float64))
+        aspect_codes, aspect_names = pd.factorize(pd.Series(aspects, dtype=object))
+        sentiment_codes, sentiment_names = pd.factorize(
+            pd.Series([canonical_sentiment(s) for s in sentiments], dtype=object)
+        )
+        group = aspect_codes.astype(np.int64) * len(sentiment_names) + sentiment_codes
+
+        # Group-major, highest weight first inside each group.
+        order = np.lexsort((-weights, group))
+        sorted_group = group[order]
+        boundaries = np.flatnonzero(np.r_[True, sorted_group[1:] != sorted_group[:-1]])
+        sizes = np.diff(np.r_[boundaries, len(order)])
+        rank = np.arange(len(order)) - np.repeat(boundaries, sizes)
+        keep = order[rank < k]
+
+        kept_group = group[keep]
+        kept_starts = np.flatnonzero(np.r_[True, kept_group[1:] != kept_group[:-1]])
+        kept_ends = np.r_[kept_starts[1:], len(keep)]
+        slots: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        n_sentiments = len(sentiment_names)
+        for start, end in zip(kept_starts.tolist(), kept_ends.tolist()):
+            code = int(kept_group[start])
+            key = (
+                str(aspect_names[code // n_sentiments]),
+                str(sentiment_names[code % n_sentiments]),
+            )
+            slots[key] = (start, end)
+
+        return cls(
+            k=k,
+            rows=row_ids[keep],
+            weights=weights[keep].astype(np.float32),
+            slots=slots,
+        )
+
+    @classmethod
+    def from_frame(cls, analysis_df: pd.DataFrame, k: int = 3) -> "ExemplarIndex":
+        """
+        Dựng lại index từ cột `aspects_detail` (dùng khi session cũ chưa có index).
+        """
+
+        lengths = analysis_df["aspects_detail"].map(
+            lambda d: len(d) if isinstance(d, list) else 0
+        ).to_numpy()
+        details = [
+            d for items in analysis_df["aspects_detail"] if isinstance(items, list)
+            for d in items
+        ]
+        return cls.from_arrays(
+            row_ids=np.repeat(np.arange(len(analysis_df)), lengths),
+            aspects=[d.get("aspect") for d in details],
+            sentiments=[d.get("sentiment") for d in details],
+            weights=[
+                (d.get("aspect_score") or 0) * (d.get("sentiment_score") or 0)
+                for d in details
+            ],
+            k=k,
+        )
+
+    def lookup(self, aspect: str, sentiment: str) -> np.ndarray:
+        """
+        Vị trí (iloc) các review tiêu biểu, confidence giảm dần.
+        """
+
+        slot = self.slots.get((aspect, canonical_sentiment(sentiment)))
+        if slot is None:
+            return self.rows[:0]
+        return self.rows[slot[0] : slot[1]]
+
+
+# Key of the co-occurrence matrix that ignores aspect sentiment.
+ANY_SENTIMENT = "ALL"
+
+
+@dataclass
+class AspectCooccurrence:
+    """
+    Số review nhắc cùng lúc hai aspect, tách theo sentiment của aspect.
+    `counts[s] = A_sᵀ·A_s` với `A_s` là ma trận chỉ báo thưa review × aspect
+    (1 nếu review nhắc aspect với sentiment `s`); đường chéo là số review nhắc
+    từng aspect. `counts[ANY_SENTIMENT]` bỏ qua sentiment.
+    """
+
+    aspects: List[str]
+    counts: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        n_rows: int,
+        row_ids: Sequence[int],
+        aspects: Sequence[str],
+        sentiments: Sequence[Optional[str]],
+    ) -> "AspectCooccurrence":
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        aspect_codes, aspect_names = pd.factorize(pd.Series(aspects, dtype=object))
+        sentiment_codes, sentiment_names = pd.factorize(
+            pd.Series(sentiments, dtype=object).fillna("")
+        )
+        # Canonicalise the few distinct labels, not every entry.
+        canonical = np.asarray(
+            [canonical_sentiment(name) for name in sentiment_names], dtype=object
+        )
+        entry_sentiments = canonical[sentiment_codes] if len(canonical) else canonical
+
+        n_aspects = len(aspect_names)
+        groups = {ANY_SENTIMENT: np.ones(len(row_ids), dtype=bool)}
+        groups.update({label: entry_sentiments == label for label in sorted(set(canonical))})
+        counts = {}
+        for label, mask in groups.items():
+            indicator = sparse.csr_matrix(
+                (
+                    np.ones(int(mask.sum()), dtype=np.int32),
+                    (row_ids[mask], aspect_codes[mask]),
+                ),
+                shape=(n_rows, n_aspects),
+            )
+            # Duplicate (review, aspect) entries were summed; keep it an indicator.
+            indicator.data[:] = 1
+            counts[label] = (indicator.T @ indicator).toarray().astype(np.int64)
+        return cls(aspects=[str(name) for name in aspect_names], counts=counts)
+
+    @classmethod
+    def from_frame(cls, analysis_df: pd.DataFrame) -> "AspectCooccurrence":
+        """
+        Dựng lại từ cột `aspects_detail` (dùng khi session cũ chưa có ma trận).
+        """
+
+        details = analysis_df["aspects_detail"].map(
+            lambda d: d if isinstance(d, list) else []
+        )
+        flat = [d for items in details for d in items]
+        return cls.from_arrays(
+            len(analysis_df),
+            row_ids=np.repeat(np.arange(len(analysis_df)), details.map(len).to_numpy()),
+            aspects=[d.get("aspect") for d in flat],
+            sentiments=[d.get("sentiment") for d in flat],
+        )
+
+    def matrix(self, sentiment: str = ANY_SENTIMENT) -> pd.DataFrame:
+        counts = self.counts.get(sentiment)
+        if counts is None:
+            counts = np.zeros((len(self.aspects), len(self.aspects)), dtype=np.int64)
+        return pd.DataFrame(counts, index=self.aspects, columns=self.aspects)
+
+    def top_pairs(self, sentiment: str = ANY_SENTIMENT, n: int = 10) -> pd.DataFrame:
+        """
+        Các cặp aspect hay đi cùng nhau nhất, kèm tỉ lệ review nhắc aspect
+        này cũng nhắc aspect kia (theo từng chiều) và Jaccard.
+        """
+
+        columns = ["aspect_a", "aspect_b", "reviews", "share_of_a", "share_of_b", "jaccard"]
+        counts = self.counts.get(sentiment)
+        if counts is None or not len(counts):
+            return pd.DataFrame(columns=columns)
+        a, b = np.triu_indices(len(self.aspects), k=1)
+        both = counts[a, b]
+        keep = both > 0
+        a, b, both = a[keep], b[keep], both[keep]
+        diag = np.diag(counts).astype(np.float64)
+        pairs = pd.DataFrame(
+            {
+                "aspect_a": np.asarray(self.aspects, dtype=object)[a],
+                "aspect_b": np.asarray(self.aspects, dtype=object)[b],
+                "reviews": both,
+                "share_of_a": both / diag[a],
+                "share_of_b": both / diag[b],
+                "jaccard": both / (diag[a] + diag[b] - both),
+            }
+        )[columns]
+        return pairs.sort_values(["reviews", "jaccard"], ascending=False).head(n)
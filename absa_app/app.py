@@ -1,24 +1,161 @@
 import base64
 import io
+import sqlite3
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Optional
 
 from PIL import Image
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.io as pio
 import streamlit as st
-from model_service import ABSAService, AspectPrediction, SentimentPrediction
+from analytics import (
+    ANY_SENTIMENT,
+    MAX_CHART_POINTS,
+    AspectCooccurrence,
+    ExemplarIndex,
+    aspect_stats,
+    aspect_stats_from_frame,
+    downsample_frame,
+    downsample_rolling,
+    rolling_sentiment,
+)
+from dedup import (
+    NearDuplicateGroups,
+    analyze_with_dedup,
+    find_near_duplicates,
+    validate_propagation,
+)
+from model_service import ABSAService, BatchOptions, BatchResult, SentimentPrediction
+from progressive import (
+    build_strata,
+    estimate_aspect_stats,
+    priority_ranking,
+    progressive_chunks,
+    stratified_order,
+)
+from triage import (
+    EMPTY,
+    LONG,
+    NORMAL,
+    TRIVIAL,
+    TriageResult,
+    analyze_triaged,
+    triage_texts,
+)
+from embedding_index import EmbeddingIndex
+from results_store import ResultsStore
+from scheduler import BULK, INTERACTIVE
+from text_index import TextIndex
+from trend_store import ALL_ASPECTS, TrendStore, build_daily_aggregates
 
 pio.templates.default = "plotly_dark"
 
+# Number of representative reviews kept per (aspect, sentiment) pair.
+EXEMPLARS_PER_ASPECT = 3
+# Rows per chunk flowing through the batch pipeline when it is enabled.
+PIPELINE_CHUNK_ROWS = 512
+# Rows shown under the keyword search box; the count covers every match.
+KEYWORD_RESULT_ROWS = 500
+# Review embeddings of each run, written when the "similar reviews" option is on.
+EMBEDDINGS_DIR = Path(__file__).resolve().parent / "data" / "embeddings"
+
 
 @st.cache_resource(show_spinner=True)
 def load_service() -> ABSAService:
     return ABSAService()
 
 
+@st.cache_resource(show_spinner=False)
+def load_trend_store() -> TrendStore:
+    return TrendStore()
+
+
+@st.cache_resource(show_spinner=False)
+def load_results_store() -> ResultsStore:
+    return ResultsStore()
+
+
+@st.cache_resource(show_spinner=False)
+def load_index_builder() -> ThreadPoolExecutor:
+    # Builds embedding indexes off the script run, one at a time for all sessions.
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-index")
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def open_embedding_index(run_id: str) -> EmbeddingIndex:
+    return EmbeddingIndex(EMBEDDINGS_DIR, run_id)
+
+
+def load_embedding_index(run_id: str) -> EmbeddingIndex | None:
+    # Checked outside the cache so a build that finishes later is picked up.
+    if not (EMBEDDINGS_DIR / f"{run_id}.json").exists():
+        return None
+    return open_embedding_index(run_id)
+
+
+def discard_embedding_index(run_id: str, build: Future | None) -> None:
+    """
+    Xoá chỉ mục embedding của run cũ trong phiên khi có run mới thay thế;
+    nếu nó còn đang được dựng thì xoá ngay khi dựng xong.
+    """
+
+    remove = lambda _=None: EmbeddingIndex.remove(EMBEDDINGS_DIR, run_id)
+    open_embedding_index.clear()
+    if build is not None and not build.done():
+        build.add_done_callback(remove)
+    else:
+        remove()
+
+
+@st.cache_data(show_spinner=False)
+def load_aspect_stats(run_ids: tuple[str, ...], store_version: float) -> pd.DataFrame:
+    return load_results_store().aspect_stats(run_ids)
+
+
+def run_label(run: pd.Series) -> str:
+    source = run["source_name"] or "upload"
+    label = f"{run['created_at']} · {source} · {int(run['n_reviews'])} review"
+    if run.get("model_version"):
+        label += f" · mô hình {run['model_version']}"
+    return label
+
+
+def select_run(
+    runs: pd.DataFrame, key: str, session_label: Optional[str] = None
+) -> Optional[str]:
+    """
+    Chọn một run; mặc định là run của phiên hiện tại. `session_label` thêm
+    run của phiên (chưa có trong kho) vào đầu danh sách. Phiên chưa phân tích
+    file thì không chọn sẵn run nào, vì run mới nhất có thể của người khác.
+    """
+
+    labels = {row["run_id"]: run_label(row) for _, row in runs.iterrows()}
+    current = st.session_state.get("run_id")
+    if session_label and current:
+        labels = {current: session_label, **labels}
+    run_ids = list(labels)
+    return st.selectbox(
+        "Lần phân tích",
+        run_ids,
+        index=run_ids.index(current) if current in labels else None,
+        format_func=labels.get,
+        placeholder="Chọn một lần phân tích đã lưu",
+        key=key,
+    )
+
+
+@st.cache_data(show_spinner=False)
+def load_trend(freq: str, store_version: float) -> pd.DataFrame:
+    return load_trend_store().trend(freq)
+
+
 TEAM_MEMBERS = [
     {"file": "Anh Tú.jpg", "name": "Anh Tú"},
     {"file": "Bảo Nguyên.jpg", "name": "Bảo Nguyên"},
@@ -345,11 +482,11 @@ def load_team_gallery() -> list[dict[str, str]]:
     return gallery
 
 
-def render_team_section() -> None:
+@st.cache_data(show_spinner=False)
+def team_section_html() -> str:
     gallery = load_team_gallery()
     if not gallery:
-        st.info("Chưa tìm thấy ảnh của các thành viên.")
-        return
+        return ""
     cards_html = "".join(
         [
             (
@@ -361,19 +498,197 @@ def render_team_section() -> None:
             for member in gallery
         ]
     )
-    st.markdown(
-        (
-            "<div class='team-showcase'>"
-            "<div class='team-showcase-header'>"
-            "<h3>Thành viên nhóm</h3>"
-            "</div>"
-            f"<div class='team-showcase-grid'>{cards_html}</div>"
-            "</div>"
+    return (
+        "<div class='team-showcase'>"
+        "<div class='team-showcase-header'>"
+        "<h3>Thành viên nhóm</h3>"
+        "</div>"
+        f"<div class='team-showcase-grid'>{cards_html}</div>"
+        "</div>"
+    )
+
+
+def render_team_section() -> None:
+    html = team_section_html()
+    if not html:
+        st.info("Chưa tìm thấy ảnh của các thành viên.")
+        return
+    st.markdown(html, unsafe_allow_html=True)
+
+
+@st.fragment(run_every=5)
+def scheduler_panel(service: ABSAService, admin: bool = False) -> None:
+    scheduler = service.scheduler
+    # The target is process-wide, so only the admin view may change it.
+    if admin:
+        scheduler.latency_target = (
+            st.number_input(
+                "Mục tiêu độ trễ cho phân tích câu (ms)",
+                min_value=50,
+                max_value=5000,
+                value=int(scheduler.latency_target * 1000),
+                step=50,
+                help="Áp dụng cho mọi người dùng. Khi có người dùng tab Phân tích câu, "
+                "batch của file đang chạy được thu nhỏ để một batch chỉ chiếm một nửa "
+                "mục tiêu này.",
+            )
+            / 1000
+        )
+    else:
+        st.caption(
+            f"Mục tiêu độ trễ cho phân tích câu: {scheduler.latency_target * 1000:.0f} ms."
+        )
+    depths = scheduler.queue_depths()
+    cap = scheduler.bulk_row_cap()
+    st.caption(
+        f"Đang chờ: {depths[INTERACTIVE]} request phân tích câu · {depths[BULK]} batch file. "
+        + (f"Batch file đang giới hạn {cap} câu." if cap else "Batch file chạy kích thước đầy đủ.")
+    )
+    st.dataframe(
+        scheduler.stats().style.format(
+            {
+                "wait_p50_ms": "{:.1f}",
+                "wait_p95_ms": "{:.1f}",
+                "latency_p50_ms": "{:.1f}",
+                "latency_p95_ms": "{:.1f}",
+                "within_target": "{:.0%}",
+            },
+            na_rep="-",
         ),
-        unsafe_allow_html=True,
+        use_container_width=True,
+        hide_index=True,
     )
 
 
+@contextmanager
+def session_profiling(service: ABSAService) -> Iterator[None]:
+    # Profiles this session's own next analysis once armed from the profiling
+    # panel; other sessions' calls on the shared service are never captured.
+    batches = st.session_state.get("profile_batches")
+    if batches is None:
+        yield
+        return
+    with service.profiling(batches) as profiler:
+        yield
+    if profiler.capture is not None:
+        st.session_state["last_profile"] = profiler.capture
+        del st.session_state["profile_batches"]
+
+
+@st.fragment
+def profiling_panel(service: ABSAService) -> None:
+    batches = st.number_input(
+        "Số batch ghi cho mỗi mô hình",
+        min_value=1,
+        max_value=200,
+        value=5,
+        help="Lệnh phân tích kế tiếp của phiên này (câu hoặc file) được chạy dưới "
+        "PyTorch profiler cho đến khi mỗi mô hình đủ số batch này.",
+    )
+    cols = st.columns(2)
+    if cols[0].button("Ghi profile lần phân tích kế tiếp"):
+        st.session_state["profile_batches"] = int(batches)
+    if cols[1].button("Làm mới"):
+        st.rerun(scope="fragment")
+    if "profile_batches" in st.session_state:
+        st.caption("Đang chờ lần phân tích kế tiếp của phiên này để ghi profile…")
+
+    capture = st.session_state.get("last_profile")
+    if capture is None:
+        return
+    recorded = ", ".join(f"{model} {n}" for model, n in capture.batches.items())
+    st.caption(f"Lần ghi gần nhất: {recorded} batch trong {capture.wall:.2f}s.")
+    st.dataframe(
+        capture.top_ops.style.format(
+            {
+                "self_cpu_ms": "{:.2f}",
+                "self_cpu_share": "{:.1%}",
+                "cpu_total_ms": "{:.2f}",
+                "self_cpu_mem_mb": "{:.2f}",
+                "cpu_mem_mb": "{:.2f}",
+            }
+        ),
+        use_container_width=True,
+        hide_index=True,
+    )
+    st.download_button(
+        "Tải Chrome trace",
+        data=capture.trace_path.read_bytes(),
+        file_name=capture.trace_path.name,
+        mime="application/json",
+        help="Mở bằng chrome://tracing hoặc ui.perfetto.dev",
+    )
+
+
+@st.fragment
+def model_version_panel(service: ABSAService, admin: bool = False) -> None:
+    versions = service.registry.versions()
+    active = service.model_version
+    st.markdown(f"Đang phục vụ: **{active}**")
+    # Loading, switching and rolling back affect every session, so they
+    # are only offered in the admin view.
+    if admin:
+        model_version_controls(service, versions, active)
+    history = service.registry.history()
+    if history:
+        st.dataframe(pd.DataFrame(history[::-1]), use_container_width=True, hide_index=True)
+
+
+def model_version_controls(service: ABSAService, versions: List[str], active: str) -> None:
+    col_select, col_load, col_switch, col_back = st.columns([2, 1, 1, 1])
+    with col_select:
+        target = st.selectbox(
+            "Phiên bản",
+            versions,
+            index=versions.index(active) if active in versions else 0,
+            key="model_version_target",
+            label_visibility="collapsed",
+        )
+    state = service.staging_status().get(target)
+    with col_load:
+        if st.button(
+            "Nạp nền",
+            disabled=target == active or state in ("loading", "ready"),
+            use_container_width=True,
+        ):
+            service.stage(target)
+            state = "loading"
+    with col_switch:
+        if st.button("Chuyển", disabled=target == active, use_container_width=True):
+            try:
+                with st.spinner(f"Đang chờ nạp {target}..."):
+                    service.activate(target)
+            except Exception as exc:
+                st.error(f"Không chuyển được sang {target}: {exc}")
+            else:
+                st.success(f"Đã chuyển sang {target}.")
+                active, state = target, None
+    with col_back:
+        if st.button(
+            "Quay lại bản trước",
+            disabled=service.registry.previous() is None,
+            use_container_width=True,
+        ):
+            try:
+                with st.spinner("Đang quay lại..."):
+                    active = service.roll_back()
+            except Exception as exc:
+                st.error(f"Không rollback được: {exc}")
+            else:
+                st.success(f"Đã quay lại {active}.")
+
+    if state == "loading":
+        st.caption(
+            f"{target} đang được nạp và warm-up nền; các request vẫn chạy trên {active}."
+        )
+        st.button("Làm mới trạng thái", key="model_version_refresh")
+    elif state == "ready":
+        st.caption(f"{target} đã sẵn sàng, bấm Chuyển để đổi ngay không gián đoạn.")
+    elif state:
+        st.warning(f"{target}: {state}")
+
+
+@st.fragment
 def manual_analysis(service: ABSAService) -> None:
     with st.container():
         st.subheader("⚡ Phân tích nhanh")
@@ -402,7 +717,7 @@ def manual_analysis(service: ABSAService) -> None:
                 st.warning("Vui lòng nhập nội dung.")
                 return
 
-            with st.spinner("Đang phân tích..."):
+            with st.spinner("Đang phân tích..."), session_profiling(service):
                 result = service.analyze_text(text)
 
             aspects = result["aspects"]
@@ -444,6 +759,7 @@ def manual_analysis(service: ABSAService) -> None:
                 )
             else:
                 st.info("Không tìm thấy aspect nào với ngưỡng hiện tại.")
+            st.caption(f"Phiên bản mô hình: {result['model_version']}")
 
 
 def _read_uploaded_file(uploaded) -> pd.DataFrame:
@@ -453,10 +769,200 @@ def _read_uploaded_file(uploaded) -> pd.DataFrame:
     return pd.read_csv(uploaded)
 
 
+def render_progressive_estimates(
+    placeholder, ranking: pd.DataFrame, processed: int, total: int, round_idx: int
+) -> None:
+    exact = processed >= total
+    with placeholder.container():
+        if exact:
+            st.markdown("##### ✅ Kết quả chính xác trên toàn bộ dữ liệu")
+        else:
+            st.markdown("##### ⏱️ Ước lượng sơ bộ (khoảng tin cậy 95%)")
+        st.progress(
+            processed / max(total, 1),
+            text=f"Đã phân tích {processed:,}/{total:,} review ({processed / max(total, 1):.0%})",
+        )
+        if ranking.empty:
+            st.info("Chưa phát hiện aspect nào trong phần đã phân tích.")
+            return
+        by_aspect = ranking.sort_values("neg_ratio", ascending=False)
+        neg_chart = px.bar(
+            by_aspect,
+            x="aspect",
+            y="neg_ratio",
+            error_y=by_aspect["neg_ratio_high"] - by_aspect["neg_ratio"],
+            error_y_minus=by_aspect["neg_ratio"] - by_aspect["neg_ratio_low"],
+            color="neg_ratio",
+            color_continuous_scale="Reds",
+            hover_data={"mentions": ":.0f", "sampled_mentions": True},
+        )
+        neg_chart.update_layout(
+            coloraxis_showscale=False,
+            xaxis_title="Aspect",
+            yaxis_title="Tỉ lệ NEG",
+            yaxis_tickformat=".0%",
+        )
+        st.plotly_chart(neg_chart, use_container_width=True, key=f"progressive_neg_{round_idx}")
+
+        def interval(value: float, low: float, high: float, fmt: str) -> str:
+            if exact:
+                return format(value, fmt)
+            return f"{format(value, fmt)} [{format(low, fmt)} – {format(high, fmt)}]"
+
+        table = pd.DataFrame(
+            {
+                "Hạng": range(1, len(ranking) + 1),
+                "Aspect": ranking["aspect"],
+                "Điểm ưu tiên": [
+                    interval(v, lo, hi, ".2f")
+                    for v, lo, hi in ranking[
+                        ["priority_score", "priority_score_low", "priority_score_high"]
+                    ].itertuples(index=False)
+                ],
+                "Tỉ lệ NEG": [
+                    interval(v, lo, hi, ".0%")
+                    for v, lo, hi in ranking[
+                        ["neg_ratio", "neg_ratio_low", "neg_ratio_high"]
+                    ].itertuples(index=False)
+                ],
+                "Lượt nhắc": [
+                    interval(v, lo, hi, ",.0f")
+                    for v, lo, hi in ranking[
+                        ["mentions", "mentions_low", "mentions_high"]
+                    ].itertuples(index=False)
+                ],
+            }
+        )
+        st.dataframe(
+            table,
+            use_container_width=True,
+            hide_index=True,
+            key=f"progressive_rank_{round_idx}",
+        )
+
+
+def analyze_progressively(
+    service: ABSAService,
+    texts: List[str],
+    triage: TriageResult,
+    dates: pd.Series | None = None,
+    dedup_threshold: float | None = None,
+    options: BatchOptions | None = None,
+    date_format: str | None = None,
+) -> tuple[BatchResult, NearDuplicateGroups | None]:
+    """
+    Chạy mô hình theo thứ tự mẫu ngẫu nhiên phân tầng (độ dài, tháng review);
+    sau mỗi đợt hiển thị tỉ lệ NEG và xếp hạng ưu tiên ước lượng cho toàn bộ
+    file kèm khoảng tin cậy, đợt cuối thay bằng kết quả chính xác.
+    """
+
+    n_rows = len(texts)
+    strata, unparsed_dates = build_strata(texts, dates, date_format=date_format)
+    if unparsed_dates:
+        st.caption(
+            f"{unparsed_dates:,} dòng có ngày không đọc được được xếp chung một tầng "
+            "riêng khi ước lượng."
+        )
+    representative = np.arange(n_rows, dtype=np.int64)
+    parts: List[BatchResult] = []
+    done: List[np.ndarray] = []
+    placeholder = st.empty()
+    processed = 0
+    for round_idx, rows in enumerate(progressive_chunks(stratified_order(strata))):
+        chunk_texts = [texts[i] for i in rows]
+        chunk_triage = TriageResult(category=triage.category[rows])
+        analyze = None
+        if dedup_threshold is not None:
+            # Near-duplicates are only merged within a chunk in this mode.
+            normal = chunk_triage.rows(NORMAL)
+            chunk_groups = find_near_duplicates(
+                [chunk_texts[i] for i in normal], threshold=dedup_threshold
+            )
+            representative[rows[normal]] = rows[normal][chunk_groups.representative]
+            analyze = lambda subset, g=chunk_groups: analyze_with_dedup(
+                service, subset, g, options=options
+            )
+        parts.append(
+            analyze_triaged(service, chunk_texts, chunk_triage, analyze=analyze, options=options)
+        )
+        done.append(rows)
+        processed += len(rows)
+
+        partial = BatchResult.concat(parts)
+        estimates = estimate_aspect_stats(
+            strata,
+            np.concatenate(done),
+            partial.row_ids(),
+            partial.aspect_labels(),
+            partial.aspect_sentiment_labels(),
+        )
+        render_progressive_estimates(
+            placeholder, priority_ranking(estimates), processed, n_rows, round_idx
+        )
+
+    order = np.concatenate(done)
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(n_rows)
+    groups = (
+        NearDuplicateGroups.from_representative(representative)
+        if dedup_threshold is not None
+        else None
+    )
+    return partial.take(inverse, texts=texts), groups
+
+
 def batch_analysis(service: ABSAService) -> None:
     st.subheader("📁 Phân tích file")
     uploaded = st.file_uploader("Upload file CSV hoặc Excel", type=["csv", "xls", "xlsx"])
     text_column = st.text_input("Tên cột chứa câu cần phân tích", value="text")
+    date_column = st.text_input(
+        "Tên cột ngày review (tuỳ chọn, dùng cho xu hướng theo thời gian)", value=""
+    ).strip()
+    date_format = (
+        st.text_input(
+            "Định dạng ngày (tuỳ chọn, ví dụ %d/%m/%Y)",
+            value="",
+            disabled=not date_column,
+            help="Để trống thì nhận ISO (2024-03-04) hoặc đọc ngày trước tháng "
+            "(03/04/2024 là ngày 3 tháng 4).",
+        ).strip()
+        or None
+    )
+    with st.expander("Tuỳ chọn tăng tốc"):
+        dedup_enabled = st.checkbox(
+            "Gộp review gần trùng (MinHash/LSH), chỉ chạy mô hình cho đại diện mỗi nhóm",
+            value=False,
+        )
+        dedup_threshold = st.slider(
+            "Độ tương đồng tối thiểu để gộp",
+            min_value=0.6,
+            max_value=1.0,
+            value=0.9,
+            step=0.01,
+            disabled=not dedup_enabled,
+        )
+        memory_budget = st.number_input(
+            "Ngân sách bộ nhớ cho batch (MB, 0 = tắt)",
+            min_value=0,
+            value=0,
+            step=256,
+            help="Tự chọn kích thước batch theo bộ nhớ đo được, lùi lại khi gần OOM.",
+        )
+        pipelined = st.checkbox(
+            "Chạy pipeline nhiều luồng (tokenize, forward aspect, prompt, forward "
+            "sentiment, ghép kết quả chồng lên nhau) và báo mức bận từng stage",
+            value=False,
+        )
+        progressive_enabled = st.checkbox(
+            "Ước lượng dần: phân tích mẫu phân tầng trước, hiện tỉ lệ NEG và xếp hạng "
+            "ưu tiên kèm khoảng tin cậy trong khi chạy tiếp phần còn lại",
+            value=False,
+        )
+        keep_embeddings = st.checkbox(
+            "Lưu embedding từng review (lấy từ lượt chạy mô hình aspect) để tìm "
+            "review tương tự trên Dashboard",
+            value=False,
+        )
 
     if uploaded and st.button("Phân tích file", use_container_width=True):
         try:
@@ -468,49 +974,230 @@ def batch_analysis(service: ABSAService) -> None:
         if text_column not in df.columns:
             st.error(f"Không tìm thấy cột '{text_column}' trong file.")
             return
+        if date_column and date_column not in df.columns:
+            st.error(f"Không tìm thấy cột ngày '{date_column}' trong file.")
+            return
 
-        records = []
-        with st.spinner("Đang chạy mô hình trên toàn bộ dữ liệu..."):
-            for text in df[text_column].fillna("").tolist():
-                result = service.analyze_text(str(text))
-                aspects: List[AspectPrediction] = result["aspects"]
-                sentiment: SentimentPrediction = result["sentiment"]
-                aspect_details = []
-                for aspect in aspects:
-                    aspect_details.append(
-                        {
-                            "aspect": aspect.label,
-                            "aspect_score": aspect.score,
-                            "sentiment": aspect.sentiment.label
-                            if aspect.sentiment
-                            else None,
-                            "sentiment_score": aspect.sentiment.score
-                            if aspect.sentiment
-                            else None,
-                        }
+        texts = df[text_column].fillna("").tolist()
+        triage = triage_texts(texts)
+        normal_rows = triage.rows(NORMAL)
+        groups = None
+        analyze = None
+        # Per-upload settings travel with the call; the service is shared by all sessions.
+        options = BatchOptions(
+            memory_budget_mb=memory_budget or None,
+            pipeline_chunk_rows=PIPELINE_CHUNK_ROWS if pipelined else None,
+            keep_embeddings=keep_embeddings,
+        )
+        with st.spinner(
+            "Đang chạy mô hình trên toàn bộ dữ liệu..."
+        ), service.pinned() as bundle, session_profiling(service):
+            if progressive_enabled and texts:
+                batch, groups = analyze_progressively(
+                    service,
+                    texts,
+                    triage,
+                    dates=df[date_column] if date_column else None,
+                    dedup_threshold=dedup_threshold if dedup_enabled else None,
+                    options=options,
+                    date_format=date_format,
+                )
+            else:
+                if dedup_enabled:
+                    subset_groups = find_near_duplicates(
+                        [texts[i] for i in normal_rows], threshold=dedup_threshold
                     )
+                    groups = subset_groups.expand(normal_rows, len(texts))
+                    analyze = lambda subset: analyze_with_dedup(
+                        service, subset, subset_groups, options=options
+                    )
+                batch = analyze_triaged(service, texts, triage, analyze=analyze, options=options)
+
+        triage_counts = triage.counts()
+        st.caption(
+            "Phân loại trước inference: "
+            f"{triage_counts[NORMAL]:,} bình thường · {triage_counts[LONG]:,} rất dài · "
+            f"{triage_counts[EMPTY]:,} rỗng · {triage_counts[TRIVIAL]:,} quá ngắn/chỉ emoji "
+            "(hai nhóm cuối nhận NEU, không aspect, không gọi mô hình). "
+            f"Phiên bản mô hình: {batch.model_version}."
+        )
+        if options.pipeline_report is not None:
+            report = options.pipeline_report
+            st.caption(
+                f"Pipeline (lần chạy cuối, {report.wall:.1f}s): stage nút thắt là "
+                f"**{report.bottleneck}**. busy/starved/blocked = tỉ lệ thời gian "
+                "stage bận, chờ stage trước, chờ stage sau."
+            )
+            st.dataframe(
+                report.utilization().style.format(
+                    {"busy_s": "{:.2f}", "busy": "{:.0%}", "starved": "{:.0%}", "blocked": "{:.0%}"}
+                ),
+                use_container_width=True,
+                hide_index=True,
+            )
+        if options.batcher is not None:
+            batching = options.batcher.summary()
+            st.caption(
+                f"Batch thích ứng: {batching['batches']:,} batch · batch size cuối "
+                f"{batching['batch_size']} · RSS đỉnh {batching['peak_rss_mb']:.0f} MB · "
+                f"{batching['backoffs']} lần lùi do gần OOM."
+            )
 
-                if aspect_details:
-                    aspects_display = "; ".join(
+        detail_rows = batch.row_ids()
+        detail_aspects = batch.aspect_labels().tolist()
+        detail_aspect_scores = batch.aspect_scores.tolist()
+        detail_sentiments = batch.aspect_sentiment_labels().tolist()
+        detail_sentiment_scores = batch.sentiment_scores.tolist()
+        detail_weights = batch.aspect_scores * batch.sentiment_scores
+
+        aspects_detail = []
+        aspects_display = []
+        offsets = batch.offsets.tolist()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            aspect_details = [
+                {
+                    "aspect": detail_aspects[j],
+                    "aspect_score": detail_aspect_scores[j],
+                    "sentiment": detail_sentiments[j],
+                    "sentiment_score": detail_sentiment_scores[j],
+                }
+                for j in range(start, end)
+            ]
+            aspects_detail.append(aspect_details)
+            if aspect_details:
+                aspects_display.append(
+                    "; ".join(
                         f"{d['aspect']} ({d.get('sentiment', '-')}, "
                         f"{(d.get('sentiment_score') or 0):.2f})"
                         for d in aspect_details
                     )
-                else:
-                    aspects_display = "-"
-
-                records.append(
-                    {
-                        text_column: text,
-                        "sentiment_label": sentiment.label if sentiment else None,
-                        "sentiment_score": sentiment.score if sentiment else None,
-                        "aspects_display": aspects_display,
-                        "aspects_detail": aspect_details,
-                    }
                 )
-
-        analysis_df = pd.DataFrame(records)
+            else:
+                aspects_display.append("-")
+
+        columns = {text_column: texts}
+        if date_column:
+            columns[date_column] = df[date_column].tolist()
+        columns.update(
+            {
+                "triage": triage.category.tolist(),
+                "sentiment_label": batch.overall_labels().tolist(),
+                "sentiment_score": batch.overall_scores.tolist(),
+                "aspects_display": aspects_display,
+                "aspects_detail": aspects_detail,
+                "model_version": batch.model_version,
+            }
+        )
+        if groups is not None:
+            # Row number of the review whose result was copied, empty when inferred directly.
+            columns["propagated_from"] = (
+                pd.Series(groups.representative).where(groups.propagated).astype("Int64")
+            )
+        analysis_df = pd.DataFrame(columns)
+
+        if groups is not None and groups.saved:
+            aspect_counts = np.diff(batch.offsets)
+            full_inputs = 2 * len(normal_rows) + int(aspect_counts[normal_rows].sum())
+            saved_inputs = 2 * groups.saved + int(aspect_counts[groups.propagated].sum())
+            leader_inputs = full_inputs - saved_inputs
+            with st.spinner("Đang kiểm tra độ khớp nhãn trên mẫu review được sao chép..."):
+                with service.pinned(bundle):
+                    agreement = validate_propagation(service, texts, groups, batch)
+            col_saved, col_calls, col_sent, col_asp = st.columns(4)
+            col_saved.metric("Review dùng lại kết quả", f"{groups.saved:,}")
+            col_calls.metric(
+                "Lượt gọi mô hình tiết kiệm (ước tính)",
+                f"{full_inputs - leader_inputs:,}",
+                f"-{1 - leader_inputs / full_inputs:.0%}",
+            )
+            col_sent.metric(
+                "Khớp sentiment (mẫu)",
+                f"{agreement['sentiment_agreement']:.0%}",
+                f"n={agreement['sample_size']}",
+                delta_color="off",
+            )
+            col_asp.metric(
+                "Khớp tập aspect (mẫu)",
+                f"{agreement['aspect_agreement']:.0%}",
+                delta_color="off",
+            )
+        run_id = TrendStore.new_run_id()
+        try:
+            load_results_store().write_run(
+                run_id,
+                texts=analysis_df[text_column].tolist(),
+                sentiment_labels=analysis_df["sentiment_label"].tolist(),
+                sentiment_scores=analysis_df["sentiment_score"].tolist(),
+                row_ids=detail_rows,
+                aspects=detail_aspects,
+                aspect_scores=detail_aspect_scores,
+                aspect_sentiments=detail_sentiments,
+                aspect_sentiment_scores=detail_sentiment_scores,
+                source_name=uploaded.name,
+                text_column=text_column,
+                model_version=batch.model_version,
+            )
+        except sqlite3.Error as exc:
+            st.warning(f"Không lưu được kết quả vào kho SQLite: {exc}")
+        previous_run = st.session_state.get("run_id")
+        if previous_run:
+            discard_embedding_index(previous_run, st.session_state.get("embedding_build"))
+        st.session_state.pop("embedding_build", None)
+        if batch.embeddings is not None:
+            # k-means over a large run takes a while; results are shown meanwhile.
+            st.session_state["embedding_build"] = load_index_builder().submit(
+                EmbeddingIndex.build,
+                EMBEDDINGS_DIR,
+                run_id,
+                batch.embeddings,
+                model_version=batch.model_version,
+            )
+            st.caption(
+                f"Đang dựng chỉ mục tìm kiếm cho {len(batch.embeddings):,} embedding "
+                f"({batch.embeddings.shape[1]} chiều, float16) ở nền."
+            )
+        if date_column:
+            aggregates, unparsed_dates = build_daily_aggregates(
+                review_dates=analysis_df[date_column],
+                review_sentiments=analysis_df["sentiment_label"],
+                review_scores=analysis_df["sentiment_score"],
+                row_ids=detail_rows,
+                aspects=detail_aspects,
+                aspect_sentiments=detail_sentiments,
+                aspect_scores=detail_sentiment_scores,
+                run_id=run_id,
+                date_format=date_format,
+            )
+            appended = load_trend_store().append(aggregates)
+            st.caption(f"Đã cập nhật {appended} dòng tổng hợp xu hướng theo ngày.")
+            if unparsed_dates:
+                st.warning(
+                    f"{unparsed_dates:,} dòng có ngày không đọc được ở cột '{date_column}' "
+                    "nên không được tính vào xu hướng; kiểm tra định dạng ngày."
+                )
         st.session_state["analysis_df"] = analysis_df
+        st.session_state["run_id"] = run_id
+        st.session_state["result_version"] = run_id
+        st.session_state["exemplar_index"] = ExemplarIndex.from_arrays(
+            detail_rows,
+            detail_aspects,
+            detail_sentiments,
+            detail_weights,
+            k=EXEMPLARS_PER_ASPECT,
+        )
+        st.session_state["session_aspect_stats"] = aspect_stats(
+            detail_aspects, detail_sentiments, detail_sentiment_scores
+        )
+        st.session_state["aspect_cooccurrence"] = AspectCooccurrence.from_arrays(
+            len(texts), detail_rows, detail_aspects, detail_sentiments
+        )
+        st.session_state["text_index"] = TextIndex.build(
+            texts,
+            row_ids=detail_rows,
+            aspects=detail_aspects,
+            aspect_sentiments=detail_sentiments,
+            overall_sentiments=analysis_df["sentiment_label"].tolist(),
+        )
 
         st.success("Phân tích hoàn tất!")
         display_df = analysis_df.drop(columns=["aspects_detail", "sentiment_label", "sentiment_score"])
@@ -527,31 +1214,37 @@ def batch_analysis(service: ABSAService) -> None:
         )
 
 
-def dashboard() -> None:
-    st.subheader("📊 Dashboard kết quả")
-    analysis_df: pd.DataFrame | None = st.session_state.get("analysis_df")
-    if analysis_df is None or analysis_df.empty:
-        st.info("Hãy phân tích file để có dữ liệu hiển thị.")
-        return
-
-    st.markdown("<div class='dashboard-animate'>", unsafe_allow_html=True)
-
-    total_rows = len(analysis_df)
-    pos = (analysis_df["sentiment_label"] == "POS").sum()
-    neg = (analysis_df["sentiment_label"] == "NEG").sum()
-    neu = (analysis_df["sentiment_label"] == "NEU").sum()
-
-    c1, c2, c3, c4 = st.columns(4)
-    c1.metric("Tổng review", total_rows)
-    c2.metric("Positive", pos)
-    c3.metric("Neutral", neu)
-    c4.metric("Negative", neg)
-
-    col1, col2 = st.columns((1, 1))
-
-    sentiment_counts = (
-        analysis_df["sentiment_label"].value_counts().reset_index()
+def result_version(analysis_df: pd.DataFrame) -> str:
+    """
+    Khoá cache cho mọi hình vẽ dựng từ kết quả hiện tại; đổi mỗi lần phân tích file.
+    """
+
+    version = st.session_state.get("result_version")
+    if version is None:
+        # Figure caches are shared by every session, so the key must be unique
+        # per result, not derived from object ids that get reused.
+        version = f"session-{uuid.uuid4().hex}"
+        st.session_state["result_version"] = version
+    return version
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def build_dashboard_figures(version: str, _analysis_df: pd.DataFrame) -> dict:
+    """
+    Dựng (một lần cho mỗi `version`) các số liệu và biểu đồ tĩnh của Dashboard.
+    `_analysis_df` không được hash; `version` là khoá cache.
+    """
+
+    analysis_df = _analysis_df
+    label_counts = analysis_df["sentiment_label"].value_counts()
+    counts = (
+        len(analysis_df),
+        int(label_counts.get("POS", 0)),
+        int(label_counts.get("NEU", 0)),
+        int(label_counts.get("NEG", 0)),
     )
+
+    sentiment_counts = label_counts.reset_index()
     sentiment_counts.columns = ["sentiment", "count"]
     fig_sentiment = px.pie(
         sentiment_counts,
@@ -584,16 +1277,20 @@ def dashboard() -> None:
     )
     fig_sentiment.update_traces(textposition="inside", textinfo="percent+label")
     fig_sentiment.update_layout(transition_duration=700)
-    col1.plotly_chart(fig_sentiment, use_container_width=True)
 
-    aspect_series = analysis_df["aspects_detail"].explode()
-    if aspect_series.notna().any():
-        aspect_counts = (
-            aspect_series.dropna()
-            .apply(lambda x: x.get("aspect"))
-            .value_counts()
-            .reset_index()
-        )
+    detail = pd.DataFrame(
+        [
+            (d.get("aspect"), d.get("sentiment") or "NEU")
+            for items in analysis_df["aspects_detail"]
+            if isinstance(items, list)
+            for d in items
+        ],
+        columns=["aspect", "sentiment"],
+    )
+    fig_aspects = None
+    stacked_chart = None
+    if not detail.empty:
+        aspect_counts = detail["aspect"].value_counts().reset_index()
         aspect_counts.columns = ["aspect", "count"]
         fig_aspects = px.bar(
             aspect_counts,
@@ -605,40 +1302,7 @@ def dashboard() -> None:
         )
         fig_aspects.update_layout(coloraxis_showscale=False)
         fig_aspects.update_layout(transition_duration=700)
-        col2.plotly_chart(fig_aspects, use_container_width=True)
-    else:
-        col2.info("Không có aspect nào vượt ngưỡng đã đặt.")
-
-    # Additional dashboard elements
-    col3, col4 = st.columns((1, 1))
 
-    timeline = analysis_df.copy()
-    timeline = timeline.dropna(subset=["sentiment_score"])
-    timeline["index"] = range(1, len(timeline) + 1)
-    line_chart = px.line(
-        timeline,
-        x="index",
-        y="sentiment_score",
-        color="sentiment_label",
-        color_discrete_map={
-            "POS": "#34d399",
-            "NEU": "#cbd5f5",
-            "NEG": "#f87171",
-        },
-        markers=True,
-    )
-    line_chart.update_traces(line=dict(width=3))
-    line_chart.update_layout(
-        transition_duration=700, xaxis_title="Review #", yaxis_title="Confidence"
-    )
-    col3.plotly_chart(line_chart, use_container_width=True)
-
-    aspect_detail_df = (
-        analysis_df.explode("aspects_detail").dropna(subset=["aspects_detail"])
-    )
-    if not aspect_detail_df.empty:
-        detail = pd.json_normalize(aspect_detail_df["aspects_detail"])
-        detail["sentiment"].fillna("NEU", inplace=True)
         aspect_sentiment_counts = (
             detail.groupby(["aspect", "sentiment"])
             .size()
@@ -662,43 +1326,456 @@ def dashboard() -> None:
             xaxis_title="Aspect",
             yaxis_title="Số lần xuất hiện",
         )
-        col4.plotly_chart(stacked_chart, use_container_width=True)
+
+    timeline = analysis_df[["sentiment_label", "sentiment_score"]].dropna(
+        subset=["sentiment_score"]
+    )
+    timeline = timeline.assign(index=np.arange(1, len(timeline) + 1))
+    return {
+        "counts": counts,
+        "sentiment": fig_sentiment,
+        "aspects": fig_aspects,
+        "stacked": stacked_chart,
+        "timeline": timeline,
+    }
+
+
+@st.fragment
+def render_confidence_chart(timeline: pd.DataFrame) -> None:
+    total = len(timeline)
+    if total == 0:
+        st.info("Chưa có confidence để vẽ biểu đồ.")
+        return
+
+    view = st.radio(
+        "Chế độ xem confidence",
+        ["Theo review", "Cửa sổ trượt"],
+        horizontal=True,
+        label_visibility="collapsed",
+    )
+    start, end = 1, total
+    if total > MAX_CHART_POINTS:
+        # Narrowing the range down to MAX_CHART_POINTS reviews shows full resolution.
+        start, end = st.slider(
+            "Khoảng review (thu hẹp để xem đầy đủ từng điểm)",
+            min_value=1,
+            max_value=total,
+            value=(1, total),
+        )
+    window_df = timeline.iloc[start - 1 : end]
+
+    if view == "Cửa sổ trượt":
+        window = 1
+        if len(window_df) > 1:
+            window = st.slider(
+                "Kích thước cửa sổ (số review)",
+                min_value=1,
+                max_value=min(5000, len(window_df)),
+                value=max(1, min(200, len(window_df) // 20)),
+            )
+        rolled = rolling_sentiment(window_df, window)
+        rolled["index"] += start - 1
+        plotted = downsample_rolling(rolled, MAX_CHART_POINTS)
+        line_chart = px.line(
+            plotted,
+            x="index",
+            y=["mean_confidence", "neg_share"],
+            color_discrete_map={
+                "mean_confidence": "#7dd3fc",
+                "neg_share": "#f87171",
+            },
+        )
+        line_chart.update_traces(line=dict(width=3))
+        line_chart.update_layout(
+            transition_duration=700,
+            xaxis_title="Review #",
+            yaxis_title="Confidence TB · Tỉ lệ NEG",
+            legend_title="",
+        )
+    else:
+        plotted = downsample_frame(
+            window_df,
+            x="index",
+            y="sentiment_score",
+            max_points=MAX_CHART_POINTS,
+            group="sentiment_label",
+        )
+        line_chart = px.line(
+            plotted,
+            x="index",
+            y="sentiment_score",
+            color="sentiment_label",
+            color_discrete_map={
+                "POS": "#34d399",
+                "NEU": "#cbd5f5",
+                "NEG": "#f87171",
+            },
+            markers=len(plotted) == len(window_df),
+        )
+        line_chart.update_traces(line=dict(width=3))
+        line_chart.update_layout(
+            transition_duration=700, xaxis_title="Review #", yaxis_title="Confidence"
+        )
+    st.plotly_chart(line_chart, use_container_width=True)
+    if len(plotted) < len(window_df):
+        st.caption(
+            f"Đã rút gọn {len(window_df):,} review còn {len(plotted):,} điểm "
+            "(giữ hình dạng). Thu hẹp khoảng review để xem đầy đủ."
+        )
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def build_cooccurrence_figure(
+    version: str, sentiment: str, _cooccurrence: AspectCooccurrence
+):
+    matrix = _cooccurrence.matrix(sentiment)
+    # The diagonal (reviews per aspect) would swamp the colour scale.
+    off_diagonal = matrix.mask(np.eye(len(matrix), dtype=bool))
+    fig = px.imshow(
+        off_diagonal,
+        text_auto=True,
+        color_continuous_scale="Reds" if sentiment == "NEG" else "Tealgrn",
+        labels={"x": "Aspect", "y": "Aspect", "color": "Số review"},
+        aspect="auto",
+    )
+    fig.update_layout(transition_duration=700)
+    return fig
+
+
+@st.fragment
+def render_aspect_cooccurrence(version: str, analysis_df: pd.DataFrame) -> None:
+    st.markdown("#### 🔗 Aspect thường bị nhắc cùng nhau")
+    # Built from the flat aspect arrays when the file is analysed; older
+    # sessions rebuild it once from `aspects_detail`.
+    cooccurrence: AspectCooccurrence | None = st.session_state.get("aspect_cooccurrence")
+    if cooccurrence is None:
+        cooccurrence = AspectCooccurrence.from_frame(analysis_df)
+        st.session_state["aspect_cooccurrence"] = cooccurrence
+    if len(cooccurrence.aspects) < 2:
+        st.info("Cần ít nhất hai aspect để xem đồng xuất hiện.")
+        return
+
+    labels = {
+        "NEG": "Cùng NEG",
+        "POS": "Cùng POS",
+        "NEU": "Cùng NEU",
+        ANY_SENTIMENT: "Mọi sentiment",
+    }
+    options = [key for key in labels if key in cooccurrence.counts]
+    sentiment = st.radio(
+        "Sentiment của cả hai aspect",
+        options,
+        format_func=labels.get,
+        horizontal=True,
+        key="cooccurrence_sentiment",
+    )
+    col_heatmap, col_pairs = st.columns((3, 2))
+    col_heatmap.plotly_chart(
+        build_cooccurrence_figure(version, sentiment, cooccurrence), use_container_width=True
+    )
+    pairs = cooccurrence.top_pairs(sentiment, n=10)
+    if pairs.empty:
+        col_pairs.info("Chưa có cặp aspect nào xuất hiện cùng nhau.")
+        return
+    col_pairs.caption(
+        "share_of_a/b: tỉ lệ review nhắc aspect a (b) cũng nhắc aspect còn lại."
+    )
+    col_pairs.dataframe(
+        pairs.style.format({"share_of_a": "{:.0%}", "share_of_b": "{:.0%}", "jaccard": "{:.2f}"}),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+
+@st.fragment
+def render_keyword_search(analysis_df: pd.DataFrame) -> None:
+    """
+    Lọc review của kết quả hiện tại theo từ khoá (chỉ mục đảo theo âm tiết),
+    aspect và sentiment.
+    """
+
+    st.markdown("#### 🔍 Tìm theo từ khoá")
+    text_column = analysis_df.columns[0]
+    index: TextIndex | None = st.session_state.get("text_index")
+    if index is None or len(index) != len(analysis_df):
+        index = TextIndex.from_frame(analysis_df, text_column)
+        st.session_state["text_index"] = index
+
+    aspects = sorted({aspect for aspect, _ in index.facet_codes if aspect is not None})
+    col_query, col_aspect, col_sentiment = st.columns((3, 1, 1))
+    query = col_query.text_input(
+        "Từ khoá",
+        placeholder="Ví dụ: chống rung, mờ (dấu phẩy = AND; gõ không dấu vẫn khớp)",
+        key="keyword_query",
+    )
+    aspect = col_aspect.selectbox("Aspect", ["Tất cả"] + aspects, key="keyword_aspect")
+    sentiment = col_sentiment.selectbox(
+        "Sentiment", ["Tất cả", "NEG", "NEU", "POS"], key="keyword_sentiment"
+    )
+    aspect = None if aspect == "Tất cả" else aspect
+    sentiment = None if sentiment == "Tất cả" else sentiment
+    if not query.strip() and aspect is None and sentiment is None:
+        return
+
+    started = time.perf_counter()
+    rows = index.search(query, aspect=aspect, sentiment=sentiment)
+    elapsed = time.perf_counter() - started
+    scope = f"sentiment của aspect {aspect}" if aspect and sentiment else "sentiment tổng thể"
+    st.caption(
+        f"{len(rows):,} / {len(index):,} review khớp trong {elapsed * 1000:.1f} ms"
+        + (f" (lọc theo {scope})." if sentiment else ".")
+    )
+    shown = rows[:KEYWORD_RESULT_ROWS]
+    st.dataframe(
+        analysis_df.iloc[shown][[text_column, "sentiment_label", "aspects_display"]].rename(
+            columns={"sentiment_label": "sentiment", "aspects_display": "aspects"}
+        ),
+        use_container_width=True,
+    )
+    if len(rows) > len(shown):
+        st.caption(f"Hiển thị {len(shown):,} review đầu tiên.")
+
+
+@st.fragment
+def render_similar_reviews(analysis_df: pd.DataFrame) -> None:
+    """
+    Tìm các review của run hiện tại gần nhất (cosine trên embedding của mô
+    hình aspect) với một câu phàn nàn mẫu.
+    """
+
+    st.markdown("#### 🔎 Tìm review tương tự")
+    build = st.session_state.get("embedding_build")
+    if build is not None and not build.done():
+        st.caption("Chỉ mục tìm kiếm đang được dựng ở nền.")
+        if st.button("Làm mới", key="similar_refresh"):
+            st.rerun(scope="fragment")
+        return
+    if build is not None and build.exception() is not None:
+        st.error(f"Không dựng được chỉ mục tìm kiếm: {build.exception()}")
+        return
+    index = load_embedding_index(st.session_state.get("run_id", ""))
+    if index is None or len(index) != len(analysis_df):
+        st.caption(
+            "Bật \"Lưu embedding từng review\" trong Tuỳ chọn tăng tốc rồi phân tích "
+            "lại file để tìm review tương tự."
+        )
+        return
+
+    col_query, col_k = st.columns((4, 1))
+    query = col_query.text_input(
+        "Câu phàn nàn mẫu", placeholder="Ví dụ: pin tụt nhanh, sạc lâu đầy", key="similar_query"
+    ).strip()
+    k = col_k.number_input("Top-k", min_value=1, max_value=100, value=10, key="similar_k")
+    if not query:
+        return
+
+    service = load_service()
+    if service.model_version != index.model_version:
+        st.warning(
+            f"Embedding của run này tạo bởi mô hình {index.model_version}, khác phiên bản "
+            f"đang dùng ({service.model_version}); kết quả có thể không chính xác."
+        )
+    started = time.perf_counter()
+    query_vector = service.embed([query], lane=INTERACTIVE)[0]
+    embedded = time.perf_counter()
+    hits = index.search(query_vector, k=int(k))
+    searched = time.perf_counter()
+    st.caption(
+        f"Mã hoá câu truy vấn {(embedded - started) * 1000:.0f} ms · tìm kiếm "
+        f"{'xấp xỉ' if hits.mode == 'approx' else 'chính xác'} trên {hits.scanned:,}/"
+        f"{len(index):,} review {(searched - embedded) * 1000:.1f} ms."
+    )
+
+    text_column = analysis_df.columns[0]
+    matches = analysis_df.iloc[hits.rows]
+    st.dataframe(
+        pd.DataFrame(
+            {
+                "similarity": hits.scores,
+                "review": matches[text_column].to_numpy(),
+                "sentiment": matches["sentiment_label"].to_numpy(),
+                "aspects": matches["aspects_display"].to_numpy(),
+            },
+            index=hits.rows,
+        ).style.format({"similarity": "{:.3f}"}),
+        use_container_width=True,
+    )
+
+
+@st.fragment
+def render_trend_section() -> None:
+    store = load_trend_store()
+    store_version = store.version()
+    if not store_version:
+        return
+
+    st.markdown("##### 📈 Xu hướng tỉ lệ NEG theo thời gian")
+    freq_options = {"Ngày": "D", "Tuần": "W", "Tháng": "M"}
+    col_freq, col_aspects = st.columns([1, 3])
+    with col_freq:
+        freq_label = st.radio("Chu kỳ", list(freq_options), index=2, horizontal=True)
+    trend = load_trend(freq_options[freq_label], store_version)
+    if trend.empty:
+        st.info("Chưa có dữ liệu xu hướng.")
+        return
+
+    trend = trend.copy()
+    trend["aspect"] = trend["aspect"].replace({ALL_ASPECTS: "Tổng thể"})
+    aspect_options = sorted(trend["aspect"].unique())
+    with col_aspects:
+        selected = st.multiselect(
+            "Aspect",
+            aspect_options,
+            default=["Tổng thể"] if "Tổng thể" in aspect_options else aspect_options[:1],
+        )
+    trend = trend[trend["aspect"].isin(selected)]
+    if trend.empty:
+        st.info("Chọn ít nhất một aspect để xem xu hướng.")
+        return
+
+    trend_chart = px.line(
+        trend,
+        x="period",
+        y="neg_ratio",
+        color="aspect",
+        markers=True,
+        hover_data={"mentions": True, "neg": True},
+    )
+    trend_chart.update_layout(
+        transition_duration=700,
+        xaxis_title="Thời gian",
+        yaxis_title="Tỉ lệ NEG",
+        yaxis_tickformat=".0%",
+        legend_title="Aspect",
+    )
+    st.plotly_chart(trend_chart, use_container_width=True)
+
+
+@st.fragment
+def render_run_comparison() -> None:
+    store = load_results_store()
+    runs = store.list_runs()
+    if len(runs) < 2:
+        return
+
+    st.markdown("##### 🗂️ So sánh các lần phân tích")
+    labels = {row["run_id"]: run_label(row) for _, row in runs.iterrows()}
+    selected = st.multiselect(
+        "Chọn các lần phân tích",
+        list(labels),
+        default=list(labels)[:2],
+        format_func=labels.get,
+    )
+    if not selected:
+        st.info("Chọn ít nhất một lần phân tích để so sánh.")
+        return
+
+    stats = load_aspect_stats(tuple(selected), store.version())
+    if stats.empty:
+        st.info("Các lần phân tích đã chọn chưa có dữ liệu aspect.")
+        return
+    stats["neg_ratio"] = stats["neg"] / stats["mentions"]
+    stats["run"] = stats["run_id"].map(labels)
+    comparison_chart = px.bar(
+        stats,
+        x="aspect",
+        y="neg_ratio",
+        color="run",
+        barmode="group",
+        hover_data={"mentions": True, "neg": True},
+    )
+    comparison_chart.update_layout(
+        transition_duration=700,
+        xaxis_title="Aspect",
+        yaxis_title="Tỉ lệ NEG",
+        yaxis_tickformat=".0%",
+        legend_title="Lần phân tích",
+    )
+    st.plotly_chart(comparison_chart, use_container_width=True)
+
+
+def dashboard() -> None:
+    st.subheader("📊 Dashboard kết quả")
+    analysis_df: pd.DataFrame | None = st.session_state.get("analysis_df")
+    if analysis_df is None or analysis_df.empty:
+        st.info("Hãy phân tích file để có dữ liệu hiển thị.")
+        render_trend_section()
+        render_run_comparison()
+        return
+
+    st.markdown("<div class='dashboard-animate'>", unsafe_allow_html=True)
+
+    figures = build_dashboard_figures(result_version(analysis_df), analysis_df)
+    total_rows, pos, neu, neg = figures["counts"]
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Tổng review", total_rows)
+    c2.metric("Positive", pos)
+    c3.metric("Neutral", neu)
+    c4.metric("Negative", neg)
+
+    col1, col2 = st.columns((1, 1))
+    col1.plotly_chart(figures["sentiment"], use_container_width=True)
+    if figures["aspects"] is not None:
+        col2.plotly_chart(figures["aspects"], use_container_width=True)
+    else:
+        col2.info("Không có aspect nào vượt ngưỡng đã đặt.")
+
+    # Additional dashboard elements
+    col3, col4 = st.columns((1, 1))
+    with col3:
+        render_confidence_chart(figures["timeline"])
+    if figures["stacked"] is not None:
+        col4.plotly_chart(figures["stacked"], use_container_width=True)
     else:
         col4.info("Chưa có dữ liệu aspect để vẽ biểu đồ phân bố.")
 
+    render_aspect_cooccurrence(result_version(analysis_df), analysis_df)
+
     st.markdown("</div>", unsafe_allow_html=True)
+    render_keyword_search(analysis_df)
+    render_similar_reviews(analysis_df)
+    render_trend_section()
+    render_run_comparison()
 
 
+@st.fragment
 def action_center() -> None:
     st.subheader("🎯 Action Center · Ưu tiên hành động")
     analysis_df: pd.DataFrame | None = st.session_state.get("analysis_df")
-    if analysis_df is None or analysis_df.empty:
+    store = load_results_store()
+    runs = store.list_runs()
+    session_run = st.session_state.get("run_id") if analysis_df is not None else None
+    # The session's own result still counts when it could not be written to the store.
+    unsaved = session_run is not None and session_run not in set(runs["run_id"])
+    if runs.empty and not unsaved:
         st.info("Hãy phân tích file trước khi tạo gợi ý hành động.")
         return
+    if session_run is None:
+        st.caption(
+            "Phiên này chưa phân tích file; danh sách dưới đây gồm các lần phân tích "
+            "đã lưu của mọi người dùng."
+        )
 
-    exploded = analysis_df.explode("aspects_detail").dropna(subset=["aspects_detail"])
-    if exploded.empty:
+    run_id = select_run(
+        runs,
+        key="action_center_run",
+        session_label="Phiên hiện tại (chưa lưu vào kho)" if unsaved else None,
+    )
+    if run_id is None:
+        return
+    if unsaved and run_id == session_run:
+        stats = st.session_state.get("session_aspect_stats")
+        if stats is None:
+            stats = aspect_stats_from_frame(analysis_df)
+            st.session_state["session_aspect_stats"] = stats
+        stats = stats.copy()
+    else:
+        stats = load_aspect_stats((run_id,), store.version()).drop(columns=["run_id"])
+    if stats.empty:
         st.info("Chưa có dữ liệu aspect để tổng hợp khuyến nghị.")
         return
 
-    detail = pd.json_normalize(exploded["aspects_detail"])
-    detail.columns = [col.split(".")[-1] for col in detail.columns]
-    detail["sentiment"] = detail["sentiment"].fillna("NEU")
-    detail["sentiment_upper"] = detail["sentiment"].str.upper()
-    detail["is_neg"] = detail["sentiment_upper"].isin(["NEG", "NEGATIVE"])
-    detail["is_pos"] = detail["sentiment_upper"].isin(["POS", "POSITIVE"])
-    detail["score"] = detail["sentiment_score"].fillna(0)
-
-    stats = (
-        detail.groupby("aspect")
-        .agg(
-            mentions=("aspect", "count"),
-            neg=("is_neg", "sum"),
-            pos=("is_pos", "sum"),
-            avg_score=("score", "mean"),
-        )
-        .reset_index()
-    )
     stats["neg_ratio"] = stats["neg"] / stats["mentions"]
     stats["pos_ratio"] = stats["pos"] / stats["mentions"]
     if stats["mentions"].max() > 0:
@@ -734,6 +1811,35 @@ def action_center() -> None:
         st.info("Không có aspect nào đạt số lượt nhắc tối thiểu. Giảm ngưỡng để xem thêm dữ liệu.")
         return
 
+    in_session = analysis_df is not None and run_id == st.session_state.get("run_id")
+    exemplar_index: ExemplarIndex | None = None
+    sample_col = None
+    if in_session:
+        text_columns = [
+            col
+            for col in analysis_df.columns
+            if col not in {"sentiment_label", "sentiment_score", "aspects_display", "aspects_detail"}
+        ]
+        sample_col = text_columns[0] if text_columns else None
+        exemplar_index = st.session_state.get("exemplar_index")
+        if exemplar_index is None:
+            exemplar_index = ExemplarIndex.from_frame(analysis_df, k=EXEMPLARS_PER_ASPECT)
+            st.session_state["exemplar_index"] = exemplar_index
+
+    def exemplar_texts(aspect: str, sentiment: str, k: int = 2) -> List[str]:
+        # The in-memory index answers instantly for the current session's run;
+        # older runs go through the indexed SQLite query.
+        if exemplar_index is not None and sample_col:
+            return [
+                analysis_df[sample_col].iloc[int(row_id)]
+                for row_id in exemplar_index.lookup(aspect, sentiment)[:k]
+            ]
+        return store.exemplar_texts(run_id, aspect, sentiment, k)
+
+    def render_exemplars(aspect: str, sentiment: str) -> None:
+        for text in exemplar_texts(aspect, sentiment):
+            st.caption(f"“{text}”")
+
     def severity_label(ratio: float) -> str:
         if ratio >= 0.6:
             return "critical"
@@ -770,6 +1876,7 @@ def action_center() -> None:
                     """,
                     unsafe_allow_html=True,
                 )
+                render_exemplars(row["aspect"], "NEG")
 
     opportunity = (
         filtered_stats.sort_values(["pos_ratio", "mentions"], ascending=False)
@@ -798,13 +1905,8 @@ def action_center() -> None:
                     """,
                     unsafe_allow_html=True,
                 )
+                render_exemplars(row["aspect"], "POS")
 
-    text_columns = [
-        col
-        for col in analysis_df.columns
-        if col not in {"sentiment_label", "sentiment_score", "aspects_display", "aspects_detail"}
-    ]
-    sample_col = text_columns[0] if text_columns else None
     suggestions = []
     owner_map = {
         "PRICE": "Sales & Pricing",
@@ -842,14 +1944,10 @@ def action_center() -> None:
     ]
 
     st.markdown("##### 🧩 Playbook hành động")
-    if sample_col and not exploded.empty:
-        negative_examples = exploded[
-            exploded["aspects_detail"].apply(
-                lambda d: d.get("sentiment") in ["NEG", "NEGATIVE"]
-            )
-        ]
-        if not negative_examples.empty:
-            sample_text = negative_examples.iloc[0][sample_col]
+    if not urgent.empty:
+        examples = exemplar_texts(urgent.iloc[0]["aspect"], "NEG", k=1)
+        if examples:
+            sample_text = examples[0]
             st.markdown(
                 f"> **Example complaint:** “{sample_text}”",
             )
@@ -891,6 +1989,16 @@ def main() -> None:
         )
     render_team_section()
     service = load_service()
+    # Admin controls stay hidden unless the page is opened with ?profile=1.
+    admin = st.query_params.get("profile") == "1"
+    with st.expander("⚙️ Phiên bản mô hình"):
+        model_version_panel(service, admin)
+    if service.scheduler is not None:
+        with st.expander("📶 Hàng đợi suy luận"):
+            scheduler_panel(service, admin)
+    if admin:
+        with st.expander("🧪 Profiling"):
+            profiling_panel(service)
 
     tab_manual, tab_file, tab_dashboard, tab_actions = st.tabs(
         ["🔍 Phân tích câu", "📁 Phân tích file", "📊 Dashboard", "🎯 Action Center"]
@@ -0,0 +1,276 @@
+"""
+Benchmark thread counts, batch size và token budget trên máy hiện tại rồi lưu
+cấu hình tốt nhất vào `tuning_profile.json` để `ABSAService` dùng khi khởi động.
+
+    python autotune.py --goal both --sample 256
+    python autotune.py --goal throughput --input reviews.csv --text-column text
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import torch
+
+from model_service import TUNING_PROFILE_NAME, ABSAService
+from scheduler import BULK
+
+GOALS = ("latency", "throughput")
+
+
+def _powers_of_two(limit: int) -> List[int]:
+    values = [1]
+    while values[-1] * 2 <= limit:
+        values.append(values[-1] * 2)
+    if values[-1] != limit:
+        values.append(limit)
+    return values
+
+
+@dataclass
+class TuneGrid:
+    num_threads: List[int] = field(
+        default_factory=lambda: _powers_of_two(os.cpu_count() or 1)
+    )
+    interop_threads: List[int] = field(default_factory=lambda: [1, 2])
+    batch_sizes: List[int] = field(default_factory=lambda: [8, 16, 32, 64])
+    # None means no token budget (batch size only).
+    token_budgets: List[Optional[int]] = field(
+        default_factory=lambda: [None, 4096, 8192]
+    )
+
+
+def synthetic_reviews(n: int, seed: int = 0) -> List[str]:
+    """
+    Ghép ngẫu nhiên 1–4 câu trong `sample_reviews.csv` để có độ dài đa dạng.
+    """
+
+    sample_path = Path(__file__).resolve().parent / "sample_reviews.csv"
+    sentences = pd.read_csv(sample_path)["text"].dropna().astype(str).tolist()
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(sentences) for _ in range(rng.randint(1, 4)))
+        for _ in range(n)
+    ]
+
+
+def load_reviews(path: Path, text_column: str, n: int, seed: int = 0) -> List[str]:
+    if path.suffix.lower() in [".xls", ".xlsx"]:
+        df = pd.read_excel(path)
+    else:
+        df = pd.read_csv(path)
+    texts = df[text_column].dropna().astype(str)
+    if len(texts) > n:
+        texts = texts.sample(n=n, random_state=seed)
+    return texts.tolist()
+
+
+def _bench_latency(
+    service: ABSAService, texts: Sequence[str], num_threads: int
+) -> Dict[str, float]:
+    service.latency_threads = num_threads
+    for text in texts[:3]:
+        service.analyze_text(text)
+    timings = []
+    for text in texts:
+        started = time.perf_counter()
+        service.analyze_text(text)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": statistics.median(timings),
+        "p95_ms": timings[min(len(timings) - 1, int(0.95 * len(timings)))],
+    }
+
+
+def _bulk_counts(service: ABSAService) -> Tuple[int, int]:
+    # (batches, rows) served so far in the scheduler's bulk lane.
+    stats = service.scheduler.stats().set_index("lane")
+    return int(stats.at[BULK, "served"]), int(stats.at[BULK, "rows"])
+
+
+def _bench_throughput(
+    service: ABSAService,
+    texts: Sequence[str],
+    num_threads: int,
+    batch_size: int,
+    token_budget: Optional[int],
+) -> Dict[str, float]:
+    service.throughput_threads = num_threads
+    service.token_budget = token_budget
+    service.analyze_batch(texts[: batch_size * 2], batch_size=batch_size)
+    batches_before, rows_before = _bulk_counts(service)
+    started = time.perf_counter()
+    service.analyze_batch(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    batches_after, rows_after = _bulk_counts(service)
+    batches = batches_after - batches_before
+    return {
+        "reviews_per_sec": len(texts) / elapsed if elapsed else float("inf"),
+        # Rows per forward actually run (aspect and sentiment), which the token
+        # budget or the scheduler can make smaller than `batch_size`.
+        "mean_batch_rows": (rows_after - rows_before) / batches if batches else 0.0,
+    }
+
+
+def _run_interop_trials(
+    base_dir: Optional[str],
+    interop_threads: int,
+    grid: TuneGrid,
+    latency_texts: Sequence[str],
+    throughput_texts: Sequence[str],
+    goals: Sequence[str],
+) -> List[Dict[str, object]]:
+    # Runs in a fresh process: the inter-op pool can only be sized once.
+    torch.set_num_interop_threads(interop_threads)
+    service = ABSAService(
+        base_dir=Path(base_dir) if base_dir else None, use_tuning_profile=False
+    )
+    trials: List[Dict[str, object]] = []
+    # Throughput first: every interactive request opens the scheduler's
+    # window in which bulk batches are capped, which would skew the
+    # batch-size grid if the latency trials ran before it.
+    if "throughput" in goals:
+        for num_threads in grid.num_threads:
+            for batch_size in grid.batch_sizes:
+                for token_budget in grid.token_budgets:
+                    trials.append(
+                        {
+                            "goal": "throughput",
+                            "num_threads": num_threads,
+                            "interop_threads": interop_threads,
+                            "batch_size": batch_size,
+                            "token_budget": token_budget,
+                            **_bench_throughput(
+                                service, throughput_texts, num_threads, batch_size, token_budget
+                            ),
+                        }
+                    )
+    if "latency" in goals:
+        for num_threads in grid.num_threads:
+            trials.append(
+                {
+                    "goal": "latency",
+                    "num_threads": num_threads,
+                    "interop_threads": interop_threads,
+                    **_bench_latency(service, latency_texts, num_threads),
+                }
+            )
+    return trials
+
+
+def autotune(
+    texts: Sequence[str],
+    goals: Sequence[str] = GOALS,
+    grid: Optional[TuneGrid] = None,
+    base_dir: Optional[Path] = None,
+    profile_path: Optional[Path] = None,
+    latency_sample: int = 32,
+) -> Dict[str, object]:
+    """
+    Chạy benchmark trên lưới cấu hình và ghi profile cho các mục tiêu `goals`.
+    Mục tiêu đã có trong profile cũ mà không được tune lại sẽ được giữ nguyên.
+    """
+
+    grid = grid or TuneGrid()
+    base_dir = base_dir or Path(__file__).resolve().parent
+    profile_path = profile_path or base_dir / TUNING_PROFILE_NAME
+    texts = list(texts)
+    latency_texts = texts[:latency_sample]
+
+    trials: List[Dict[str, object]] = []
+    context = multiprocessing.get_context("spawn")
+    for interop_threads in grid.interop_threads:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            trials += pool.submit(
+                _run_interop_trials,
+                str(base_dir),
+                interop_threads,
+                grid,
+                latency_texts,
+                texts,
+                tuple(goals),
+            ).result()
+
+    profile: Dict[str, object] = {}
+    if profile_path.exists():
+        with profile_path.open("r", encoding="utf-8") as f:
+            profile = json.load(f)
+    profile.update(
+        {
+            "host": platform.node(),
+            "cpu_count": os.cpu_count(),
+            "torch": torch.__version__,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "sample_size": len(texts),
+        }
+    )
+    latency_trials = [t for t in trials if t["goal"] == "latency"]
+    if latency_trials:
+        best = min(latency_trials, key=lambda t: t["p50_ms"])
+        profile["latency"] = {k: v for k, v in best.items() if k != "goal"}
+    throughput_trials = [t for t in trials if t["goal"] == "throughput"]
+    if throughput_trials:
+        best = max(throughput_trials, key=lambda t: t["reviews_per_sec"])
+        profile["throughput"] = {k: v for k, v in best.items() if k != "goal"}
+    profile["trials"] = trials
+
+    with profile_path.open("w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+    return profile
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--goal", choices=[*GOALS, "both"], default="both")
+    parser.add_argument("--input", type=Path, help="CSV/Excel chứa review thật")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--sample", type=int, default=256)
+    parser.add_argument("--base-dir", type=Path, help="Thư mục chứa models/")
+    parser.add_argument("--threads", type=_int_list)
+    parser.add_argument("--interop-threads", type=_int_list)
+    parser.add_argument("--batch-sizes", type=_int_list)
+    parser.add_argument(
+        "--token-budgets", type=_int_list, help="0 nghĩa là không giới hạn token"
+    )
+    args = parser.parse_args()
+
+    grid = TuneGrid()
+    if args.threads:
+        grid.num_threads = args.threads
+    if args.interop_threads:
+        grid.interop_threads = args.interop_threads
+    if args.batch_sizes:
+        grid.batch_sizes = args.batch_sizes
+    if args.token_budgets:
+        grid.token_budgets = [budget or None for budget in args.token_budgets]
+
+    if args.input:
+        texts = load_reviews(args.input, args.text_column, args.sample)
+    else:
+        texts = synthetic_reviews(args.sample)
+    goals = GOALS if args.goal == "both" else (args.goal,)
+
+    print(f"Tuning {', '.join(goals)} on {len(texts)} reviews: {asdict(grid)}")
+    profile = autotune(texts, goals=goals, grid=grid, base_dir=args.base_dir)
+    for goal in goals:
+        print(f"{goal}: {profile.get(goal)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import re
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from model_service import ABSAService, BatchOptions, BatchResult
+
+# Mersenne prime used for the universal hash family of MinHash.
+_PRIME = (1 << 61) - 1
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def normalize_text(text: object) -> str:
+    """
+    Chuẩn hoá để các biến thể emoji, dấu câu, khoảng trắng và hoa/thường
+    của cùng một review trở nên giống nhau.
+    """
+
+    text = unicodedata.normalize("NFC", str(text)).lower()
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def shingle_hashes(text: str, k: int = 5) -> np.ndarray:
+    if len(text) <= k:
+        grams = {text}
+    else:
+        grams = {text[i : i + k] for i in range(len(text) - k + 1)}
+    return np.fromiter(
+        (zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams)
+    )
+
+
+@dataclass
+class NearDuplicateGroups:
+    """
+    `representative[i]` là vị trí review đại diện cho review `i` (chính nó nếu
+    là đại diện). `leaders` là danh sách đại diện theo thứ tự xuất hiện và
+    `position[i]` là vị trí của đại diện đó trong `leaders`.
+    """
+
+    representative: np.ndarray
+    leaders: np.ndarray
+    position: np.ndarray
+
+    @classmethod
+    def from_representative(cls, representative: np.ndarray) -> "NearDuplicateGroups":
+        leaders, position = np.unique(representative, return_inverse=True)
+        return cls(representative=representative, leaders=leaders, position=position)
+
+    @property
+    def propagated(self) -> np.ndarray:
+        return self.representative != np.arange(len(self.representative))
+
+    @property
+    def saved(self) -> int:
+        return len(self.representative) - len(self.leaders)
+
+    def expand(self, rows: np.ndarray, n_total: int) -> "NearDuplicateGroups":
+        """
+        Chuyển nhóm tính trên tập con `rows` sang toàn bộ `n_total` dòng;
+        dòng ngoài tập con là đại diện của chính nó.
+        """
+
+        representative = np.arange(n_total, dtype=np.int64)
+        representative[rows] = rows[self.representative]
+        return NearDuplicateGroups.from_representative(representative)
+
+
+def find_near_duplicates(
+    texts: Sequence[object],
+    threshold: float = 0.9,
+    num_perm: int = 128,
+    bands: int = 32,
+    shingle_size: int = 5,
+    seed: int = 1,
+) -> NearDuplicateGroups:
+    """
+    Gom review gần trùng bằng MinHash + LSH.
+    Review trùng hẳn sau chuẩn hoá được gom trước bằng dict; phần còn lại được
+    so với các đại diện nằm chung bucket LSH và chỉ nhập nhóm khi Jaccard ước
+    lượng với đại diện đạt `threshold`, nên mọi thành viên đều giống đại diện
+    của nó (không nối chuỗi).
+    """
+
+    n = len(texts)
+    rows_per_band = num_perm // bands
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    representative = np.arange(n, dtype=np.int64)
+    exact: Dict[str, int] = {}
+    buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+    signatures: Dict[int, np.ndarray] = {}
+
+    for i, raw in enumerate(texts):
+        normalized = normalize_text(raw)
+        # Too short to shingle meaningfully: only exact raw repeats are merged.
+        key = normalized if len(normalized) >= shingle_size else f"\0{str(raw).strip()}"
+        if key in exact:
+            representative[i] = exact[key]
+            continue
+        exact[key] = i
+        if len(normalized) < shingle_size:
+            continue
+
+        hashes = shingle_hashes(normalized, shingle_size)
+        # (a * h + b) mod p, computed in uint64 with wrap-around like classic MinHash.
+        signature = ((np.outer(a, hashes) + b[:, None]) % _PRIME).min(axis=1)
+        band_keys = [
+            signature[band * rows_per_band : (band + 1) * rows_per_band].tobytes()
+            for band in range(bands)
+        ]
+
+        best, best_similarity = -1, threshold
+        seen = set()
+        for band, band_key in enumerate(band_keys):
+            for leader in buckets[band].get(band_key, ()):
+                if leader in seen:
+                    continue
+                seen.add(leader)
+                similarity = float(np.mean(signatures[leader] == signature))
+                if similarity >= best_similarity:
+                    best, best_similarity = leader, similarity
+        if best >= 0:
+            representative[i] = best
+            exact[key] = best
+            continue
+
+        signatures[i] = signature
+        for band, band_key in enumerate(band_keys):
+            buckets[band].setdefault(band_key, []).append(i)
+
+    return NearDuplicateGroups.from_representative(representative)
+
+
+def analyze_with_dedup(
+    service: ABSAService,
+    texts: Sequence[str],
+    groups: NearDuplicateGroups,
+    options: Optional[BatchOptions] = None,
+) -> BatchResult:
+    """
+    Chỉ chạy mô hình cho đại diện của mỗi nhóm rồi sao chép kết quả sang
+    các thành viên còn lại.
+    """
+
+    texts = [str(t) for t in texts]
+    leader_result = service.analyze_batch(
+        [texts[i] for i in groups.leaders], options=options
+    )
+    return leader_result.take(groups.position, texts=texts)
+
+
+def validate_propagation(
+    service: ABSAService,
+    texts: Sequence[str],
+    groups: NearDuplicateGroups,
+    result: BatchResult,
+    sample_size: int = 50,
+    seed: int = 0,
+) -> Dict[str, float]:
+    """
+    Chạy lại mô hình trên một mẫu review được sao chép kết quả và đo tỉ lệ
+    khớp nhãn sentiment tổng thể và tập aspect.
+    """
+
+    propagated = np.flatnonzero(groups.propagated)
+    if propagated.size == 0:
+        return {"sample_size": 0, "sentiment_agreement": 1.0, "aspect_agreement": 1.0}
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(propagated, size=min(sample_size, propagated.size), replace=False)
+    truth = service.analyze_batch([str(texts[i]) for i in sample])
+
+    sentiment_match = truth.overall_labels() == result.overall_labels()[sample]
+    aspect_match = [
+        {a.label for a in truth[j]["aspects"]} == {a.label for a in result[int(i)]["aspects"]}
+        for j, i in enumerate(sample)
+    ]
+    return {
+        "sample_size": int(sample.size),
+        "sentiment_agreement": float(np.mean(sentiment_match)),
+        "aspect_agreement": float(np.mean(aspect_match)),
+    }
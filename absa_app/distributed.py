@@ -0,0 +1,528 @@
+"""
+Phân tích batch phân tán: coordinator chia file thành shard, worker trên bất
+kỳ máy nào kết nối qua TCP, mỗi worker chạy một `ABSAService` và kéo shard về
+xử lý. Shard lỗi hoặc worker chết (hết hạn lease) được giao lại; kết quả
+được ghép đúng thứ tự gốc.
+
+    export ABSA_AUTHKEY=$(python -c "import secrets; print(secrets.token_hex(16))")
+    python distributed.py coordinator --input reviews.csv --output results.csv --bind 0.0.0.0:50051
+    python distributed.py worker --connect coordinator-host:50051 --base-dir .
+    python distributed.py local --workers 4 --input reviews.csv --output results.csv
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+from collections import deque
+from multiprocessing.managers import BaseManager
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from autotune import synthetic_reviews
+from model_registry import ModelRegistry
+from model_service import ABSAService, BatchOptions, BatchResult
+from results_store import ResultsStore
+from stand_in_models import build_stand_in_models
+from trend_store import TrendStore
+from triage import analyze_triaged, triage_texts
+
+DEFAULT_PORT = 50051
+AUTHKEY_ENV = "ABSA_AUTHKEY"
+
+Address = Tuple[str, int]
+
+
+class ShardQueue:
+    """
+    Hàng đợi shard sống trong tiến trình coordinator; worker gọi từ xa qua
+    proxy. Mỗi lần `lease` giao một shard kèm hạn chót, shard quá hạn hoặc
+    bị báo lỗi được trả lại hàng đợi cho tới `max_attempts` lần.
+    """
+
+    def __init__(
+        self,
+        texts: Sequence[str],
+        shard_size: int,
+        job: Dict[str, object],
+        lease_timeout: float = 600.0,
+        max_attempts: int = 3,
+    ) -> None:
+        self.texts = [str(t) for t in texts]
+        self.bounds = [
+            (start, min(start + shard_size, len(self.texts)))
+            for start in range(0, len(self.texts), shard_size)
+        ]
+        self.job = job
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.pending: Deque[int] = deque(range(len(self.bounds)))
+        self.leases: Dict[int, Tuple[str, float]] = {}
+        self.attempts = [0] * len(self.bounds)
+        self.results: Dict[int, BatchResult] = {}
+        self.errors: Dict[int, List[str]] = {}
+        self.workers: Dict[str, Dict[str, float]] = {}
+        self.failure: Optional[str] = None
+        self.finished = threading.Event()
+        self._lock = threading.Lock()
+        if not self.bounds:
+            self.finished.set()
+
+    def _requeue_expired(self, now: float) -> None:
+        for shard_id, (worker_id, deadline) in list(self.leases.items()):
+            if deadline < now:
+                del self.leases[shard_id]
+                self._retry(shard_id, f"lease expired on {worker_id}")
+
+    def _retry(self, shard_id: int, error: str) -> None:
+        self.errors.setdefault(shard_id, []).append(error)
+        if self.attempts[shard_id] >= self.max_attempts:
+            self.failure = f"shard {shard_id} failed {self.attempts[shard_id]} times: {error}"
+            self.finished.set()
+        else:
+            self.pending.appendleft(shard_id)
+
+    def get_job(self) -> Dict[str, object]:
+        return dict(self.job)
+
+    def lease(self, worker_id: str) -> Dict[str, object]:
+        """
+        `{"status": "shard", "shard_id", "texts"}`, `{"status": "wait"}` khi
+        các shard còn lại đang được worker khác xử lý, hoặc `{"status": "done"}`.
+        """
+
+        now = time.time()
+        with self._lock:
+            self.workers.setdefault(worker_id, {"shards": 0, "rows": 0, "seconds": 0.0})
+            self.workers[worker_id]["last_seen"] = now
+            self._requeue_expired(now)
+            if self.finished.is_set():
+                return {"status": "done"}
+            if not self.pending:
+                return {"status": "wait"}
+            shard_id = self.pending.popleft()
+            self.attempts[shard_id] += 1
+            self.leases[shard_id] = (worker_id, now + self.lease_timeout)
+            start, end = self.bounds[shard_id]
+            return {"status": "shard", "shard_id": shard_id, "texts": self.texts[start:end]}
+
+    def complete(
+        self, shard_id: int, result: BatchResult, worker_id: str, seconds: float
+    ) -> None:
+        with self._lock:
+            self.leases.pop(shard_id, None)
+            if shard_id in self.results or self.finished.is_set():
+                # A retried shard finished twice; the first result wins.
+                return
+            start, end = self.bounds[shard_id]
+            if len(result.offsets) != end - start + 1:
+                self._retry(shard_id, f"{worker_id} returned {len(result.offsets) - 1} rows")
+                return
+            version = self.job.get("model_version")
+            if version and result.model_version and result.model_version != version:
+                self._retry(shard_id, f"{worker_id} ran {result.model_version}, job pins {version}")
+                return
+            self.results[shard_id] = result
+            self.pending = deque(s for s in self.pending if s != shard_id)
+            stats = self.workers.setdefault(worker_id, {"shards": 0, "rows": 0, "seconds": 0.0})
+            stats["shards"] += 1
+            stats["rows"] += end - start
+            stats["seconds"] += seconds
+            if len(self.results) == len(self.bounds):
+                self.finished.set()
+
+    def fail(self, shard_id: int, error: str, worker_id: str) -> None:
+        with self._lock:
+            if self.leases.pop(shard_id, None) is None or shard_id in self.results:
+                return
+            self._retry(shard_id, f"{worker_id}: {error}")
+
+    def progress(self) -> Dict[str, object]:
+        with self._lock:
+            self._requeue_expired(time.time())
+            return {
+                "shards": len(self.bounds),
+                "done": len(self.results),
+                "leased": len(self.leases),
+                "pending": len(self.pending),
+                "retries": sum(len(errors) for errors in self.errors.values()),
+                "workers": {name: dict(stats) for name, stats in self.workers.items()},
+            }
+
+
+class _WorkerManager(BaseManager):
+    pass
+
+
+_WorkerManager.register("shards")
+
+
+def _parse_address(value: str) -> Address:
+    host, _, port = value.rpartition(":")
+    return (host or "127.0.0.1", int(port or DEFAULT_PORT))
+
+
+def _authkey(value: Optional[str]) -> bytes:
+    # The manager unpickles whatever authenticated clients send, so there is
+    # deliberately no built-in default key.
+    key = value or os.environ.get(AUTHKEY_ENV)
+    if not key:
+        raise SystemExit(
+            f"Thiếu authkey: truyền --authkey hoặc đặt biến ${AUTHKEY_ENV} "
+            "(ví dụ `python -c \"import secrets; print(secrets.token_hex(16))\"`)."
+        )
+    return key.encode("utf-8")
+
+
+class Coordinator:
+    """
+    Phục vụ một `ShardQueue` qua TCP (multiprocessing manager, xác thực bằng
+    `authkey`) và ghép kết quả khi mọi shard đã xong. Mặc định chỉ nghe trên
+    `127.0.0.1`; không truyền `authkey` thì dùng một khoá ngẫu nhiên (đọc lại
+    ở `self.authkey`).
+    """
+
+    def __init__(
+        self,
+        texts: Sequence[str],
+        address: Address = ("127.0.0.1", DEFAULT_PORT),
+        authkey: Optional[bytes] = None,
+        shard_size: int = 1000,
+        lease_timeout: float = 600.0,
+        max_attempts: int = 3,
+        job: Optional[Dict[str, object]] = None,
+    ) -> None:
+        self.authkey = authkey or os.urandom(16)
+        self.queue = ShardQueue(
+            texts, shard_size, job or {}, lease_timeout=lease_timeout, max_attempts=max_attempts
+        )
+        # Manager registries are class-level; a class per coordinator keeps
+        # several coordinators (and in-process workers) from sharing one queue.
+        manager_cls = type("_CoordinatorManager", (BaseManager,), {})
+        manager_cls.register("shards", callable=lambda: self.queue)
+        self._server = manager_cls(address=address, authkey=self.authkey).get_server()
+        self.address: Address = self._server.address
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self) -> "Coordinator":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        stop_event = getattr(self._server, "stop_event", None)
+        if stop_event is not None:
+            stop_event.set()
+        self._server.listener.close()
+
+    def wait(self, timeout: Optional[float] = None, report_every: float = 0.0) -> BatchResult:
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.queue.finished.wait(report_every or 1.0):
+            if report_every:
+                _print_progress(self.queue.progress())
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError(f"Distributed job not finished: {self.queue.progress()}")
+        if self.queue.failure:
+            raise RuntimeError(self.queue.failure)
+        return self.merged()
+
+    def merged(self) -> BatchResult:
+        queue = self.queue
+        if not queue.bounds:
+            return BatchResult.constant([], [], ["NEU"])
+        merged = BatchResult.concat([queue.results[i] for i in range(len(queue.bounds))])
+        merged.texts = list(queue.texts)
+        return merged
+
+
+def run_worker(
+    address: Address,
+    authkey: bytes,
+    base_dir: Optional[Path] = None,
+    worker_id: Optional[str] = None,
+    num_threads: Optional[int] = None,
+    poll_interval: float = 0.5,
+) -> int:
+    """
+    Kết nối tới coordinator, kéo shard cho tới khi job xong; trả về số shard
+    đã xử lý. Lỗi trong một shard được báo về để coordinator giao lại.
+    """
+
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    manager = _WorkerManager(address=address, authkey=authkey)
+    manager.connect()
+    shards = manager.shards()
+    job = shards.get_job()
+
+    service = ABSAService(
+        base_dir=base_dir,
+        aspect_threshold=float(job.get("aspect_threshold", 0.3)),
+        version=job.get("model_version"),
+    )
+    if num_threads:
+        service.throughput_threads = num_threads
+    options = BatchOptions(memory_budget_mb=job.get("memory_budget_mb"))
+
+    done = 0
+    while True:
+        try:
+            task = shards.lease(worker_id)
+        except (EOFError, OSError):
+            task = None
+        # The coordinator stops serving as soon as the last shard is in, so a
+        # dropped connection or empty reply at that point also means done.
+        if task is None or task["status"] == "done":
+            return done
+        if task["status"] == "wait":
+            time.sleep(poll_interval)
+            continue
+        texts = task["texts"]
+        started = time.perf_counter()
+        try:
+            result = analyze_triaged(service, texts, triage_texts(texts), options=options)
+        except Exception as exc:  # noqa: BLE001 - reported back for a retry
+            shards.fail(task["shard_id"], repr(exc), worker_id)
+            continue
+        # Texts already live on the coordinator; ship only the arrays.
+        result.texts = []
+        shards.complete(task["shard_id"], result, worker_id, time.perf_counter() - started)
+        done += 1
+
+
+def run_local(
+    texts: Sequence[str],
+    workers: int = 2,
+    base_dir: Optional[Path] = None,
+    shard_size: int = 1000,
+    job: Optional[Dict[str, object]] = None,
+    report_every: float = 0.0,
+) -> BatchResult:
+    """
+    Coordinator trên `127.0.0.1` cùng `workers` tiến trình worker cục bộ
+    (chia đều số core), dùng để thử hoặc chạy trên một máy nhiều core.
+    """
+
+    authkey = os.urandom(16)
+    coordinator = Coordinator(
+        texts, address=("127.0.0.1", 0), authkey=authkey, shard_size=shard_size, job=job
+    ).start()
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=run_worker,
+            args=(coordinator.address, authkey, base_dir, f"local-{i}", threads),
+            daemon=True,
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        return coordinator.wait(report_every=report_every)
+    finally:
+        for process in processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+        coordinator.stop()
+
+
+def result_frame(source: pd.DataFrame, result: BatchResult) -> pd.DataFrame:
+    """
+    Các cột gốc của `source` cùng `row_id` (index gốc của dòng) và kết quả,
+    ghép theo `row_id` để nối lại được với file đầu vào.
+    """
+
+    labels = result.aspect_labels()
+    sentiments = result.aspect_sentiment_labels()
+    offsets = result.offsets.tolist()
+    aspects_display = [
+        "; ".join(
+            f"{labels[j]} ({sentiments[j]}, {result.sentiment_scores[j]:.2f})"
+            for j in range(start, end)
+        )
+        or "-"
+        for start, end in zip(offsets[:-1], offsets[1:])
+    ]
+    predictions = pd.DataFrame(
+        {
+            "row_id": source.index,
+            "sentiment_label": result.overall_labels(),
+            "sentiment_score": result.overall_scores,
+            "aspects_display": aspects_display,
+            "model_version": result.model_version,
+        }
+    )
+    return (
+        source.rename_axis("row_id")
+        .reset_index()
+        .merge(predictions, on="row_id", how="left", suffixes=("", "_absa"), validate="1:1")
+    )
+
+
+def _print_progress(progress: Dict[str, object]) -> None:
+    rows = sum(stats["rows"] for stats in progress["workers"].values())
+    print(
+        f"shards {progress['done']}/{progress['shards']} · leased {progress['leased']} · "
+        f"retries {progress['retries']} · {rows:,} rows · {len(progress['workers'])} workers"
+    )
+
+
+def _save(args: argparse.Namespace, source: pd.DataFrame, result: BatchResult) -> None:
+    texts = _texts(source, args.text_column)
+    frame = result_frame(source, result)
+    if args.output:
+        frame.to_csv(args.output, index=False)
+        print(f"Đã ghi {len(frame):,} dòng vào {args.output}")
+    if args.store:
+        run_id = TrendStore.new_run_id()
+        ResultsStore().write_run(
+            run_id,
+            texts=texts,
+            sentiment_labels=result.overall_labels().tolist(),
+            sentiment_scores=result.overall_scores.tolist(),
+            row_ids=result.row_ids(),
+            aspects=result.aspect_labels().tolist(),
+            aspect_scores=result.aspect_scores.tolist(),
+            aspect_sentiments=result.aspect_sentiment_labels().tolist(),
+            aspect_sentiment_scores=result.sentiment_scores.tolist(),
+            source_name=args.input.name if args.input else "synthetic",
+            text_column=args.text_column,
+            model_version=result.model_version,
+        )
+        print(f"Đã lưu run {run_id} vào kho kết quả")
+
+
+def _load_source(args: argparse.Namespace) -> pd.DataFrame:
+    # Every row is kept (empty texts are analysed as empty) so the output
+    # lines up with the input by `row_id`.
+    if not args.input:
+        return pd.DataFrame({args.text_column: synthetic_reviews(args.sample)})
+    if args.input.suffix.lower() in [".xls", ".xlsx"]:
+        return pd.read_excel(args.input)
+    return pd.read_csv(args.input)
+
+
+def _texts(source: pd.DataFrame, text_column: str) -> List[str]:
+    return source[text_column].fillna("").astype(str).tolist()
+
+
+def _active_version(base_dir: Optional[Path]) -> str:
+    # Pinned once on the coordinator so no worker falls back to its own
+    # registry's active version mid-job.
+    base_dir = base_dir or Path(__file__).resolve().parent
+    return ModelRegistry(base_dir / "models").active()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    def job_arguments(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--input", type=Path, help="CSV/Excel; mặc định review tổng hợp")
+        p.add_argument("--text-column", default="text")
+        p.add_argument("--sample", type=int, default=5000, help="Số review tổng hợp")
+        p.add_argument("--shard-size", type=int, default=1000)
+        p.add_argument("--model-version", help="Phiên bản mô hình mọi worker phải dùng")
+        p.add_argument("--aspect-threshold", type=float, default=0.3)
+        p.add_argument("--memory-budget", type=float, help="MB, bật batch thích ứng trên worker")
+        p.add_argument("--output", type=Path, help="Ghi kết quả CSV")
+        p.add_argument("--store", action="store_true", help="Lưu thành một run trong kho SQLite")
+
+    coordinator_parser = sub.add_parser("coordinator")
+    job_arguments(coordinator_parser)
+    coordinator_parser.add_argument(
+        "--bind",
+        default=f"127.0.0.1:{DEFAULT_PORT}",
+        help="Chỉ mở ra mạng (ví dụ 0.0.0.0:50051) khi mạng nội bộ tin cậy",
+    )
+    coordinator_parser.add_argument("--authkey", help=f"Bắt buộc nếu không đặt ${AUTHKEY_ENV}")
+    coordinator_parser.add_argument(
+        "--base-dir",
+        type=Path,
+        help="Thư mục chứa models/, để chọn phiên bản đang dùng khi không truyền --model-version",
+    )
+    coordinator_parser.add_argument("--lease-timeout", type=float, default=600.0)
+    coordinator_parser.add_argument("--max-attempts", type=int, default=3)
+
+    worker_parser = sub.add_parser("worker")
+    worker_parser.add_argument("--connect", default=f"127.0.0.1:{DEFAULT_PORT}")
+    worker_parser.add_argument("--authkey", help=f"Bắt buộc nếu không đặt ${AUTHKEY_ENV}")
+    worker_parser.add_argument("--base-dir", type=Path, help="Thư mục chứa models/")
+    worker_parser.add_argument("--threads", type=int)
+    worker_parser.add_argument("--worker-id")
+
+    local_parser = sub.add_parser("local")
+    job_arguments(local_parser)
+    local_parser.add_argument("--workers", type=int, default=2)
+    local_parser.add_argument(
+        "--base-dir",
+        type=Path,
+        help="Thư mục chứa models/; mặc định dùng mô hình nhỏ tạo tạm",
+    )
+    args = parser.parse_args()
+
+    if args.mode == "worker":
+        shards = run_worker(
+            _parse_address(args.connect),
+            _authkey(args.authkey),
+            base_dir=args.base_dir,
+            worker_id=args.worker_id,
+            num_threads=args.threads,
+        )
+        print(f"Worker xong, đã xử lý {shards} shard")
+        return
+
+    # Fail on a missing key before reading a possibly large input.
+    authkey = _authkey(args.authkey) if args.mode == "coordinator" else None
+    source = _load_source(args)
+    texts = _texts(source, args.text_column)
+    base_dir = args.base_dir
+    if args.mode == "local" and base_dir is None:
+        base_dir = build_stand_in_models(Path(tempfile.gettempdir()) / "absa_stand_in")
+    job = {
+        "model_version": args.model_version or _active_version(base_dir),
+        "aspect_threshold": args.aspect_threshold,
+        "memory_budget_mb": args.memory_budget,
+    }
+    started = time.perf_counter()
+    if args.mode == "coordinator":
+        coordinator = Coordinator(
+            texts,
+            address=_parse_address(args.bind),
+            authkey=authkey,
+            shard_size=args.shard_size,
+            lease_timeout=args.lease_timeout,
+            max_attempts=args.max_attempts,
+            job=job,
+        ).start()
+        print(
+            f"Coordinator tại {coordinator.address[0]}:{coordinator.address[1]}, "
+            f"{len(texts):,} review, mô hình {job['model_version']}"
+        )
+        try:
+            result = coordinator.wait(report_every=5.0)
+        finally:
+            coordinator.stop()
+    else:
+        print(f"Chạy {args.workers} worker cục bộ trên {len(texts):,} review, models từ {base_dir}")
+        result = run_local(
+            texts,
+            workers=args.workers,
+            base_dir=base_dir,
+            shard_size=args.shard_size,
+            job=job,
+            report_every=5.0,
+        )
+    elapsed = time.perf_counter() - started
+    print(f"Xong {len(texts):,} review trong {elapsed:.1f}s ({len(texts) / elapsed:,.0f} review/s)")
+    _save(args, source, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Rows scored per matmul block; bounds the float32 copy of a float16 block.
+SEARCH_BLOCK_ROWS = 65_536
+# Below this size exact search is already a few milliseconds, so no partitions are built.
+APPROX_MIN_ROWS = 50_000
+# Rows sampled to train partition centroids.
+KMEANS_SAMPLE_ROWS = 50_000
+KMEANS_ITERATIONS = 10
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    # Positions of the k largest scores, best first.
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def train_partitions(
+    vectors: np.ndarray, n_partitions: int, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    K-means cầu (cosine) trên một mẫu các vector đã chuẩn hoá, rồi gán mọi
+    dòng vào tâm gần nhất theo từng khối. Trả về (centroids, assignment).
+    """
+
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_ids = np.sort(rng.choice(n, size=min(n, KMEANS_SAMPLE_ROWS), replace=False))
+    sample = normalize_rows(vectors[sample_ids])
+    centroids = sample[rng.choice(len(sample), size=n_partitions, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        labels = (sample @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = np.bincount(labels, minlength=n_partitions) == 0
+        # Re-seed empty partitions from random sample rows.
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = normalize_rows(sums)
+
+    assignment = np.empty(n, dtype=np.int32)
+    for start in range(0, n, SEARCH_BLOCK_ROWS):
+        block = np.asarray(vectors[start : start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+        assignment[start : start + len(block)] = (block @ centroids.T).argmax(axis=1)
+    return centroids.astype(np.float32), assignment
+
+
+@dataclass
+class SearchHit:
+    rows: np.ndarray
+    scores: np.ndarray
+    mode: str
+    scanned: int
+
+
+class EmbeddingIndex:
+    """
+    Chỉ mục embedding review của một run: ma trận float16 (đã chuẩn hoá L2)
+    lưu bằng `np.memmap` tại `<dir>/<run_id>.f16`, nên chỉ phần được quét mới
+    nằm trong RAM. Tìm kiếm chính xác là nhân ma trận theo khối; với run lớn
+    có thêm chế độ xấp xỉ phân vùng (IVF): các dòng được xếp theo vùng k-means
+    và truy vấn chỉ quét `nprobe` vùng gần nhất.
+    """
+
+    def __init__(self, directory: Path, run_id: str) -> None:
+        self.directory = directory
+        self.run_id = run_id
+        with self._path(".json").open("r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        n_rows, dim = self.meta["n_rows"], self.meta["dim"]
+        self.vectors = np.memmap(
+            self._path(".f16"), dtype=np.float16, mode="r", shape=(n_rows, dim)
+        )
+        self.row_ids: Optional[np.ndarray] = None
+        self.centroids: Optional[np.ndarray] = None
+        self.partition_offsets: Optional[np.ndarray] = None
+        if self.meta.get("partitions"):
+            arrays = np.load(self._path(".ivf.npz"))
+            self.row_ids = arrays["row_ids"]
+            self.centroids = arrays["centroids"]
+            self.partition_offsets = arrays["offsets"]
+
+    def _path(self, suffix: str) -> Path:
+        return self.directory / f"{self.run_id}{suffix}"
+
+    @property
+    def model_version(self) -> str:
+        return self.meta.get("model_version", "")
+
+    @property
+    def dim(self) -> int:
+        return int(self.meta["dim"])
+
+    def __len__(self) -> int:
+        return int(self.meta["n_rows"])
+
+    @staticmethod
+    def remove(directory: Path, run_id: str) -> None:
+        """
+        Xoá các file của run `run_id` (metadata trước, để không ai mở được
+        nữa, rồi ma trận và phân vùng) nếu có.
+        """
+
+        for suffix in (".json", ".f16", ".ivf.npz"):
+            try:
+                (directory / f"{run_id}{suffix}").unlink(missing_ok=True)
+            except OSError:
+                # Still mapped by a reader on Windows; a later cleanup takes it.
+                pass
+
+    @classmethod
+    def build(
+        cls,
+        directory: Path,
+        run_id: str,
+        embeddings: np.ndarray,
+        model_version: str = "",
+        partitioned: Optional[bool] = None,
+    ) -> "EmbeddingIndex":
+        """
+        Ghi `embeddings` (mỗi dòng một review) ra đĩa. Mặc định chỉ dựng phân
+        vùng khi run có từ `APPROX_MIN_ROWS` dòng; khi có phân vùng, ma trận
+        được ghi theo thứ tự vùng để mỗi vùng là một đoạn liền trên đĩa.
+        """
+
+        directory.mkdir(parents=True, exist_ok=True)
+        n_rows, dim = embeddings.shape
+        if partitioned is None:
+            partitioned = n_rows >= APPROX_MIN_ROWS
+        n_partitions = int(np.clip(4 * np.sqrt(n_rows), 16, 4096)) if partitioned else 0
+        n_partitions = min(n_partitions, n_rows)
+
+        order = None
+        if n_partitions:
+            centroids, assignment = train_partitions(embeddings, n_partitions)
+            order = np.argsort(assignment, kind="stable")
+            offsets = np.zeros(n_partitions + 1, dtype=np.int64)
+            np.cumsum(np.bincount(assignment, minlength=n_partitions), out=offsets[1:])
+            np.savez(
+                directory / f"{run_id}.ivf.npz",
+                row_ids=order.astype(np.int64),
+                centroids=centroids,
+                offsets=offsets,
+            )
+
+        matrix = np.memmap(
+            directory / f"{run_id}.f16", dtype=np.float16, mode="w+", shape=(n_rows, dim)
+        )
+        for start in range(0, n_rows, SEARCH_BLOCK_ROWS):
+            rows = slice(start, start + SEARCH_BLOCK_ROWS)
+            block = embeddings[order[rows]] if order is not None else embeddings[rows]
+            matrix[rows] = normalize_rows(block)
+        matrix.flush()
+        del matrix
+
+        meta = {
+            "n_rows": int(n_rows),
+            "dim": int(dim),
+            "model_version": model_version,
+            "partitions": int(n_partitions),
+        }
+        with (directory / f"{run_id}.json").open("w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return cls(directory, run_id)
+
+    def _scan(
+        self, query: np.ndarray, start: int, end: int, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Exact top-k over stored positions [start, end), block by block.
+        best_pos = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        for block_start in range(start, end, SEARCH_BLOCK_ROWS):
+            block_end = min(end, block_start + SEARCH_BLOCK_ROWS)
+            block = np.asarray(self.vectors[block_start:block_end], dtype=np.float32)
+            scores = block @ query
+            top = _top_k(scores, k)
+            best_pos = np.concatenate([best_pos, top + block_start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+            keep = _top_k(best_scores, k)
+            best_pos, best_scores = best_pos[keep], best_scores[keep]
+        return best_pos, best_scores
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 10,
+        mode: str = "auto",
+        nprobe: int = 8,
+    ) -> SearchHit:
+        """
+        Top-`k` review gần `query` nhất theo cosine. `mode` là "exact",
+        "approx" (cần phân vùng) hoặc "auto" (approx nếu có phân vùng).
+        `rows` trong kết quả là vị trí review trong run.
+        """
+
+        query = normalize_rows(np.asarray(query).reshape(-1))
+        partitioned = self.centroids is not None
+        if mode == "auto":
+            mode = "approx" if partitioned else "exact"
+        if mode == "approx" and not partitioned:
+            raise ValueError(f"Run {self.run_id} has no partitions; use exact search")
+
+        if mode == "exact":
+            positions, scores = self._scan(query, 0, len(self), k)
+            scanned = len(self)
+        else:
+            probes = _top_k(self.centroids @ query, nprobe)
+            positions = np.zeros(0, dtype=np.int64)
+            scores = np.zeros(0, dtype=np.float32)
+            scanned = 0
+            for partition in probes:
+                start, end = self.partition_offsets[partition], self.partition_offsets[partition + 1]
+                found, found_scores = self._scan(query, int(start), int(end), k)
+                positions = np.concatenate([positions, found])
+                scores = np.concatenate([scores, found_scores])
+                scanned += int(end - start)
+            keep = _top_k(scores, k)
+            positions, scores = positions[keep], scores[keep]
+
+        rows = self.row_ids[positions] if self.row_ids is not None else positions
+        return SearchHit(rows=rows, scores=scores, mode=mode, scanned=scanned)
@@ -0,0 +1,269 @@
+"""
+Load test cho một `ABSAService` dùng chung, mô phỏng nhiều analyst trên tab
+phân tích câu (`analyze_text`) cùng lúc với các lần upload file chạy nền
+(`analyze_batch`). Báo cáo p50/p95/p99, thông lượng, CPU và bộ nhớ theo thời gian.
+
+    python loadtest.py --users 8 --rate 0.5 --duration 60
+    python loadtest.py --users 16 --batch-interval 15 --batch-rows 500 --output report.json
+    python loadtest.py --base-dir .            # dùng mô hình thật trong ./models
+    python loadtest.py --batch-interval 5 --latency-target 0   # tắt làn ưu tiên để so sánh
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from adaptive_batch import current_rss_mb
+from autotune import synthetic_reviews
+from model_service import ABSAService
+from stand_in_models import build_stand_in_models
+
+
+@dataclass
+class LoadTestConfig:
+    users: int = 4
+    # Mean interactive requests per second for each user (Poisson arrivals).
+    rate: float = 1.0
+    duration: float = 30.0
+    # Mean seconds between background batch uploads; 0 disables them.
+    batch_interval: float = 0.0
+    batch_rows: int = 200
+    sample_interval: float = 1.0
+    seed: int = 0
+
+
+@dataclass
+class LoadTestReport:
+    config: LoadTestConfig
+    # (finished_at, latency_ms) relative to the start of the test.
+    interactive: List[tuple] = field(default_factory=list)
+    batches: List[tuple] = field(default_factory=list)
+    batch_rows: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+    timeline: List[Dict[str, float]] = field(default_factory=list)
+    # Per-lane queue/latency snapshot from the service scheduler, if enabled.
+    lanes: List[Dict[str, object]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @staticmethod
+    def _percentiles(latencies: Sequence[float]) -> Dict[str, float]:
+        if not latencies:
+            return {"count": 0}
+        values = np.asarray(latencies)
+        return {
+            "count": int(values.size),
+            "p50_ms": float(np.percentile(values, 50)),
+            "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99)),
+            "max_ms": float(values.max()),
+        }
+
+    def summary(self) -> Dict[str, object]:
+        elapsed = self.elapsed or 1.0
+        return {
+            "interactive": {
+                **self._percentiles([lat for _, lat in self.interactive]),
+                "throughput_rps": len(self.interactive) / elapsed,
+            },
+            "batch": {
+                **self._percentiles([lat for _, lat in self.batches]),
+                "rows_per_sec": self.batch_rows / elapsed,
+            },
+            "errors": dict(self.errors),
+            "lanes": self.lanes,
+            "peak_rss_mb": max((s["rss_mb"] for s in self.timeline), default=0.0),
+            "mean_cpu_cores": float(np.mean([s["cpu_cores"] for s in self.timeline]))
+            if self.timeline
+            else 0.0,
+        }
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "config": asdict(self.config),
+            "summary": self.summary(),
+            "timeline": self.timeline,
+        }
+
+
+def _cpu_seconds() -> float:
+    times = os.times()
+    return times.user + times.system
+
+
+def run_load_test(
+    service: ABSAService,
+    texts: Sequence[str],
+    config: LoadTestConfig,
+) -> LoadTestReport:
+    report = LoadTestReport(config=config)
+    lock = threading.Lock()
+    stop = threading.Event()
+    started = time.perf_counter()
+    deadline = started + config.duration
+
+    def record_error(exc: Exception) -> None:
+        with lock:
+            name = type(exc).__name__
+            report.errors[name] = report.errors.get(name, 0) + 1
+
+    def user_loop(user_id: int) -> None:
+        rng = random.Random(config.seed * 1000 + user_id)
+        while not stop.is_set():
+            stop.wait(rng.expovariate(config.rate))
+            if stop.is_set() or time.perf_counter() >= deadline:
+                return
+            t0 = time.perf_counter()
+            try:
+                service.analyze_text(rng.choice(texts))
+            except Exception as exc:  # noqa: BLE001 - counted in the report
+                record_error(exc)
+                continue
+            t1 = time.perf_counter()
+            with lock:
+                report.interactive.append((t1 - started, (t1 - t0) * 1000))
+
+    def batch_loop() -> None:
+        rng = random.Random(config.seed - 1)
+        while not stop.is_set():
+            stop.wait(rng.expovariate(1.0 / config.batch_interval))
+            if stop.is_set() or time.perf_counter() >= deadline:
+                return
+            rows = [rng.choice(texts) for _ in range(config.batch_rows)]
+            t0 = time.perf_counter()
+            try:
+                service.analyze_batch(rows)
+            except Exception as exc:  # noqa: BLE001 - counted in the report
+                record_error(exc)
+                continue
+            t1 = time.perf_counter()
+            with lock:
+                report.batches.append((t1 - started, (t1 - t0) * 1000))
+                report.batch_rows += len(rows)
+
+    def monitor_loop() -> None:
+        last_wall, last_cpu, last_done = time.perf_counter(), _cpu_seconds(), 0
+        while not stop.wait(config.sample_interval):
+            now, cpu = time.perf_counter(), _cpu_seconds()
+            with lock:
+                done = len(report.interactive)
+                window = [lat for _, lat in report.interactive[last_done:]]
+            report.timeline.append(
+                {
+                    "t": now - started,
+                    "cpu_cores": (cpu - last_cpu) / max(now - last_wall, 1e-9),
+                    "rss_mb": current_rss_mb(),
+                    "interactive_rps": (done - last_done) / max(now - last_wall, 1e-9),
+                    "interactive_p95_ms": float(np.percentile(window, 95)) if window else 0.0,
+                }
+            )
+            last_wall, last_cpu, last_done = now, cpu, done
+
+    threads = [
+        threading.Thread(target=user_loop, args=(i,), daemon=True)
+        for i in range(config.users)
+    ]
+    if config.batch_interval > 0:
+        threads.append(threading.Thread(target=batch_loop, daemon=True))
+    monitor = threading.Thread(target=monitor_loop, daemon=True)
+    monitor.start()
+    for thread in threads:
+        thread.start()
+
+    time.sleep(max(0.0, deadline - time.perf_counter()))
+    stop.set()
+    for thread in threads:
+        thread.join()
+    monitor.join()
+    report.elapsed = time.perf_counter() - started
+    if service.scheduler is not None:
+        report.lanes = service.scheduler.stats().to_dict("records")
+    return report
+
+
+def _print_report(report: LoadTestReport) -> None:
+    summary = report.summary()
+    interactive, batch = summary["interactive"], summary["batch"]
+    print(f"\nInteractive ({interactive['count']} requests, {interactive['throughput_rps']:.1f} req/s)")
+    if interactive["count"]:
+        print(
+            f"  p50 {interactive['p50_ms']:.1f} ms · p95 {interactive['p95_ms']:.1f} ms · "
+            f"p99 {interactive['p99_ms']:.1f} ms · max {interactive['max_ms']:.1f} ms"
+        )
+    if batch["count"]:
+        print(
+            f"Batch ({batch['count']} uploads, {batch['rows_per_sec']:.1f} rows/s): "
+            f"p50 {batch['p50_ms']:.0f} ms · p95 {batch['p95_ms']:.0f} ms"
+        )
+    if summary["errors"]:
+        print(f"Errors: {summary['errors']}")
+    for lane in summary["lanes"]:
+        print(
+            f"Làn {lane['lane']}: {lane['served']} lượt · chờ p95 {lane['wait_p95_ms']:.1f} ms · "
+            f"tổng p95 {lane['latency_p95_ms']:.1f} ms"
+        )
+    print(f"CPU trung bình {summary['mean_cpu_cores']:.2f} core · RSS đỉnh {summary['peak_rss_mb']:.0f} MB")
+    print("\n     t   cpu   rss_mb   req/s   p95_ms")
+    for sample in report.timeline:
+        print(
+            f"{sample['t']:6.1f} {sample['cpu_cores']:5.2f} {sample['rss_mb']:8.0f} "
+            f"{sample['interactive_rps']:7.1f} {sample['interactive_p95_ms']:8.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=1.0, help="req/s mỗi user")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--batch-interval", type=float, default=0.0)
+    parser.add_argument("--batch-rows", type=int, default=200)
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument(
+        "--base-dir",
+        type=Path,
+        help="Thư mục chứa models/; mặc định dùng mô hình nhỏ tạo tạm",
+    )
+    parser.add_argument(
+        "--latency-target",
+        type=float,
+        default=0.5,
+        help="Mục tiêu độ trễ (giây) của làn interactive; 0 = tắt lập lịch ưu tiên",
+    )
+    parser.add_argument("--output", type=Path, help="Ghi báo cáo JSON")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = LoadTestConfig(
+        users=args.users,
+        rate=args.rate,
+        duration=args.duration,
+        batch_interval=args.batch_interval,
+        batch_rows=args.batch_rows,
+        sample_interval=args.sample_interval,
+        seed=args.seed,
+    )
+    base_dir: Optional[Path] = args.base_dir
+    if base_dir is None:
+        base_dir = build_stand_in_models(Path(tempfile.gettempdir()) / "absa_stand_in")
+    service = ABSAService(base_dir=base_dir, latency_target=args.latency_target or None)
+    texts = synthetic_reviews(500, seed=args.seed)
+
+    print(f"Load test: {asdict(config)} · models từ {base_dir}")
+    report = run_load_test(service, texts, config)
+    _print_report(report)
+    if args.output:
+        with args.output.open("w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import json
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+# Version name for the flat `models/aspect|sentiment` layout used before the registry.
+LEGACY_VERSION = "default"
+REGISTRY_FILE = "registry.json"
+
+
+def read_labels(model_dir: Path) -> Dict[int, str]:
+    custom_labels_path = model_dir / "labels.json"
+    if custom_labels_path.exists():
+        with custom_labels_path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            return {idx: label for idx, label in enumerate(data)}
+        if isinstance(data, dict):
+            try:
+                return {int(idx): label for idx, label in data.items()}
+            except ValueError:
+                # keys might be string labels -> invert order preserving
+                return {
+                    idx: label for idx, label in enumerate(data.values())
+                }
+
+    config_path = model_dir / "config.json"
+    if not config_path.exists():
+        return {}
+    with config_path.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    id2label = data.get("id2label", {})
+    return {int(idx): label for idx, label in id2label.items()}
+
+
+@dataclass
+class ModelBundle:
+    """
+    Cặp mô hình aspect/sentiment của một phiên bản, nạp sẵn lên `device`.
+    Bundle không bị sửa sau khi tạo, nên request nào giữ tham chiếu tới bundle
+    thì chạy trọn vẹn trên đúng phiên bản đó kể cả khi service đã chuyển bản.
+    """
+
+    version: str
+    aspect_dir: Path
+    sentiment_dir: Path
+    aspect_tokenizer: object
+    aspect_model: torch.nn.Module
+    sentiment_tokenizer: object
+    sentiment_model: torch.nn.Module
+    aspect_labels: Dict[int, str]
+    sentiment_labels: Dict[int, str]
+
+    @classmethod
+    def load(cls, version: str, model_dir: Path, device: str) -> "ModelBundle":
+        aspect_dir = model_dir / "aspect"
+        sentiment_dir = model_dir / "sentiment"
+        if not aspect_dir.exists():
+            raise FileNotFoundError(f"Aspect model not found at {aspect_dir}")
+        if not sentiment_dir.exists():
+            raise FileNotFoundError(f"Sentiment model not found at {sentiment_dir}")
+
+        return cls(
+            version=version,
+            aspect_dir=aspect_dir,
+            sentiment_dir=sentiment_dir,
+            aspect_tokenizer=AutoTokenizer.from_pretrained(aspect_dir),
+            aspect_model=AutoModelForSequenceClassification.from_pretrained(aspect_dir)
+            .to(device)
+            .eval(),
+            sentiment_tokenizer=AutoTokenizer.from_pretrained(sentiment_dir),
+            sentiment_model=AutoModelForSequenceClassification.from_pretrained(
+                sentiment_dir
+            )
+            .to(device)
+            .eval(),
+            # Read id2label mapping directly from config to keep names in sync
+            aspect_labels=read_labels(aspect_dir),
+            sentiment_labels=read_labels(sentiment_dir),
+        )
+
+    @property
+    def aspect_names(self) -> List[str]:
+        return [
+            self.aspect_labels.get(i, f"LABEL_{i}")
+            for i in range(self.aspect_model.config.num_labels)
+        ]
+
+    @property
+    def sentiment_names(self) -> List[str]:
+        return [
+            self.sentiment_labels.get(i, f"LABEL_{i}")
+            for i in range(self.sentiment_model.config.num_labels)
+        ]
+
+
+class ModelRegistry:
+    """
+    Danh sách phiên bản mô hình trong `models/<version>/aspect|sentiment`.
+    Phiên bản đang dùng và lịch sử kích hoạt (để rollback) được lưu trong
+    `models/registry.json`; bố cục cũ `models/aspect|sentiment` được xem là
+    phiên bản `default`.
+    """
+
+    def __init__(self, models_root: Path) -> None:
+        self.models_root = models_root
+        self.path = models_root / REGISTRY_FILE
+        self._lock = threading.Lock()
+
+    def versions(self) -> List[str]:
+        found = []
+        if (self.models_root / "aspect").is_dir() and (
+            self.models_root / "sentiment"
+        ).is_dir():
+            found.append(LEGACY_VERSION)
+        if self.models_root.is_dir():
+            found.extend(
+                sorted(
+                    child.name
+                    for child in self.models_root.iterdir()
+                    if child.name not in ("aspect", "sentiment")
+                    and (child / "aspect").is_dir()
+                    and (child / "sentiment").is_dir()
+                )
+            )
+        return found
+
+    def model_dir(self, version: str) -> Path:
+        if version == LEGACY_VERSION:
+            return self.models_root
+        if version not in self.versions():
+            raise KeyError(f"Unknown model version '{version}' in {self.models_root}")
+        return self.models_root / version
+
+    def _read(self) -> Dict[str, object]:
+        if not self.path.exists():
+            return {"active": None, "history": []}
+        with self.path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self, state: Dict[str, object]) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        tmp.replace(self.path)
+
+    def active(self) -> str:
+        """
+        Phiên bản được kích hoạt gần nhất; nếu chưa có thì dùng bố cục cũ,
+        hoặc phiên bản mới nhất theo tên.
+        """
+
+        versions = self.versions()
+        if not versions:
+            raise FileNotFoundError(f"No model versions found under {self.models_root}")
+        active = self._read().get("active")
+        if active in versions:
+            return active
+        return LEGACY_VERSION if LEGACY_VERSION in versions else versions[-1]
+
+    def history(self) -> List[Dict[str, str]]:
+        return list(self._read().get("history", []))
+
+    def set_active(self, version: str) -> None:
+        self.model_dir(version)
+        with self._lock:
+            state = self._read()
+            history = state.get("history", [])
+            if not history:
+                # Seed with the implicit version so the first switch can be rolled back.
+                history.append({"version": self.active(), "activated_at": None})
+            if history[-1]["version"] != version:
+                history.append(
+                    {
+                        "version": version,
+                        "activated_at": datetime.now().isoformat(timespec="seconds"),
+                    }
+                )
+            self._write({"active": version, "history": history})
+
+    def previous(self) -> Optional[str]:
+        """
+        Phiên bản đang chạy trước phiên bản hiện tại (đích của rollback).
+        """
+
+        versions = self.versions()
+        history = self.history()
+        for entry in reversed(history[:-1]):
+            if entry["version"] in versions:
+                return entry["version"]
+        return None
+
+    def roll_back(self) -> str:
+        """
+        Bỏ phiên bản hiện tại khỏi lịch sử và kích hoạt lại phiên bản trước đó.
+        """
+
+        with self._lock:
+            target = self.previous()
+            if target is None:
+                raise ValueError("No earlier model version to roll back to")
+            history = self.history()
+            while history and history[-1]["version"] != target:
+                history.pop()
+            self._write({"active": target, "history": history})
+        return target
@@ -1,25 +1,351 @@
 import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
+import numpy as np
 import torch
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
 
+from adaptive_batch import AdaptiveBatcher, is_oom_error
+from model_registry import ModelBundle, ModelRegistry
+from pipeline import PipelineReport, run_pipeline
+from profiling import InferenceProfiler
+from scheduler import BULK, INTERACTIVE, PriorityScheduler
 
-@dataclass
+
+@dataclass(slots=True)
 class AspectPrediction:
     label: str
     score: float
     sentiment: Optional["SentimentPrediction"] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class SentimentPrediction:
     label: str
     score: float
 
 
+MAX_LENGTH = 256
+# Texts tokenized per call in batch paths.
+ENCODE_CHUNK_ROWS = 256
+
+# Written by `autotune.py`; picked up by ABSAService at startup when present.
+TUNING_PROFILE_NAME = "tuning_profile.json"
+
+# Tie-break order used when aspect weights are equal: NEG > POS > NEU.
+SENTIMENT_PRIORITY = {"NEG": 0, "NEGATIVE": 0, "POS": 1, "POSITIVE": 1, "NEU": 2, "NEUTRAL": 2}
+
+# (encoding without padding, token lengths, pad id) from ABSAService._encode.
+EncodedTexts = Tuple[object, np.ndarray, int]
+# (offsets, aspect ids, aspect scores, sentiment prompts) per review batch.
+AspectSelection = Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]
+
+# Run through a freshly loaded model version before it starts serving.
+WARMUP_TEXTS = [
+    "Pin trâu, camera chụp đẹp nhưng giá hơi cao.",
+    "Máy nóng, lag khi chơi game.",
+    "Ok",
+]
+
+
+def aggregate_sentiment_batch(
+    offsets: np.ndarray,
+    aspect_scores: np.ndarray,
+    sentiment_ids: np.ndarray,
+    sentiment_scores: np.ndarray,
+    sentiment_names: Sequence[str],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Phiên bản vector hoá của `ABSAService.aggregate_sentiment` cho cả batch.
+    Trả về (sentiment_id, score, has_aspect) cho từng review.
+    """
+
+    n_rows = len(offsets) - 1
+    counts = np.diff(offsets)
+    agg_ids = np.zeros(n_rows, dtype=np.int64)
+    agg_scores = np.zeros(n_rows, dtype=np.float32)
+    has_aspect = counts > 0
+    if not has_aspect.any():
+        return agg_ids, agg_scores, has_aspect
+
+    row_ids = np.repeat(np.arange(n_rows), counts)
+    weights = aspect_scores.astype(np.float64) * sentiment_scores
+    priority_table = np.array(
+        [SENTIMENT_PRIORITY.get(name.upper(), 3) for name in sentiment_names]
+    )
+    priority = priority_table[sentiment_ids]
+    # First entry of each row after sorting is the winner.
+    order = np.lexsort((priority, -weights, row_ids))
+    first = offsets[:-1][has_aspect]
+    winners = order[first]
+    agg_ids[has_aspect] = sentiment_ids[winners]
+    agg_scores[has_aspect] = sentiment_scores[winners]
+    return agg_ids, agg_scores, has_aspect
+
+
+def load_tuning_profile(path: Path) -> Dict[str, Dict[str, object]]:
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data if isinstance(data, dict) else {}
+
+
+def plan_batches(
+    sorted_lengths: np.ndarray,
+    batch_size: int,
+    token_budget: Optional[int] = None,
+) -> List[Tuple[int, int]]:
+    """
+    Chia các câu (đã sắp theo độ dài tăng dần) thành các batch [start, end).
+    Mỗi batch có tối đa `batch_size` câu và, nếu có `token_budget`, tổng số
+    token sau padding (số câu × độ dài câu dài nhất) không vượt ngân sách.
+    """
+
+    batches: List[Tuple[int, int]] = []
+    start = 0
+    n = len(sorted_lengths)
+    while start < n:
+        end = next_batch_end(sorted_lengths, start, batch_size, token_budget)
+        batches.append((start, end))
+        start = end
+    return batches
+
+
+def next_batch_end(
+    sorted_lengths: np.ndarray,
+    start: int,
+    batch_size: int,
+    token_budget: Optional[int] = None,
+) -> int:
+    end = min(len(sorted_lengths), start + max(1, batch_size))
+    if token_budget:
+        longest = sorted_lengths[end - 1]
+        while end - start > 1 and (end - start) * longest > token_budget:
+            end -= 1
+            longest = sorted_lengths[end - 1]
+    return end
+
+
+def collate(encoded, rows: np.ndarray, pad_id: int) -> Dict[str, torch.Tensor]:
+    """
+    Right-pad the selected rows of an unpadded tokenizer output into tensors.
+    """
+
+    width = max(len(encoded["input_ids"][i]) for i in rows)
+    features: Dict[str, torch.Tensor] = {}
+    for key in encoded.keys():
+        fill = pad_id if key == "input_ids" else 0
+        batch = np.full((len(rows), width), fill, dtype=np.int64)
+        for out_row, i in enumerate(rows):
+            values = encoded[key][i]
+            batch[out_row, : len(values)] = values
+        features[key] = torch.from_numpy(batch)
+    return features
+
+
+@dataclass
+class BatchResult:
+    """
+    Kết quả phân tích cả batch dưới dạng mảng phẳng.
+    Aspect của review `i` nằm ở `[offsets[i], offsets[i + 1])` trong các mảng
+    `aspect_*`/`sentiment_*`, sắp xếp theo aspect score giảm dần như
+    `predict_aspects`. `batch[i]` trả về dict giống `analyze_text`.
+    `embeddings` (float16, một dòng mỗi review) chỉ có khi lời gọi bật
+    `BatchOptions.keep_embeddings`; review không chạy mô hình nhận vector 0.
+    """
+
+    texts: List[str]
+    offsets: np.ndarray
+    aspect_ids: np.ndarray
+    aspect_scores: np.ndarray
+    sentiment_ids: np.ndarray
+    sentiment_scores: np.ndarray
+    overall_ids: np.ndarray
+    overall_scores: np.ndarray
+    aspect_names: List[str]
+    sentiment_names: List[str]
+    model_version: str = ""
+    embeddings: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, idx: int) -> Dict[str, object]:
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        aspects = [
+            AspectPrediction(
+                label=self.aspect_names[self.aspect_ids[j]],
+                score=float(self.aspect_scores[j]),
+                sentiment=SentimentPrediction(
+                    label=self.sentiment_names[self.sentiment_ids[j]],
+                    score=float(self.sentiment_scores[j]),
+                ),
+            )
+            for j in range(start, end)
+        ]
+        return {
+            "text": self.texts[idx],
+            "aspects": aspects,
+            "sentiment": SentimentPrediction(
+                label=self.sentiment_names[self.overall_ids[idx]],
+                score=float(self.overall_scores[idx]),
+            ),
+            "model_version": self.model_version,
+        }
+
+    def row_ids(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self.texts)), np.diff(self.offsets))
+
+    def aspect_labels(self) -> np.ndarray:
+        return np.asarray(self.aspect_names, dtype=object)[self.aspect_ids]
+
+    def aspect_sentiment_labels(self) -> np.ndarray:
+        return np.asarray(self.sentiment_names, dtype=object)[self.sentiment_ids]
+
+    def overall_labels(self) -> np.ndarray:
+        return np.asarray(self.sentiment_names, dtype=object)[self.overall_ids]
+
+    @classmethod
+    def constant(
+        cls,
+        texts: Sequence[str],
+        aspect_names: List[str],
+        sentiment_names: List[str],
+        label: str = "NEU",
+        score: float = 0.0,
+        model_version: str = "",
+    ) -> "BatchResult":
+        """
+        Kết quả cố định không aspect cho các review không cần chạy mô hình.
+        """
+
+        # NEG/NEGATIVE, POS/POSITIVE and NEU/NEUTRAL share a priority value.
+        priority = SENTIMENT_PRIORITY.get(label.upper())
+        aliases = {label.upper()} | {
+            name for name, value in SENTIMENT_PRIORITY.items() if value == priority
+        }
+        label_id = next(
+            (i for i, name in enumerate(sentiment_names) if name.upper() in aliases), 0
+        )
+        n_rows = len(texts)
+        return cls(
+            texts=list(texts),
+            offsets=np.zeros(n_rows + 1, dtype=np.int64),
+            aspect_ids=np.zeros(0, dtype=np.int32),
+            aspect_scores=np.zeros(0, dtype=np.float32),
+            sentiment_ids=np.zeros(0, dtype=np.int32),
+            sentiment_scores=np.zeros(0, dtype=np.float32),
+            overall_ids=np.full(n_rows, label_id, dtype=np.int32),
+            overall_scores=np.full(n_rows, score, dtype=np.float32),
+            aspect_names=aspect_names,
+            sentiment_names=sentiment_names,
+            model_version=model_version,
+        )
+
+    def take(
+        self, rows: Sequence[int], texts: Optional[Sequence[str]] = None
+    ) -> "BatchResult":
+        """
+        Lấy (có thể lặp lại) các review theo vị trí `rows`; `texts` thay cho
+        văn bản gốc khi kết quả được sao chép sang review khác.
+        """
+
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        counts = self.offsets[rows + 1] - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        flat = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+        return BatchResult(
+            texts=list(texts) if texts is not None else [self.texts[i] for i in rows],
+            offsets=offsets,
+            aspect_ids=self.aspect_ids[flat],
+            aspect_scores=self.aspect_scores[flat],
+            sentiment_ids=self.sentiment_ids[flat],
+            sentiment_scores=self.sentiment_scores[flat],
+            overall_ids=self.overall_ids[rows],
+            overall_scores=self.overall_scores[rows],
+            aspect_names=self.aspect_names,
+            sentiment_names=self.sentiment_names,
+            model_version=self.model_version,
+            embeddings=self.embeddings[rows] if self.embeddings is not None else None,
+        )
+
+    @staticmethod
+    def concat(parts: Sequence["BatchResult"]) -> "BatchResult":
+        if not parts:
+            raise ValueError("Cannot concatenate an empty list of batch results")
+        first = parts[0]
+        dims = {p.embeddings.shape[1] for p in parts if p.embeddings is not None}
+        embeddings = None
+        if dims:
+            (dim,) = dims
+            embeddings = np.concatenate(
+                [
+                    p.embeddings
+                    if p.embeddings is not None
+                    else np.zeros((len(p), dim), dtype=np.float16)
+                    for p in parts
+                ]
+            )
+        lengths = np.cumsum([0] + [len(p.aspect_ids) for p in parts[:-1]])
+        offsets = np.concatenate(
+            [np.zeros(1, dtype=np.int64)]
+            + [p.offsets[1:] + base for p, base in zip(parts, lengths)]
+        )
+        return BatchResult(
+            texts=[text for p in parts for text in p.texts],
+            offsets=offsets,
+            aspect_ids=np.concatenate([p.aspect_ids for p in parts]),
+            aspect_scores=np.concatenate([p.aspect_scores for p in parts]),
+            sentiment_ids=np.concatenate([p.sentiment_ids for p in parts]),
+            sentiment_scores=np.concatenate([p.sentiment_scores for p in parts]),
+            overall_ids=np.concatenate([p.overall_ids for p in parts]),
+            overall_scores=np.concatenate([p.overall_scores for p in parts]),
+            aspect_names=first.aspect_names,
+            sentiment_names=first.sentiment_names,
+            model_version="+".join(
+                dict.fromkeys(p.model_version for p in parts if p.model_version)
+            ),
+            embeddings=embeddings,
+        )
+
+
+@dataclass
+class BatchOptions:
+    """
+    Thiết lập của một lần phân tích (ví dụ một file upload), truyền theo lời
+    gọi `analyze_batch` thay vì đặt lên `ABSAService` dùng chung giữa các
+    phiên. Batcher thích ứng được tạo ở lần gọi đầu và giữ lại để các lần gọi
+    sau của cùng lần phân tích tiếp tục ước lượng bộ nhớ.
+    """
+
+    # Memory budget (MB) for adaptive batching; None/0 keeps fixed batches.
+    memory_budget_mb: Optional[float] = None
+    # Inputs longer than this many rows run through the threaded pipeline.
+    pipeline_chunk_rows: Optional[int] = None
+    pipeline_queue_size: int = 2
+    # Keep mean-pooled embeddings from the aspect forward (no extra model
+    # call) in `BatchResult.embeddings`.
+    keep_embeddings: bool = False
+    batcher: Optional[AdaptiveBatcher] = None
+    # Stage utilisation of the most recent pipelined call.
+    pipeline_report: Optional[PipelineReport] = None
+
+    def adaptive_batcher(self, initial_batch: int) -> Optional[AdaptiveBatcher]:
+        if not self.memory_budget_mb:
+            return None
+        if self.batcher is None:
+            self.batcher = AdaptiveBatcher(self.memory_budget_mb, initial_batch=initial_batch)
+        return self.batcher
+
+
 class ABSAService:
     """
     Loads the fine-tuned Hugging Face models exported from Colab and exposes
@@ -30,87 +356,217 @@ class ABSAService:
         self,
         base_dir: Optional[Path] = None,
         aspect_threshold: float = 0.3,
+        use_tuning_profile: bool = True,
+        version: Optional[str] = None,
+        latency_target: Optional[float] = 0.5,
     ) -> None:
         self.base_dir = base_dir or Path(__file__).resolve().parent
         self.aspect_threshold = aspect_threshold
 
-        models_root = self.base_dir / "models"
-        self.aspect_dir = models_root / "aspect"
-        self.sentiment_dir = models_root / "sentiment"
-
-        if not self.aspect_dir.exists():
-            raise FileNotFoundError(f"Aspect model not found at {self.aspect_dir}")
-        if not self.sentiment_dir.exists():
-            raise FileNotFoundError(
-                f"Sentiment model not found at {self.sentiment_dir}"
-            )
+        self.batch_size = 32
+        self.token_budget: Optional[int] = None
+        # Interactive requests go ahead of queued bulk batches; None disables it.
+        self.scheduler: Optional[PriorityScheduler] = (
+            PriorityScheduler(latency_target) if latency_target else None
+        )
+        self.tuning_profile = (
+            load_tuning_profile(self.base_dir / TUNING_PROFILE_NAME)
+            if use_tuning_profile
+            else {}
+        )
+        self._apply_tuning_profile()
+        if self.scheduler is None:
+            # torch.set_num_threads is process-wide; without the scheduler's
+            # exclusive lanes concurrent calls would flip it mid-forward, so
+            # per-lane thread tuning needs the scheduler and is fixed here.
+            self._set_threads(self.throughput_threads or self.latency_threads)
 
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
 
-        self.aspect_tokenizer = AutoTokenizer.from_pretrained(self.aspect_dir)
-        self.aspect_model = (
-            AutoModelForSequenceClassification.from_pretrained(self.aspect_dir)
-            .to(self.device)
-            .eval()
-        )
+        self.registry = ModelRegistry(self.base_dir / "models")
+        version = version or self.registry.active()
+        self.bundle = ModelBundle.load(version, self.registry.model_dir(version), self.device)
+        # Kept in memory so a rollback right after a switch is instant.
+        self._previous_bundle: Optional[ModelBundle] = None
+        self._swap_lock = threading.Lock()
+        self._pinned = threading.local()
+        # Set by `profiling` for the calling thread only; unset means no profiling work.
+        self._profiled = threading.local()
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+        self._staged: Dict[str, Future] = {}
 
-        self.sentiment_tokenizer = AutoTokenizer.from_pretrained(self.sentiment_dir)
-        self.sentiment_model = (
-            AutoModelForSequenceClassification.from_pretrained(self.sentiment_dir)
-            .to(self.device)
-            .eval()
-        )
+    @property
+    def model_version(self) -> str:
+        return self.bundle.version
 
-        # Read id2label mapping directly from config to keep names in sync
-        self.aspect_labels = self._read_labels(self.aspect_dir)
-        self.sentiment_labels = self._read_labels(self.sentiment_dir)
+    @property
+    def aspect_names(self) -> List[str]:
+        return self._current_bundle().aspect_names
 
-    @staticmethod
-    def _read_labels(model_dir: Path) -> Dict[int, str]:
-        custom_labels_path = model_dir / "labels.json"
-        if custom_labels_path.exists():
-            with custom_labels_path.open("r", encoding="utf-8") as f:
-                data = json.load(f)
-            if isinstance(data, list):
-                return {idx: label for idx, label in enumerate(data)}
-            if isinstance(data, dict):
-                try:
-                    return {int(idx): label for idx, label in data.items()}
-                except ValueError:
-                    # keys might be string labels -> invert order preserving
-                    return {
-                        idx: label for idx, label in enumerate(data.values())
-                    }
-
-        config_path = model_dir / "config.json"
-        if not config_path.exists():
-            return {}
-        with config_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-        id2label = data.get("id2label", {})
-        return {int(idx): label for idx, label in id2label.items()}
+    @property
+    def sentiment_names(self) -> List[str]:
+        return self._current_bundle().sentiment_names
+
+    def _current_bundle(self) -> ModelBundle:
+        return getattr(self._pinned, "bundle", None) or self.bundle
+
+    @contextmanager
+    def pinned(self, bundle: Optional[ModelBundle] = None) -> Iterator[ModelBundle]:
+        """
+        Giữ nguyên một phiên bản mô hình (mặc định bản đang dùng) cho mọi lệnh
+        gọi trong luồng hiện tại, ví dụ cả một lần phân tích file gồm nhiều
+        lượt `analyze_batch`, kể cả khi có phiên bản mới được kích hoạt giữa chừng.
+        """
+
+        outer = getattr(self._pinned, "bundle", None)
+        bundle = bundle or self._current_bundle()
+        self._pinned.bundle = bundle
+        try:
+            yield bundle
+        finally:
+            self._pinned.bundle = outer
+
+    def _load_and_warm_up(self, version: str) -> ModelBundle:
+        bundle = ModelBundle.load(version, self.registry.model_dir(version), self.device)
+        self.analyze_batch(WARMUP_TEXTS, bundle=bundle)
+        return bundle
+
+    def stage(self, version: str) -> Future:
+        """
+        Nạp và warm-up `version` trên luồng nền; request đang chạy vẫn dùng
+        phiên bản hiện tại. Trả về `Future[ModelBundle]`.
+        """
+
+        with self._swap_lock:
+            future = self._staged.get(version)
+            if future is None or (future.done() and future.exception() is not None):
+                future = self._loader.submit(self._load_and_warm_up, version)
+                self._staged[version] = future
+            return future
+
+    def staging_status(self) -> Dict[str, str]:
+        status = {}
+        for version, future in list(self._staged.items()):
+            if not future.done():
+                status[version] = "loading"
+            elif future.exception() is not None:
+                status[version] = f"failed: {future.exception()}"
+            else:
+                status[version] = "ready"
+        return status
+
+    def _swap(self, bundle: ModelBundle) -> None:
+        # A single reference assignment: requests that already hold the old
+        # bundle finish on it, new requests pick up the new one.
+        self._previous_bundle, self.bundle = self.bundle, bundle
+        self._staged.pop(bundle.version, None)
+
+    def activate(self, version: str, timeout: Optional[float] = None) -> ModelBundle:
+        """
+        Chuyển sang `version` (chờ nạp nền nếu chưa xong) và ghi vào registry.
+        """
+
+        if version == self.model_version:
+            return self.bundle
+        bundle = self.stage(version).result(timeout)
+        with self._swap_lock:
+            self._swap(bundle)
+            self.registry.set_active(version)
+        return bundle
+
+    def roll_back(self, timeout: Optional[float] = None) -> str:
+        """
+        Quay lại phiên bản chạy trước phiên bản hiện tại theo lịch sử registry.
+        """
+
+        target = self.registry.previous()
+        if target is None:
+            raise ValueError("No earlier model version to roll back to")
+        previous = self._previous_bundle
+        if previous is not None and previous.version == target:
+            bundle = previous
+        else:
+            bundle = self.stage(target).result(timeout)
+        with self._swap_lock:
+            self._swap(bundle)
+            self.registry.roll_back()
+        return target
 
     def update_threshold(self, threshold: float) -> None:
         self.aspect_threshold = threshold
 
+    @contextmanager
+    def _slot(self, lane: str, rows: int = 1, job: object = None) -> Iterator[None]:
+        if self.scheduler is None:
+            yield
+            return
+        with self.scheduler.slot(lane, rows, job):
+            # The two lanes are tuned for different thread counts.
+            self._set_threads(
+                self.latency_threads if lane == INTERACTIVE else self.throughput_threads
+            )
+            yield
+
+    def _bulk_batch_size(self, batch_size: int) -> int:
+        cap = self.scheduler.bulk_row_cap() if self.scheduler is not None else None
+        return min(batch_size, cap) if cap else batch_size
+
+    @contextmanager
+    def profiling(self, batches: int = 5, **options) -> Iterator[InferenceProfiler]:
+        """
+        Ghi profile PyTorch cho `batches` batch mỗi mô hình (aspect, sentiment)
+        của các lệnh `analyze_text`/`analyze_batch` mà luồng hiện tại gọi trong
+        khối `with`; lệnh gọi của luồng khác (phiên Streamlit khác) không bị
+        ghi. Kết quả nằm ở `capture` của profiler trả về. `options` chuyển cho
+        `InferenceProfiler` (output_dir, record_shapes, profile_memory, ...).
+        """
+
+        outer = getattr(self._profiled, "profiler", None)
+        profiler = InferenceProfiler(batches, **options)
+        self._profiled.profiler = profiler
+        try:
+            yield profiler
+        finally:
+            self._profiled.profiler = outer
+
+    def _profiler(self) -> Optional[InferenceProfiler]:
+        return getattr(self._profiled, "profiler", None)
+
+    @contextmanager
+    def _profiling(self) -> Iterator[None]:
+        profiler = self._profiler()
+        if profiler is None:
+            yield
+            return
+        with profiler.session():
+            yield
+
+    def _traced(self, name: str, batch: bool = False):
+        # Named range in the profiler trace; `batch` ranges count towards the capture.
+        profiler = self._profiler()
+        if profiler is None:
+            return nullcontext()
+        return profiler.batch(name) if batch else profiler.region(name)
+
     def predict_aspects(self, text: str) -> List[AspectPrediction]:
-        encoded = self.aspect_tokenizer(
+        bundle = self._current_bundle()
+        encoded = bundle.aspect_tokenizer(
             text,
             truncation=True,
             padding=True,
-            max_length=256,
+            max_length=MAX_LENGTH,
             return_tensors="pt",
         ).to(self.device)
 
-        with torch.no_grad():
-            logits = self.aspect_model(**encoded).logits
+        with torch.no_grad(), self._slot(INTERACTIVE), self._traced("aspect", batch=True):
+            logits = bundle.aspect_model(**encoded).logits
 
         scores = torch.sigmoid(logits).cpu().numpy()[0]
 
         predictions: List[AspectPrediction] = []
         for idx, score in enumerate(scores):
             if score >= self.aspect_threshold:
-                label = self.aspect_labels.get(idx, f"LABEL_{idx}")
+                label = bundle.aspect_labels.get(idx, f"LABEL_{idx}")
                 predictions.append(AspectPrediction(label=label, score=float(score)))
 
         predictions.sort(key=lambda p: p.score, reverse=True)
@@ -126,23 +582,30 @@ class ABSAService:
         else:
             enriched_text = text
 
-        encoded = self.sentiment_tokenizer(
+        bundle = self._current_bundle()
+        encoded = bundle.sentiment_tokenizer(
             enriched_text,
             truncation=True,
             padding=True,
-            max_length=256,
+            max_length=MAX_LENGTH,
             return_tensors="pt",
         ).to(self.device)
 
-        with torch.no_grad():
-            logits = self.sentiment_model(**encoded).logits
+        with torch.no_grad(), self._slot(INTERACTIVE), self._traced("sentiment", batch=True):
+            logits = bundle.sentiment_model(**encoded).logits
 
         probs = torch.softmax(logits, dim=-1).cpu().numpy()[0]
         top_idx = int(probs.argmax())
-        label = self.sentiment_labels.get(top_idx, f"LABEL_{top_idx}")
+        label = bundle.sentiment_labels.get(top_idx, f"LABEL_{top_idx}")
         return SentimentPrediction(label=label, score=float(probs[top_idx]))
 
     def analyze_text(self, text: str) -> Dict[str, object]:
+        # One slot for the whole request so bulk batches cannot slip in
+        # between its aspect and sentiment calls.
+        with self._profiling(), self._slot(INTERACTIVE), self.pinned() as bundle:
+            return self._analyze_text(text, bundle.version)
+
+    def _analyze_text(self, text: str, model_version: str) -> Dict[str, object]:
         aspects = self.predict_aspects(text)
         global_sentiment = self.predict_sentiment(text)
 
@@ -171,8 +634,405 @@ class ABSAService:
             "text": text,
             "aspects": enriched_aspects,
             "sentiment": sentiment,
+            "model_version": model_version,
         }
 
+    def _set_threads(self, num_threads: Optional[int]) -> None:
+        if num_threads and torch.get_num_threads() != num_threads:
+            torch.set_num_threads(num_threads)
+
+    def _apply_tuning_profile(self) -> None:
+        latency = self.tuning_profile.get("latency", {})
+        throughput = self.tuning_profile.get("throughput", {})
+        max_threads = os.cpu_count() or 1
+
+        def _threads(goal: Dict[str, object]) -> Optional[int]:
+            value = goal.get("num_threads")
+            return min(int(value), max_threads) if value else None
+
+        self.latency_threads = _threads(latency)
+        self.throughput_threads = _threads(throughput)
+        self.batch_size = int(throughput.get("batch_size") or self.batch_size)
+        self.token_budget = throughput.get("token_budget") or None
+
+        interop = throughput.get("interop_threads") or latency.get("interop_threads")
+        if interop:
+            try:
+                torch.set_num_interop_threads(min(int(interop), max_threads))
+            except RuntimeError:
+                # Inter-op pool is fixed once torch has started parallel work
+                # (e.g. the service is rebuilt in the same process).
+                pass
+
+    def _encode(self, tokenizer, texts: Sequence[str]) -> EncodedTexts:
+        # Tokenize once without padding; batches are padded per length bucket later.
+        # CPU-only work, so it takes no lane and overlaps with bulk forwards;
+        # it only steps aside between chunks while an interactive request
+        # runs, since a long tokenizer call holding the GIL stretches every
+        # torch op of that request.
+        texts = list(texts)
+        encoded: Dict[str, list] = {}
+        for start in range(0, len(texts), ENCODE_CHUNK_ROWS):
+            if self.scheduler is not None:
+                self.scheduler.yield_to_interactive()
+            with self._traced("tokenize"):
+                part = tokenizer(
+                    texts[start : start + ENCODE_CHUNK_ROWS],
+                    truncation=True,
+                    max_length=MAX_LENGTH,
+                )
+            for key, values in part.items():
+                encoded.setdefault(key, []).extend(values)
+        encoded.setdefault("input_ids", [])
+        lengths = np.fromiter(
+            (len(ids) for ids in encoded["input_ids"]), dtype=np.int64, count=len(texts)
+        )
+        return encoded, lengths, tokenizer.pad_token_id or 0
+
+    def _forward_encoded(
+        self,
+        model,
+        encoded_texts: EncodedTexts,
+        batch_size: int,
+        activation: Callable[[torch.Tensor], torch.Tensor],
+        token_budget: Optional[int] = None,
+        pooled: Optional[List[np.ndarray]] = None,
+        label: str = "forward",
+        batcher: Optional[AdaptiveBatcher] = None,
+        job: object = None,
+    ) -> np.ndarray:
+        """
+        Xác suất cho mọi câu theo thứ tự đầu vào. Nếu truyền list `pooled`,
+        embedding mean-pool (float16, chuẩn hoá L2) của các câu được thêm vào
+        list đó dưới dạng một ma trận cùng thứ tự. `label` là tên batch trong
+        trace khi đang profile; có `batcher` thì kích thước batch do nó chọn
+        theo ngân sách bộ nhớ. Các batch cùng `job` được chạy đồng thời trong
+        làn bulk (xem `PriorityScheduler.slot`).
+        """
+
+        encoded, lengths, pad_id = encoded_texts
+        n_rows = len(lengths)
+        if not n_rows:
+            if pooled is not None:
+                pooled.append(np.empty((0, 0), dtype=np.float16))
+            return np.empty((0, 0), dtype=np.float32)
+
+        # Batch by length so each batch carries little padding.
+        order = np.argsort(lengths, kind="stable")
+        sorted_lengths = lengths[order]
+
+        probs: Optional[np.ndarray] = None
+        embeddings: Optional[np.ndarray] = None
+
+        def run(start: int, end: int) -> None:
+            nonlocal probs, embeddings
+            rows = order[start:end]
+            features = {k: v.to(self.device) for k, v in collate(encoded, rows, pad_id).items()}
+            with torch.no_grad(), self._traced(label, batch=True):
+                outputs = model(**features, output_hidden_states=pooled is not None)
+                if pooled is not None:
+                    hidden = outputs.hidden_states[-1]
+                    mask = features.get("attention_mask")
+                    if mask is None:
+                        mask = torch.ones(hidden.shape[:2], device=hidden.device)
+                    mask = mask.to(hidden.dtype).unsqueeze(-1)
+                    mean = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1.0)
+                    vectors = torch.nn.functional.normalize(mean.float(), dim=-1)
+                    if embeddings is None:
+                        embeddings = np.empty((n_rows, vectors.shape[1]), dtype=np.float16)
+                        pooled.append(embeddings)
+                    embeddings[rows] = vectors.cpu().numpy()
+            chunk = activation(outputs.logits).float().cpu().numpy()
+            if probs is None:
+                probs = np.empty((n_rows, chunk.shape[1]), dtype=np.float32)
+            probs[rows] = chunk
+
+        if batcher is None:
+            start = 0
+            while start < n_rows:
+                # Re-planned per batch: the scheduler shrinks bulk batches
+                # while interactive requests are arriving.
+                end = next_batch_end(
+                    sorted_lengths, start, self._bulk_batch_size(batch_size), token_budget
+                )
+                with self._slot(BULK, rows=end - start, job=job):
+                    run(start, end)
+                start = end
+            return probs
+
+        start = 0
+        while start < n_rows:
+            end = batcher.plan(sorted_lengths, start)
+            end = start + self._bulk_batch_size(end - start)
+            tokens = int((end - start) * sorted_lengths[end - 1])
+            try:
+                with self._slot(BULK, rows=end - start, job=job), batcher.measure(
+                    rows=end - start, tokens=tokens
+                ):
+                    run(start, end)
+            except Exception as exc:
+                if not is_oom_error(exc) or end - start <= 1:
+                    raise
+                # Near-OOM: shrink and retry only this chunk.
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+                batcher.back_off(end - start, tokens)
+                continue
+            start = end
+        return probs
+
+    def _forward_probs(
+        self,
+        tokenizer,
+        model,
+        texts: Sequence[str],
+        batch_size: int,
+        activation: Callable[[torch.Tensor], torch.Tensor],
+        token_budget: Optional[int] = None,
+        pooled: Optional[List[np.ndarray]] = None,
+        label: str = "forward",
+        batcher: Optional[AdaptiveBatcher] = None,
+        job: object = None,
+    ) -> np.ndarray:
+        if not texts:
+            if pooled is not None:
+                pooled.append(np.empty((0, 0), dtype=np.float16))
+            return np.empty((0, 0), dtype=np.float32)
+        return self._forward_encoded(
+            model,
+            self._encode(tokenizer, texts),
+            batch_size,
+            activation,
+            token_budget,
+            pooled,
+            label,
+            batcher,
+            job,
+        )
+
+    def _select_aspects(
+        self, texts: List[str], aspect_probs: np.ndarray, aspect_names: List[str]
+    ) -> AspectSelection:
+        n_rows = len(texts)
+        rows, cols = np.nonzero(aspect_probs >= self.aspect_threshold)
+        scores = aspect_probs[rows, cols].astype(np.float32)
+        # Highest aspect score first within each review, like predict_aspects.
+        order = np.lexsort((-scores, rows))
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        offsets = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=offsets[1:])
+
+        prompts = [
+            f"aspect: {aspect_names[col]} text: {texts[row]}"
+            for row, col in zip(rows.tolist(), cols.tolist())
+        ]
+        return offsets, cols, scores, prompts
+
+    @staticmethod
+    def _assemble(
+        bundle: ModelBundle,
+        texts: List[str],
+        selection: AspectSelection,
+        sentiment_probs: np.ndarray,
+        embeddings: Optional[np.ndarray] = None,
+    ) -> BatchResult:
+        offsets, cols, scores, _ = selection
+        n_rows = len(texts)
+        sentiment_names = bundle.sentiment_names
+        if len(sentiment_probs):
+            all_ids = sentiment_probs.argmax(axis=1)
+            all_scores = sentiment_probs[np.arange(len(all_ids)), all_ids]
+        else:
+            all_ids = np.zeros(0, dtype=np.int64)
+            all_scores = np.zeros(0, dtype=np.float32)
+        global_ids, global_scores = all_ids[:n_rows], all_scores[:n_rows]
+        sentiment_ids, sentiment_scores = all_ids[n_rows:], all_scores[n_rows:]
+
+        agg_ids, agg_scores, has_aspect = aggregate_sentiment_batch(
+            offsets, scores, sentiment_ids, sentiment_scores, sentiment_names
+        )
+        # Prefer aspect-aware sentiment only when it is at least as confident as the global one.
+        use_aspect = has_aspect & (agg_scores >= global_scores)
+        return BatchResult(
+            texts=texts,
+            offsets=offsets,
+            aspect_ids=cols.astype(np.int32),
+            aspect_scores=scores,
+            sentiment_ids=sentiment_ids.astype(np.int32),
+            sentiment_scores=sentiment_scores,
+            overall_ids=np.where(use_aspect, agg_ids, global_ids).astype(np.int32),
+            overall_scores=np.where(use_aspect, agg_scores, global_scores).astype(np.float32),
+            aspect_names=bundle.aspect_names,
+            sentiment_names=sentiment_names,
+            model_version=bundle.version,
+            embeddings=embeddings if embeddings is not None and embeddings.size else None,
+        )
+
+    def _analyze_pipelined(
+        self,
+        bundle: ModelBundle,
+        texts: List[str],
+        batch_size: int,
+        options: BatchOptions,
+        chunk_rows: int,
+    ) -> Tuple[BatchResult, PipelineReport]:
+        """
+        Chia input thành khối `chunk_rows` dòng và cho chúng chảy qua 5 stage
+        (tokenize, aspect forward, dựng + tokenize prompt sentiment, sentiment
+        forward, ghép kết quả) chạy song song trên các luồng riêng.
+        """
+
+        aspect_names = bundle.aspect_names
+        sentiment_softmax = lambda logits: torch.softmax(logits, dim=-1)
+        batcher = options.adaptive_batcher(self.batch_size)
+
+        def tokenize(chunk):
+            return chunk, self._encode(bundle.aspect_tokenizer, chunk)
+
+        keep_embeddings = options.keep_embeddings
+
+        def aspect_forward(item):
+            chunk, encoded = item
+            pooled = [] if keep_embeddings else None
+            probs = self._forward_encoded(
+                bundle.aspect_model,
+                encoded,
+                batch_size,
+                torch.sigmoid,
+                self.token_budget,
+                pooled,
+                "aspect",
+                batcher,
+                options,
+            )
+            return chunk, probs, pooled[0] if pooled else None
+
+        def sentiment_prompts(item):
+            chunk, aspect_probs, embeddings = item
+            selection = self._select_aspects(chunk, aspect_probs, aspect_names)
+            encoded = self._encode(bundle.sentiment_tokenizer, chunk + selection[3])
+            return chunk, selection, encoded, embeddings
+
+        def sentiment_forward(item):
+            chunk, selection, encoded, embeddings = item
+            probs = self._forward_encoded(
+                bundle.sentiment_model,
+                encoded,
+                batch_size,
+                sentiment_softmax,
+                self.token_budget,
+                label="sentiment",
+                batcher=batcher,
+                job=options,
+            )
+            return chunk, selection, probs, embeddings
+
+        def assemble(item):
+            chunk, selection, probs, embeddings = item
+            return self._assemble(bundle, chunk, selection, probs, embeddings)
+
+        chunks = (texts[start : start + chunk_rows] for start in range(0, len(texts), chunk_rows))
+        parts, report = run_pipeline(
+            chunks,
+            [
+                ("tokenize", tokenize),
+                ("aspect_forward", aspect_forward),
+                ("sentiment_prompts", sentiment_prompts),
+                ("sentiment_forward", sentiment_forward),
+                ("assemble", assemble),
+            ],
+            queue_size=options.pipeline_queue_size,
+        )
+        return BatchResult.concat(parts), report
+
+    def analyze_batch(
+        self,
+        texts: Sequence[str],
+        batch_size: Optional[int] = None,
+        bundle: Optional[ModelBundle] = None,
+        options: Optional[BatchOptions] = None,
+    ) -> BatchResult:
+        """
+        Giống `analyze_text` nhưng chạy theo batch cho nhiều câu và trả về
+        `BatchResult` dạng mảng phẳng thay vì một dict + dataclass cho mỗi aspect.
+        `options` mang thiết lập riêng của lần phân tích này (xem `BatchOptions`).
+        """
+
+        bundle = bundle or self._current_bundle()
+        texts = [str(t) for t in texts]
+        batch_size = batch_size or self.batch_size
+        options = options or BatchOptions()
+        # The profiler only sees the thread that started it, so a profiled
+        # call runs sequentially instead of through the pipeline stages.
+        chunk_rows = options.pipeline_chunk_rows
+        if chunk_rows and len(texts) > chunk_rows and self._profiler() is None:
+            result, options.pipeline_report = self._analyze_pipelined(
+                bundle, texts, batch_size, options, chunk_rows
+            )
+            return result
+        with self._profiling():
+            return self._analyze_sequential(bundle, texts, batch_size, options)
+
+    def _analyze_sequential(
+        self, bundle: ModelBundle, texts: List[str], batch_size: int, options: BatchOptions
+    ) -> BatchResult:
+        batcher = options.adaptive_batcher(self.batch_size)
+        pooled = [] if options.keep_embeddings else None
+        aspect_probs = self._forward_probs(
+            bundle.aspect_tokenizer,
+            bundle.aspect_model,
+            texts,
+            batch_size,
+            torch.sigmoid,
+            self.token_budget,
+            pooled,
+            "aspect",
+            batcher,
+            options,
+        )
+        with self._traced("select_aspects"):
+            selection = self._select_aspects(texts, aspect_probs, bundle.aspect_names)
+        sentiment_probs = self._forward_probs(
+            bundle.sentiment_tokenizer,
+            bundle.sentiment_model,
+            texts + selection[3],
+            batch_size,
+            lambda logits: torch.softmax(logits, dim=-1),
+            self.token_budget,
+            label="sentiment",
+            batcher=batcher,
+            job=options,
+        )
+        with self._traced("assemble"):
+            return self._assemble(
+                bundle, texts, selection, sentiment_probs, pooled[0] if pooled else None
+            )
+
+    def embed(
+        self, texts: Sequence[str], batch_size: Optional[int] = None, lane: str = BULK
+    ) -> np.ndarray:
+        """
+        Embedding (float16, chuẩn hoá L2) của `texts` theo mô hình aspect của
+        phiên bản đang dùng; cùng không gian với `BatchResult.embeddings`, dùng
+        làm câu truy vấn khi tìm review tương tự. Câu truy vấn của người dùng
+        nên đi `lane=INTERACTIVE` để không phải chờ sau các batch file.
+        """
+
+        bundle = self._current_bundle()
+        pooled: List[np.ndarray] = []
+        # Inside an interactive slot the per-batch bulk slots are no-ops.
+        with self._slot(lane) if lane == INTERACTIVE else nullcontext():
+            self._forward_probs(
+                bundle.aspect_tokenizer,
+                bundle.aspect_model,
+                [str(t) for t in texts],
+                batch_size or self.batch_size,
+                torch.sigmoid,
+                self.token_budget,
+                pooled,
+            )
+        return pooled[0]
+
     def aggregate_sentiment(
         self, aspect_predictions: List[AspectPrediction]
     ) -> SentimentPrediction:
@@ -195,9 +1055,8 @@ class ABSAService:
             return SentimentPrediction(label="NEU", score=0.0)
 
         # Sort by weight desc, with priority NEG > POS > NEU for equal weights
-        priority = {"NEG": 0, "NEGATIVE": 0, "POS": 1, "POSITIVE": 1, "NEU": 2, "NEUTRAL": 2}
         scored_items.sort(
-            key=lambda x: (-x[0], priority.get(x[1].label.upper(), 3))
+            key=lambda x: (-x[0], SENTIMENT_PRIORITY.get(x[1].label.upper(), 3))
         )
 
         top_weight, top_sentiment = scored_items[0]
@@ -0,0 +1,132 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Sequence, Tuple
+
+import pandas as pd
+
+# Marks the end of the stream on every queue.
+_END = object()
+_POLL_SECONDS = 0.1
+
+Stage = Tuple[str, Callable[[object], object]]
+
+
+@dataclass
+class StageStats:
+    name: str
+    items: int = 0
+    busy: float = 0.0
+    # Time blocked on an empty input queue (starved) / a full output queue (backpressure).
+    waiting_input: float = 0.0
+    waiting_output: float = 0.0
+
+
+@dataclass
+class PipelineReport:
+    stages: List[StageStats] = field(default_factory=list)
+    wall: float = 0.0
+
+    def utilization(self) -> pd.DataFrame:
+        """
+        Tỉ lệ thời gian mỗi stage bận / chờ đầu vào / chờ stage sau; stage có
+        `busy` cao nhất là nút thắt.
+        """
+
+        wall = self.wall or 1.0
+        return pd.DataFrame(
+            {
+                "stage": [s.name for s in self.stages],
+                "items": [s.items for s in self.stages],
+                "busy_s": [s.busy for s in self.stages],
+                "busy": [s.busy / wall for s in self.stages],
+                "starved": [s.waiting_input / wall for s in self.stages],
+                "blocked": [s.waiting_output / wall for s in self.stages],
+            }
+        )
+
+    @property
+    def bottleneck(self) -> str:
+        return max(self.stages, key=lambda s: s.busy).name if self.stages else ""
+
+
+def run_pipeline(
+    items: Iterable[object],
+    stages: Sequence[Stage],
+    queue_size: int = 2,
+) -> Tuple[List[object], PipelineReport]:
+    """
+    Chạy mỗi stage trên một luồng riêng, nối bằng hàng đợi giới hạn
+    `queue_size` để các stage chồng lên nhau mà bộ nhớ không phình. Thứ tự
+    phần tử được giữ nguyên; lỗi ở stage nào cũng dừng cả pipeline và được
+    ném lại ở luồng gọi.
+    """
+
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    outputs = [queue.Queue(maxsize=queue_size) for _ in stages]
+    stats = [StageStats(name) for name, _ in stages]
+
+    def put(target: queue.Queue, item: object) -> bool:
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(source: queue.Queue) -> object:
+        while not stop.is_set():
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _END
+
+    def work(index: int) -> None:
+        _, fn = stages[index]
+        stage_stats = stats[index]
+        upstream = iter(items) if index == 0 else None
+        try:
+            while True:
+                waited = time.perf_counter()
+                item = next(upstream, _END) if upstream is not None else get(outputs[index - 1])
+                started = time.perf_counter()
+                stage_stats.waiting_input += started - waited
+                if item is _END:
+                    break
+                result = fn(item)
+                finished = time.perf_counter()
+                stage_stats.busy += finished - started
+                stage_stats.items += 1
+                delivered = put(outputs[index], result)
+                stage_stats.waiting_output += time.perf_counter() - finished
+                if not delivered:
+                    return
+        except BaseException as exc:  # noqa: BLE001 - re-raised by the caller
+            errors.append(exc)
+            stop.set()
+        put(outputs[index], _END)
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=work, args=(i,), name=f"pipeline-{name}", daemon=True)
+        for i, (name, _) in enumerate(stages)
+    ]
+    for thread in threads:
+        thread.start()
+
+    results: List[object] = []
+    while True:
+        item = get(outputs[-1])
+        if item is _END:
+            break
+        results.append(item)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results, PipelineReport(stages=stats, wall=time.perf_counter() - started)
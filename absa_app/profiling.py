@@ -0,0 +1,219 @@
+"""
+Ghi profile PyTorch (thời gian CPU theo operator, cấp phát bộ nhớ, shape đầu
+vào) cho vài batch của mô hình aspect và sentiment, xuất Chrome trace (mở bằng
+chrome://tracing hoặc https://ui.perfetto.dev) và bảng top operator.
+
+    python profiling.py --batches 5 --sample 256
+    python profiling.py --mode text --batches 20 --base-dir .
+    python profiling.py --input reviews.csv --text-column text --top 40
+"""
+
+import argparse
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence
+
+import pandas as pd
+import torch
+from torch.profiler import ProfilerActivity, profile, record_function
+
+DEFAULT_PROFILE_DIR = Path(__file__).resolve().parent / "data" / "profiles"
+
+
+@dataclass
+class ProfileCapture:
+    trace_path: Path
+    top_ops: pd.DataFrame
+    # Recorded batches per model.
+    batches: Dict[str, int]
+    wall: float
+
+
+class InferenceProfiler:
+    """
+    Profile `batches` batch kế tiếp của mỗi mô hình trong `models`. Profiler
+    của PyTorch chỉ ghi operator trên luồng đã bật nó, nên luồng đầu tiên gọi
+    `session` sẽ giữ lượt ghi; các luồng khác chạy bình thường. Ghi xong (đủ
+    số batch hoặc hết lệnh gọi) thì xuất trace và bảng top operator vào
+    `capture`.
+    """
+
+    def __init__(
+        self,
+        batches: int = 5,
+        models: Sequence[str] = ("aspect", "sentiment"),
+        output_dir: Path = DEFAULT_PROFILE_DIR,
+        record_shapes: bool = True,
+        profile_memory: bool = True,
+        with_stack: bool = False,
+        top: int = 25,
+    ) -> None:
+        self.batches = batches
+        self.models = tuple(models)
+        self.output_dir = output_dir
+        self.record_shapes = record_shapes
+        self.profile_memory = profile_memory
+        self.with_stack = with_stack
+        self.top = top
+        self.capture: Optional[ProfileCapture] = None
+        self._lock = threading.Lock()
+        self._owner: Optional[int] = None
+        self._profile: Optional[profile] = None
+        self._recorded: Dict[str, int] = {}
+        self._started = 0.0
+
+    @property
+    def done(self) -> bool:
+        return self.capture is not None
+
+    def recording_here(self) -> bool:
+        return self._profile is not None and self._owner == threading.get_ident()
+
+    @contextmanager
+    def session(self) -> Iterator[None]:
+        """
+        Bao một lệnh gọi `analyze_*`: bật profiler nếu chưa luồng nào giữ và
+        dừng khi lệnh gọi kết thúc.
+        """
+
+        with self._lock:
+            claimed = self._owner is None and not self.done
+            if claimed:
+                self._owner = threading.get_ident()
+        if not claimed:
+            yield
+            return
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        self._profile = profile(
+            activities=activities,
+            record_shapes=self.record_shapes,
+            profile_memory=self.profile_memory,
+            with_stack=self.with_stack,
+        )
+        self._started = time.perf_counter()
+        self._profile.__enter__()
+        try:
+            yield
+        finally:
+            self._stop()
+
+    @contextmanager
+    def batch(self, name: str) -> Iterator[None]:
+        """
+        Một batch của mô hình `name`, hiện trong trace với nhãn đó; khi mọi
+        mô hình đủ `batches` batch thì dừng ghi ngay, phần còn lại của lệnh
+        gọi không bị profile.
+        """
+
+        if not self.recording_here():
+            yield
+            return
+        with record_function(name):
+            yield
+        self._recorded[name] = self._recorded.get(name, 0) + 1
+        if all(self._recorded.get(model, 0) >= self.batches for model in self.models):
+            self._stop()
+
+    def region(self, name: str):
+        # Labels Python glue (tokenize, assemble, ...) in the trace.
+        return record_function(name) if self.recording_here() else nullcontext()
+
+    def _stop(self) -> None:
+        if not self.recording_here():
+            return
+        prof, self._profile = self._profile, None
+        prof.__exit__(None, None, None)
+        wall = time.perf_counter() - self._started
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        trace_path = self.output_dir / f"trace_{datetime.now():%Y%m%d_%H%M%S_%f}.json"
+        prof.export_chrome_trace(str(trace_path))
+        self.capture = ProfileCapture(
+            trace_path=trace_path,
+            top_ops=top_ops_table(prof, self.top, self.record_shapes),
+            batches=dict(self._recorded),
+            wall=wall,
+        )
+
+
+def top_ops_table(prof: profile, top: int = 25, by_shape: bool = True) -> pd.DataFrame:
+    """
+    Operator tốn CPU nhất (theo self CPU time), kèm số lần gọi, tổng CPU,
+    bộ nhớ cấp phát và shape đầu vào khi có.
+    """
+
+    events = prof.key_averages(group_by_input_shape=by_shape)
+    total_self = sum(e.self_cpu_time_total for e in events) or 1.0
+    rows = [
+        {
+            "op": e.key,
+            "input_shapes": str(e.input_shapes) if by_shape and e.input_shapes else "",
+            "calls": e.count,
+            "self_cpu_ms": e.self_cpu_time_total / 1000,
+            "self_cpu_share": e.self_cpu_time_total / total_self,
+            "cpu_total_ms": e.cpu_time_total / 1000,
+            "self_cpu_mem_mb": e.self_cpu_memory_usage / 2**20,
+            "cpu_mem_mb": e.cpu_memory_usage / 2**20,
+        }
+        for e in events
+    ]
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    return table.sort_values("self_cpu_ms", ascending=False).head(top).reset_index(drop=True)
+
+
+def main() -> None:
+    from autotune import load_reviews, synthetic_reviews
+    from model_service import ABSAService
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["batch", "text"], default="batch")
+    parser.add_argument("--batches", type=int, default=5, help="Số batch ghi cho mỗi mô hình")
+    parser.add_argument("--sample", type=int, default=256)
+    parser.add_argument("--input", type=Path, help="CSV/Excel chứa review thật")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--base-dir", type=Path, help="Thư mục chứa models/")
+    parser.add_argument("--output-dir", type=Path, default=DEFAULT_PROFILE_DIR)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--with-stack", action="store_true", help="Ghi cả Python stack")
+    args = parser.parse_args()
+
+    texts = (
+        load_reviews(args.input, args.text_column, args.sample)
+        if args.input
+        else synthetic_reviews(args.sample)
+    )
+    service = ABSAService(base_dir=args.base_dir)
+    # Warm up outside the capture so one-off initialisation does not dominate.
+    service.analyze_batch(texts[:8])
+    with service.profiling(
+        args.batches, output_dir=args.output_dir, with_stack=args.with_stack, top=args.top
+    ) as profiler:
+        if args.mode == "batch":
+            service.analyze_batch(texts)
+        else:
+            for text in texts:
+                service.analyze_text(text)
+                if profiler.done:
+                    break
+
+    capture = profiler.capture
+    if capture is None:
+        print("Không có batch nào được ghi.")
+        return
+    with pd.option_context("display.width", 200, "display.max_colwidth", 60):
+        print(capture.top_ops.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    batches = ", ".join(f"{model} {n}" for model, n in capture.batches.items())
+    print(f"\nBatch đã ghi: {batches} · {capture.wall:.2f}s · trace: {capture.trace_path}")
+
+
+if __name__ == "__main__":
+    main()
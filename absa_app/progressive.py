@@ -0,0 +1,190 @@
+from typing import Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analytics import canonical_sentiment, parse_review_dates
+
+# Fraction of rows analysed before each intermediate estimate.
+PROGRESSIVE_SCHEDULE = (0.02, 0.05, 0.1, 0.25, 0.5, 1.0)
+# Two-sided 95% normal quantile.
+Z_95 = 1.959964
+
+
+def build_strata(
+    texts: Sequence[object],
+    dates: Optional[Sequence[object]] = None,
+    length_bins: int = 4,
+    date_format: Optional[str] = None,
+    dayfirst: bool = True,
+) -> Tuple[np.ndarray, int]:
+    """
+    Mã tầng cho từng review: nhóm độ dài theo phân vị (review dài/ngắn hay
+    lệch NEG khác nhau), kết hợp tháng review khi có cột ngày (đọc bằng
+    `parse_review_dates`). Trả về kèm số dòng có ngày không đọc được.
+    """
+
+    lengths = pd.Series(texts, dtype=object).fillna("").astype(str).str.len()
+    if lengths.empty:
+        return np.zeros(0, dtype=np.int64), 0
+    unparsed = 0
+    length_bins = min(length_bins, len(lengths))
+    length_codes = pd.qcut(lengths.rank(method="first"), length_bins, labels=False)
+    codes = length_codes.to_numpy(dtype=np.int64)
+    if dates is not None:
+        parsed, unparsed = parse_review_dates(dates, date_format, dayfirst)
+        months = parsed.dt.to_period("M")
+        month_codes, _ = pd.factorize(months)
+        # Unparseable dates (-1) share their own stratum.
+        codes = (month_codes.astype(np.int64) + 1) * length_bins + codes
+    _, strata = np.unique(codes, return_inverse=True)
+    return strata, unparsed
+
+
+def stratified_order(strata: np.ndarray, seed: int = 0) -> np.ndarray:
+    """
+    Thứ tự xử lý sao cho mọi tiền tố là một mẫu ngẫu nhiên phân tầng, phân
+    bổ tỉ lệ theo kích thước tầng: phần tử thứ `r` (ngẫu nhiên) của tầng cỡ
+    `N_h` nhận khoá `(r + U) / N_h` rồi sắp xếp theo khoá.
+    """
+
+    rng = np.random.default_rng(seed)
+    n = len(strata)
+    shuffled = rng.permutation(n)
+    by_stratum = shuffled[np.argsort(strata[shuffled], kind="stable")]
+    sizes = np.bincount(strata)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    ranks = np.arange(n) - np.repeat(starts, sizes)
+    keys = (ranks + rng.random(n)) / np.repeat(sizes, sizes)
+    return by_stratum[np.argsort(keys, kind="stable")]
+
+
+def progressive_chunks(
+    order: np.ndarray,
+    schedule: Sequence[float] = PROGRESSIVE_SCHEDULE,
+    min_rows: int = 200,
+) -> Iterator[np.ndarray]:
+    """
+    Cắt `order` thành các đoạn liên tiếp theo `schedule` (tỉ lệ tích luỹ).
+    """
+
+    n = len(order)
+    done = 0
+    for fraction in schedule:
+        end = n if fraction >= 1.0 else min(n, max(min_rows, int(np.ceil(n * fraction))))
+        if end > done:
+            yield order[done:end]
+            done = end
+        if done >= n:
+            return
+
+
+def estimate_aspect_stats(
+    strata: np.ndarray,
+    sampled_rows: np.ndarray,
+    row_ids: np.ndarray,
+    aspects: Sequence[str],
+    aspect_sentiments: Sequence[Optional[str]],
+    z: float = Z_95,
+) -> pd.DataFrame:
+    """
+    Ước lượng số lượt nhắc và tỉ lệ NEG theo aspect cho toàn bộ dữ liệu từ
+    các review đã phân tích `sampled_rows` (`row_ids` đánh số theo vị trí
+    trong `sampled_rows`). Dùng ước lượng tỉ số phân tầng, phương sai tuyến
+    tính hoá có hiệu chỉnh quần thể hữu hạn, nên khoảng tin cậy co về 0 khi
+    mọi review đã được xử lý.
+    """
+
+    sampled_rows = np.asarray(sampled_rows, dtype=np.int64)
+    n_strata = int(strata.max()) + 1 if len(strata) else 0
+    N_h = np.bincount(strata, minlength=n_strata).astype(np.float64)
+    n_h = np.bincount(strata[sampled_rows], minlength=n_strata).astype(np.float64)
+
+    columns = [
+        "aspect",
+        "mentions",
+        "mentions_low",
+        "mentions_high",
+        "neg_ratio",
+        "neg_ratio_low",
+        "neg_ratio_high",
+        "sampled_mentions",
+    ]
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    if row_ids.size == 0:
+        return pd.DataFrame(columns=columns)
+
+    aspect_codes, aspect_names = pd.factorize(pd.Series(aspects, dtype=object))
+    n_aspects = len(aspect_names)
+    is_neg = np.fromiter(
+        (canonical_sentiment(s) == "NEG" for s in aspect_sentiments),
+        dtype=bool,
+        count=len(row_ids),
+    )
+    cell = strata[sampled_rows[row_ids]] * n_aspects + aspect_codes
+    size = n_strata * n_aspects
+    # Indicator sums per (stratum, aspect): m = aspect mentioned, g = mentioned as NEG.
+    cm = np.bincount(cell, minlength=size).reshape(n_strata, n_aspects)
+    cg = np.bincount(cell[is_neg], minlength=size).reshape(n_strata, n_aspects)
+
+    covered = n_h > 0
+    weight = np.divide(N_h, n_h, out=np.zeros_like(N_h), where=covered)[:, None]
+    fpc = np.where(covered, 1.0 - n_h / N_h.clip(min=1), 1.0)[:, None]
+    n_col = n_h[:, None]
+
+    mentions = (weight * cm).sum(axis=0)
+    neg = (weight * cg).sum(axis=0)
+    ratio = np.divide(neg, mentions, out=np.zeros_like(neg), where=mentions > 0)
+
+    def stratum_variance(sum_x: np.ndarray, sum_x2: np.ndarray) -> np.ndarray:
+        # Sample variance per stratum; strata with < 2 sampled rows get the
+        # worst case for a {0, 1} indicator.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            var = (sum_x2 - sum_x**2 / n_col) / (n_col - 1)
+        return np.where(n_col >= 2, np.maximum(var, 0.0), 0.25)
+
+    n_eff = np.maximum(n_col, 1.0)
+    var_m = stratum_variance(cm, cm)
+    mentions_se = np.sqrt(((N_h[:, None] ** 2) * fpc * var_m / n_eff).sum(axis=0))
+
+    # Linearised ratio residual d = g - R m, using g*m = g and m*m = m.
+    sum_d = cg - ratio * cm
+    sum_d2 = cg * (1 - 2 * ratio) + ratio**2 * cm
+    var_d = stratum_variance(sum_d, sum_d2)
+    ratio_var = ((N_h[:, None] ** 2) * fpc * var_d / n_eff).sum(axis=0)
+    ratio_se = np.sqrt(
+        np.divide(ratio_var, mentions**2, out=np.full_like(ratio_var, np.inf), where=mentions > 0)
+    )
+
+    return pd.DataFrame(
+        {
+            "aspect": np.asarray(aspect_names, dtype=object),
+            "mentions": mentions,
+            "mentions_low": np.maximum(mentions - z * mentions_se, 0.0),
+            "mentions_high": mentions + z * mentions_se,
+            "neg_ratio": ratio,
+            "neg_ratio_low": np.clip(ratio - z * ratio_se, 0.0, 1.0),
+            "neg_ratio_high": np.clip(ratio + z * ratio_se, 0.0, 1.0),
+            "sampled_mentions": cm.sum(axis=0),
+        }
+    )[columns]
+
+
+def priority_ranking(estimates: pd.DataFrame) -> pd.DataFrame:
+    """
+    Điểm ưu tiên giống Action Center (0.7·tỉ lệ NEG + 0.3·lượt nhắc chuẩn
+    hoá) kèm cận dưới/trên suy từ khoảng tin cậy, sắp xếp giảm dần.
+    """
+
+    ranked = estimates.copy()
+    max_mentions = ranked["mentions"].max() if len(ranked) else 0.0
+    scale = max_mentions if max_mentions > 0 else 1.0
+    for suffix, ratio, mentions in [
+        ("", "neg_ratio", "mentions"),
+        ("_low", "neg_ratio_low", "mentions_low"),
+        ("_high", "neg_ratio_high", "mentions_high"),
+    ]:
+        ranked[f"priority_score{suffix}"] = 0.7 * ranked[ratio] + 0.3 * (
+            ranked[mentions] / scale
+        ).clip(upper=1.0)
+    return ranked.sort_values("priority_score", ascending=False).reset_index(drop=True)
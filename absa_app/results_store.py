@@ -0,0 +1,214 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import pandas as pd
+
+from analytics import canonical_sentiment
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    source_name TEXT,
+    text_column TEXT,
+    n_reviews INTEGER NOT NULL DEFAULT 0,
+    model_version TEXT
+);
+CREATE TABLE IF NOT EXISTS reviews (
+    run_id TEXT NOT NULL,
+    review_id INTEGER NOT NULL,
+    text TEXT,
+    sentiment_label TEXT,
+    sentiment_score REAL,
+    PRIMARY KEY (run_id, review_id)
+);
+CREATE TABLE IF NOT EXISTS aspects (
+    run_id TEXT NOT NULL,
+    review_id INTEGER NOT NULL,
+    aspect TEXT NOT NULL,
+    aspect_score REAL,
+    sentiment TEXT NOT NULL,
+    sentiment_score REAL,
+    weight REAL
+);
+CREATE INDEX IF NOT EXISTS idx_reviews_run_sentiment ON reviews (run_id, sentiment_label);
+CREATE INDEX IF NOT EXISTS idx_aspects_run_aspect ON aspects (run_id, aspect, sentiment, weight);
+CREATE INDEX IF NOT EXISTS idx_aspects_run_sentiment ON aspects (run_id, sentiment);
+CREATE INDEX IF NOT EXISTS idx_aspects_aspect_sentiment ON aspects (aspect, sentiment);
+"""
+
+# Rows per executemany call; keeps peak memory flat on multi-million-row runs.
+INSERT_CHUNK = 50_000
+
+
+def _chunks(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ResultsStore:
+    """
+    Kho kết quả SQLite cục bộ: mỗi lần phân tích file là một `run`.
+    Review và aspect được ghi theo lô trong một transaction; Dashboard và
+    Action Center truy vấn tổng hợp trực tiếp bằng SQL thay vì giữ mọi thứ
+    trong pandas, nên nhiều run có thể so sánh song song.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path or Path(__file__).resolve().parent / "data" / "results.sqlite"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            run_columns = {row[1] for row in conn.execute("PRAGMA table_info(runs)")}
+            if "model_version" not in run_columns:
+                # Stores created before model versions were recorded.
+                conn.execute("ALTER TABLE runs ADD COLUMN model_version TEXT")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _query(self, sql: str, params: Sequence[object] = ()) -> pd.DataFrame:
+        with self._connect() as conn:
+            return pd.read_sql_query(sql, conn, params=list(params))
+
+    def write_run(
+        self,
+        run_id: str,
+        texts: Sequence[object],
+        sentiment_labels: Sequence[Optional[str]],
+        sentiment_scores: Sequence[Optional[float]],
+        row_ids: Sequence[int],
+        aspects: Sequence[str],
+        aspect_scores: Sequence[float],
+        aspect_sentiments: Sequence[Optional[str]],
+        aspect_sentiment_scores: Sequence[Optional[float]],
+        source_name: Optional[str] = None,
+        text_column: Optional[str] = None,
+        model_version: Optional[str] = None,
+    ) -> None:
+        review_rows = (
+            (
+                run_id,
+                review_id,
+                None if text is None else str(text),
+                label,
+                None if score is None or pd.isna(score) else float(score),
+            )
+            for review_id, (text, label, score) in enumerate(
+                zip(texts, sentiment_labels, sentiment_scores)
+            )
+        )
+        aspect_rows = (
+            (
+                run_id,
+                int(review_id),
+                aspect,
+                float(aspect_score),
+                canonical_sentiment(sentiment),
+                sentiment_score,
+                float(aspect_score) * (sentiment_score or 0.0),
+            )
+            for review_id, aspect, aspect_score, sentiment, sentiment_score in zip(
+                row_ids, aspects, aspect_scores, aspect_sentiments, aspect_sentiment_scores
+            )
+        )
+
+        with self._write_lock, self._connect() as conn:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO runs "
+                    "(run_id, created_at, source_name, text_column, n_reviews, model_version) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        run_id,
+                        datetime.now().isoformat(timespec="seconds"),
+                        source_name,
+                        text_column,
+                        len(texts),
+                        model_version,
+                    ),
+                )
+                conn.execute("DELETE FROM reviews WHERE run_id = ?", (run_id,))
+                conn.execute("DELETE FROM aspects WHERE run_id = ?", (run_id,))
+                for chunk in _chunks(review_rows, INSERT_CHUNK):
+                    conn.executemany(
+                        "INSERT INTO reviews VALUES (?, ?, ?, ?, ?)", chunk
+                    )
+                for chunk in _chunks(aspect_rows, INSERT_CHUNK):
+                    conn.executemany(
+                        "INSERT INTO aspects VALUES (?, ?, ?, ?, ?, ?, ?)", chunk
+                    )
+
+    def delete_run(self, run_id: str) -> None:
+        with self._write_lock, self._connect() as conn:
+            with conn:
+                for table in ("runs", "reviews", "aspects"):
+                    conn.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+
+    def list_runs(self) -> pd.DataFrame:
+        return self._query(
+            "SELECT run_id, created_at, source_name, text_column, n_reviews, model_version "
+            "FROM runs ORDER BY created_at DESC"
+        )
+
+    def version(self) -> float:
+        """
+        Dấu thời gian sửa file (kể cả WAL), dùng làm khoá cache cho giao diện.
+        """
+
+        wal = self.path.with_name(self.path.name + "-wal")
+        return max(
+            (p.stat().st_mtime for p in (self.path, wal) if p.exists()), default=0.0
+        )
+
+    def sentiment_counts(self, run_ids: Sequence[str]) -> pd.DataFrame:
+        placeholders = ", ".join("?" for _ in run_ids)
+        return self._query(
+            "SELECT run_id, sentiment_label AS sentiment, COUNT(*) AS count "
+            f"FROM reviews WHERE run_id IN ({placeholders}) "
+            "GROUP BY run_id, sentiment_label",
+            run_ids,
+        )
+
+    def aspect_stats(self, run_ids: Sequence[str]) -> pd.DataFrame:
+        """
+        Số lượt nhắc, số NEG/POS và confidence trung bình theo run × aspect.
+        """
+
+        placeholders = ", ".join("?" for _ in run_ids)
+        return self._query(
+            "SELECT run_id, aspect, COUNT(*) AS mentions, "
+            "SUM(sentiment = 'NEG') AS neg, SUM(sentiment = 'POS') AS pos, "
+            "AVG(COALESCE(sentiment_score, 0)) AS avg_score "
+            f"FROM aspects WHERE run_id IN ({placeholders}) "
+            "GROUP BY run_id, aspect",
+            run_ids,
+        )
+
+    def exemplar_texts(
+        self, run_id: str, aspect: str, sentiment: str, k: int = 3
+    ) -> List[str]:
+        rows = self._query(
+            "SELECT r.text FROM aspects a "
+            "JOIN reviews r ON r.run_id = a.run_id AND r.review_id = a.review_id "
+            "WHERE a.run_id = ? AND a.aspect = ? AND a.sentiment = ? "
+            "ORDER BY a.weight DESC LIMIT ?",
+            (run_id, aspect, canonical_sentiment(sentiment), k),
+        )
+        return rows["text"].tolist()
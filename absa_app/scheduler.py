@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+# Bulk batches stay capped this long after the last interactive request.
+INTERACTIVE_WINDOW_SECONDS = 30.0
+# Share of the latency target one bulk batch may take while capped.
+BULK_SHARE_OF_TARGET = 0.5
+
+
+@dataclass
+class LaneStats:
+    waiting: int = 0
+    served: int = 0
+    rows: int = 0
+    # (wait, service) seconds of the most recent requests.
+    recent: Deque[tuple] = field(default_factory=lambda: deque(maxlen=1000))
+
+
+class PriorityScheduler:
+    """
+    Cổng cho mô hình dùng chung với hai làn: request `interactive` (một câu từ
+    tab phân tích câu) chạy độc quyền và luôn được vào trước mọi batch `bulk`
+    đang chờ, nên chỉ phải đợi các batch bulk đang chạy xong. Các batch bulk
+    cùng một `job` (một lần phân tích) chạy đồng thời được, nên các stage của
+    pipeline (aspect/sentiment forward trên các luồng riêng) vẫn chồng lên
+    nhau; batch của job khác chờ tới lượt như trước. Trong khoảng
+    `INTERACTIVE_WINDOW_SECONDS` sau một request interactive, `bulk_row_cap`
+    giới hạn số câu mỗi batch bulk để một batch chỉ chiếm một phần
+    `latency_target`; ngoài khoảng đó bulk chạy batch lớn như bình thường.
+    Công việc vẫn chạy trên luồng gọi, nên trạng thái theo luồng (ví dụ
+    `ABSAService.pinned`) không đổi.
+    """
+
+    def __init__(self, latency_target: float = 0.5, history: int = 1000) -> None:
+        self.latency_target = latency_target
+        self._cond = threading.Condition()
+        self._interactive_busy = False
+        self._bulk_active = 0
+        self._bulk_job: object = None
+        self._held = threading.local()
+        self._lanes: Dict[str, LaneStats] = {
+            lane: LaneStats(recent=deque(maxlen=history)) for lane in LANES
+        }
+        self._last_interactive = float("-inf")
+        # EMA of bulk service seconds per row.
+        self._seconds_per_row: Optional[float] = None
+
+    @contextmanager
+    def slot(self, lane: str, rows: int = 1, job: object = None) -> Iterator[None]:
+        """
+        Giữ mô hình cho một request (`interactive`, độc quyền) hoặc một batch
+        (`bulk`, chạy cùng các batch bulk khác của `job`; `None` là một job
+        riêng). Gọi lồng nhau trong cùng luồng không phải chờ lại.
+        """
+
+        if getattr(self._held, "lane", None) is not None:
+            yield
+            return
+
+        stats = self._lanes[lane]
+        job = job if job is not None else object()
+        queued = time.perf_counter()
+        with self._cond:
+            stats.waiting += 1
+            if lane == INTERACTIVE:
+                self._last_interactive = queued
+                while self._interactive_busy or self._bulk_active:
+                    self._cond.wait()
+                self._interactive_busy = True
+            else:
+                while (
+                    self._interactive_busy
+                    or self._lanes[INTERACTIVE].waiting > 0
+                    or (self._bulk_active and self._bulk_job is not job)
+                ):
+                    self._cond.wait()
+                self._bulk_active += 1
+                self._bulk_job = job
+            stats.waiting -= 1
+
+        started = time.perf_counter()
+        self._held.lane = lane
+        try:
+            yield
+        finally:
+            self._held.lane = None
+            finished = time.perf_counter()
+            with self._cond:
+                if lane == INTERACTIVE:
+                    self._interactive_busy = False
+                else:
+                    self._bulk_active -= 1
+                stats.served += 1
+                stats.rows += rows
+                stats.recent.append((started - queued, finished - started))
+                if lane == BULK and rows > 0:
+                    per_row = (finished - started) / rows
+                    self._seconds_per_row = (
+                        per_row
+                        if self._seconds_per_row is None
+                        else 0.8 * self._seconds_per_row + 0.2 * per_row
+                    )
+                self._cond.notify_all()
+
+    def yield_to_interactive(self) -> None:
+        """
+        Chờ cho tới khi không còn request interactive nào đang chạy hay đang
+        chờ, nhưng không giữ chỗ: dùng giữa các đoạn việc chỉ tốn CPU (như
+        tokenize) để chúng không tranh GIL với một request interactive mà vẫn
+        chạy song song với batch bulk.
+        """
+
+        if getattr(self._held, "lane", None) is not None:
+            return
+        with self._cond:
+            while self._interactive_busy or self._lanes[INTERACTIVE].waiting > 0:
+                self._cond.wait()
+
+    def bulk_row_cap(self) -> Optional[int]:
+        """
+        Số câu tối đa cho batch bulk kế tiếp, `None` khi không cần giới hạn.
+        """
+
+        if self._seconds_per_row is None:
+            return None
+        if time.perf_counter() - self._last_interactive > INTERACTIVE_WINDOW_SECONDS:
+            return None
+        budget = self.latency_target * BULK_SHARE_OF_TARGET
+        return max(1, int(budget / max(self._seconds_per_row, 1e-9)))
+
+    def queue_depths(self) -> Dict[str, int]:
+        with self._cond:
+            return {lane: stats.waiting for lane, stats in self._lanes.items()}
+
+    def stats(self) -> pd.DataFrame:
+        """
+        Độ sâu hàng đợi và độ trễ (chờ / tổng, ms) gần đây của từng làn;
+        `within_target` là tỉ lệ request interactive xong trong `latency_target`.
+        """
+
+        rows = []
+        with self._cond:
+            snapshot = {
+                lane: (stats.waiting, stats.served, stats.rows, list(stats.recent))
+                for lane, stats in self._lanes.items()
+            }
+        for lane, (waiting, served, n_rows, recent) in snapshot.items():
+            waits = np.asarray([w for w, _ in recent]) * 1000
+            totals = np.asarray([w + s for w, s in recent]) * 1000
+            has_data = len(recent) > 0
+            rows.append(
+                {
+                    "lane": lane,
+                    "waiting": waiting,
+                    "served": served,
+                    "rows": n_rows,
+                    "wait_p50_ms": float(np.percentile(waits, 50)) if has_data else np.nan,
+                    "wait_p95_ms": float(np.percentile(waits, 95)) if has_data else np.nan,
+                    "latency_p50_ms": float(np.percentile(totals, 50)) if has_data else np.nan,
+                    "latency_p95_ms": float(np.percentile(totals, 95)) if has_data else np.nan,
+                    "within_target": float(
+                        np.mean(totals <= self.latency_target * 1000)
+                    )
+                    if has_data and lane == INTERACTIVE
+                    else np.nan,
+                }
+            )
+        return pd.DataFrame(rows)
@@ -0,0 +1,104 @@
+"""
+Tạo cặp mô hình aspect/sentiment rất nhỏ (khởi tạo ngẫu nhiên) có cùng định
+dạng thư mục `models/` với mô hình thật, để chạy load test, benchmark hay thử
+chế độ phân tán trên máy không có checkpoint đã fine-tune.
+
+    python stand_in_models.py /tmp/absa_stand_in
+"""
+
+import sys
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+ASPECT_LABELS = [
+    "BATTERY",
+    "CAMERA",
+    "DESIGN",
+    "FEATURES",
+    "GENERAL",
+    "PERFORMANCE",
+    "PRICE",
+    "SCREEN",
+    "SER&ACC",
+    "STORAGE",
+]
+SENTIMENT_LABELS = ["NEG", "NEU", "POS"]
+
+
+def _corpus() -> List[str]:
+    sample_path = Path(__file__).resolve().parent / "sample_reviews.csv"
+    texts = pd.read_csv(sample_path)["text"].dropna().astype(str).tolist()
+    return texts + ["aspect: text:"] + ASPECT_LABELS
+
+
+def build_stand_in_models(
+    target: Path,
+    corpus: Optional[Iterable[str]] = None,
+    hidden_size: int = 32,
+    num_layers: int = 2,
+    seed: int = 0,
+) -> Path:
+    """
+    Ghi `target/models/aspect` và `target/models/sentiment`, trả về `target`
+    (dùng làm `base_dir` cho `ABSAService`). Bỏ qua nếu đã tồn tại.
+    """
+
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors, trainers
+    from transformers import (
+        BertConfig,
+        BertForSequenceClassification,
+        PreTrainedTokenizerFast,
+    )
+
+    models_root = target / "models"
+    if (models_root / "aspect").exists() and (models_root / "sentiment").exists():
+        return target
+
+    tokenizer = Tokenizer(models.WordLevel(unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.train_from_iterator(
+        list(corpus or _corpus()),
+        trainers.WordLevelTrainer(special_tokens=["[PAD]", "[UNK]", "[CLS]", "[SEP]"]),
+    )
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]",
+        special_tokens=[("[CLS]", 2), ("[SEP]", 3)],
+    )
+    fast_tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        unk_token="[UNK]",
+        pad_token="[PAD]",
+        cls_token="[CLS]",
+        sep_token="[SEP]",
+    )
+
+    torch.manual_seed(seed)
+    for name, labels, problem_type in [
+        ("aspect", ASPECT_LABELS, "multi_label_classification"),
+        ("sentiment", SENTIMENT_LABELS, "single_label_classification"),
+    ]:
+        config = BertConfig(
+            vocab_size=fast_tokenizer.vocab_size,
+            hidden_size=hidden_size,
+            num_hidden_layers=num_layers,
+            num_attention_heads=2,
+            intermediate_size=hidden_size * 2,
+            initializer_range=0.5,
+            num_labels=len(labels),
+            id2label=dict(enumerate(labels)),
+            label2id={label: idx for idx, label in enumerate(labels)},
+            problem_type=problem_type,
+        )
+        model_dir = models_root / name
+        BertForSequenceClassification(config).save_pretrained(model_dir)
+        fast_tokenizer.save_pretrained(model_dir)
+    return target
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: python stand_in_models.py <target_dir>")
+    print(build_stand_in_models(Path(sys.argv[1])))
@@ -0,0 +1,297 @@
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analytics import canonical_sentiment
+
+# Vietnamese is written one syllable per space-separated unit, so a word token
+# here is a syllable; multi-syllable words are matched through syllable bigrams.
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def fold_diacritics(token: str) -> str:
+    """
+    Bỏ dấu tiếng Việt ("chống" -> "chong", "đ" -> "d") để khớp truy vấn gõ không dấu.
+    """
+
+    token = token.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", token)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: object) -> List[str]:
+    return _TOKEN.findall(unicodedata.normalize("NFC", str(text)).lower())
+
+
+def intersect_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Giao hai mảng đã sắp xếp, không trùng; tra phần tử của mảng ngắn trong
+    mảng dài bằng tìm kiếm nhị phân nên chi phí là O(ngắn · log dài).
+    """
+
+    if len(a) > len(b):
+        a, b = b, a
+    if not len(a):
+        return a
+    pos = np.searchsorted(b, a)
+    pos[pos == len(b)] = 0
+    return a[b[pos] == a]
+
+
+@dataclass
+class PostingLists:
+    """
+    Danh sách review (int32, tăng dần, không trùng) của mọi khoá nằm chung
+    trong một mảng `rows`; khoá `code` chiếm `rows[offsets[code]:offsets[code + 1]]`.
+    """
+
+    rows: np.ndarray
+    offsets: np.ndarray
+
+    @classmethod
+    def from_pairs(cls, keys: np.ndarray, rows: np.ndarray, n_keys: int) -> "PostingLists":
+        """
+        Gom các cặp (khoá, review); `rows` phải không giảm trong từng khoá
+        (đúng với thứ tự đọc văn bản), nên chỉ cần một lần sắp xếp ổn định.
+        """
+
+        order = np.argsort(keys, kind="stable")
+        keys, rows = keys[order], rows[order]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])
+        offsets = np.zeros(n_keys + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys[keep], minlength=n_keys), out=offsets[1:])
+        return cls(rows=rows[keep].astype(np.int32), offsets=offsets)
+
+    def get(self, code: Optional[int]) -> np.ndarray:
+        if code is None:
+            return self.rows[:0]
+        return self.rows[self.offsets[code] : self.offsets[code + 1]]
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + self.offsets.nbytes
+
+
+FacetKey = Tuple[Optional[str], Optional[str]]
+
+
+@dataclass
+class TextIndex:
+    """
+    Chỉ mục đảo trên cột văn bản của kết quả phân tích. Mỗi âm tiết (chữ
+    thường, NFC) có danh sách review ở dạng giữ dấu (`exact`) và bỏ dấu
+    (`folded`); mỗi cặp âm tiết liền nhau đã bỏ dấu có danh sách trong
+    `bigrams`, nên cụm từ nhiều âm tiết như "chống rung" được khớp mà không
+    phải đọc lại văn bản. Bộ lọc aspect/sentiment lưu cùng dạng trong
+    `facets`; mỗi truy vấn chỉ là vài phép giao mảng đã sắp xếp.
+    """
+
+    texts: List[str]
+    vocabulary: Dict[str, int]
+    folded_vocabulary: Dict[str, int]
+    # Sorted `first * len(folded_vocabulary) + second` folded codes.
+    bigram_keys: np.ndarray
+    exact: PostingLists
+    folded: PostingLists
+    bigrams: PostingLists
+    facets: PostingLists
+    facet_codes: Dict[FacetKey, int] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            lists.nbytes for lists in (self.exact, self.folded, self.bigrams, self.facets)
+        ) + self.bigram_keys.nbytes
+
+    @classmethod
+    def build(
+        cls,
+        texts: Sequence[str],
+        row_ids: Sequence[int],
+        aspects: Sequence[str],
+        aspect_sentiments: Sequence[Optional[str]],
+        overall_sentiments: Sequence[Optional[str]],
+    ) -> "TextIndex":
+        """
+        Dựng chỉ mục từ văn bản và các mảng phẳng review × aspect của
+        `BatchResult` (cùng dạng với `ExemplarIndex.from_arrays`).
+        """
+
+        series = pd.Series(texts, dtype=object).fillna("").astype(str)
+        tokens = series.str.normalize("NFC").str.lower().str.findall(_TOKEN).explode().dropna()
+        rows = tokens.index.to_numpy(dtype=np.int64)
+        codes, vocabulary = pd.factorize(tokens.to_numpy(dtype=object))
+        fold_of_code, folded_vocabulary = pd.factorize(
+            np.array([fold_diacritics(token) for token in vocabulary], dtype=object)
+        )
+        folded_codes = fold_of_code[codes]
+
+        # Adjacent syllables of the same review.
+        same_row = rows[1:] == rows[:-1]
+        pair_keys = (
+            folded_codes[:-1][same_row].astype(np.int64) * len(folded_vocabulary)
+            + folded_codes[1:][same_row]
+        )
+        bigram_keys, bigram_codes = np.unique(pair_keys, return_inverse=True)
+
+        facet_keys, facet_rows, facet_codes = cls._facet_pairs(
+            len(series), row_ids, aspects, aspect_sentiments, overall_sentiments
+        )
+        return cls(
+            texts=series.tolist(),
+            vocabulary={token: code for code, token in enumerate(vocabulary)},
+            folded_vocabulary={token: code for code, token in enumerate(folded_vocabulary)},
+            bigram_keys=bigram_keys,
+            exact=PostingLists.from_pairs(codes, rows, len(vocabulary)),
+            folded=PostingLists.from_pairs(folded_codes, rows, len(folded_vocabulary)),
+            bigrams=PostingLists.from_pairs(bigram_codes, rows[1:][same_row], len(bigram_keys)),
+            facets=PostingLists.from_pairs(facet_keys, facet_rows, len(facet_codes)),
+            facet_codes=facet_codes,
+        )
+
+    @classmethod
+    def from_frame(cls, analysis_df: pd.DataFrame, text_column: str) -> "TextIndex":
+        """
+        Dựng lại chỉ mục từ bảng kết quả (dùng khi session cũ chưa có chỉ mục).
+        """
+
+        details = analysis_df["aspects_detail"].map(
+            lambda d: d if isinstance(d, list) else []
+        )
+        flat = [d for items in details for d in items]
+        return cls.build(
+            analysis_df[text_column].tolist(),
+            row_ids=np.repeat(np.arange(len(analysis_df)), details.map(len).to_numpy()),
+            aspects=[d.get("aspect") for d in flat],
+            aspect_sentiments=[d.get("sentiment") for d in flat],
+            overall_sentiments=analysis_df["sentiment_label"].tolist(),
+        )
+
+    @staticmethod
+    def _facet_pairs(
+        n_rows: int,
+        row_ids: Sequence[int],
+        aspects: Sequence[str],
+        aspect_sentiments: Sequence[Optional[str]],
+        overall_sentiments: Sequence[Optional[str]],
+    ) -> Tuple[np.ndarray, np.ndarray, Dict[FacetKey, int]]:
+        # Keys: (aspect, aspect sentiment), (aspect, None) and (None, overall sentiment).
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        keys = (
+            list(zip(aspects, (canonical_sentiment(s) for s in aspect_sentiments)))
+            + [(aspect, None) for aspect in aspects]
+            + [(None, canonical_sentiment(s)) for s in overall_sentiments]
+        )
+        facet_codes: Dict[FacetKey, int] = {}
+        codes = np.fromiter(
+            (facet_codes.setdefault(key, len(facet_codes)) for key in keys),
+            dtype=np.int64,
+            count=len(keys),
+        )
+        rows = np.concatenate([row_ids, row_ids, np.arange(n_rows, dtype=np.int64)])
+        return codes, rows, facet_codes
+
+    def syllable_rows(self, syllable: str) -> np.ndarray:
+        """
+        Review chứa âm tiết `syllable`; âm tiết gõ không dấu khớp mọi dạng có dấu.
+        """
+
+        if syllable == fold_diacritics(syllable):
+            return self.folded.get(self.folded_vocabulary.get(syllable))
+        return self.exact.get(self.vocabulary.get(syllable))
+
+    def phrase_rows(self, phrase: Sequence[str]) -> List[np.ndarray]:
+        """
+        Các danh sách cần giao để khớp cụm âm tiết liền nhau `phrase`: từng
+        âm tiết và từng cặp âm tiết kề nhau (đã bỏ dấu).
+        """
+
+        lists = [self.syllable_rows(syllable) for syllable in phrase]
+        n_folded = len(self.folded_vocabulary)
+        for first, second in zip(phrase[:-1], phrase[1:]):
+            a = self.folded_vocabulary.get(fold_diacritics(first))
+            b = self.folded_vocabulary.get(fold_diacritics(second))
+            code = None
+            if a is not None and b is not None:
+                key = a * n_folded + b
+                pos = int(np.searchsorted(self.bigram_keys, key))
+                if pos < len(self.bigram_keys) and self.bigram_keys[pos] == key:
+                    code = pos
+            lists.append(self.bigrams.get(code))
+        return lists
+
+    def facet(
+        self, aspect: Optional[str] = None, sentiment: Optional[str] = None
+    ) -> np.ndarray:
+        key = (aspect, canonical_sentiment(sentiment) if sentiment else None)
+        return self.facets.get(self.facet_codes.get(key))
+
+    def _verify_phrase(self, rows: np.ndarray, phrase: List[str]) -> np.ndarray:
+        # Bigrams are stored folded and only guarantee pairwise adjacency, so
+        # phrases of 3+ syllables or with an accented syllable are checked
+        # against the (already few) candidate texts.
+        folded = [syllable == fold_diacritics(syllable) for syllable in phrase]
+        width = len(phrase)
+
+        def matches(tokens: List[str]) -> bool:
+            return any(
+                all(
+                    (fold_diacritics(tokens[start + j]) if folded[j] else tokens[start + j])
+                    == phrase[j]
+                    for j in range(width)
+                )
+                for start in range(len(tokens) - width + 1)
+            )
+
+        keep = [matches(tokenize(self.texts[row])) for row in rows.tolist()]
+        return rows[np.asarray(keep, dtype=bool)]
+
+    def search(
+        self,
+        query: str = "",
+        aspect: Optional[str] = None,
+        sentiment: Optional[str] = None,
+    ) -> np.ndarray:
+        """
+        Vị trí (tăng dần) các review khớp mọi cụm trong `query` (các cụm
+        ngăn bởi dấu phẩy; âm tiết trong một cụm phải đứng liền nhau), thuộc
+        `aspect` và có `sentiment` (sentiment của aspect đó nếu có `aspect`,
+        ngược lại là sentiment tổng thể).
+        """
+
+        candidates: List[np.ndarray] = []
+        verify: List[List[str]] = []
+        for part in query.split(","):
+            phrase = tokenize(part)
+            if phrase:
+                candidates.extend(self.phrase_rows(phrase))
+            # An accented syllable is only matched exactly on its own list;
+            # the folded bigram would let "chống rung" match "chông rung".
+            if len(phrase) > 2 or (
+                len(phrase) == 2
+                and any(syllable != fold_diacritics(syllable) for syllable in phrase)
+            ):
+                verify.append(phrase)
+        if aspect or sentiment:
+            candidates.append(self.facet(aspect, sentiment))
+        if not candidates:
+            return np.arange(len(self.texts), dtype=np.int32)
+
+        # Smallest list first keeps every intermediate result small.
+        candidates.sort(key=len)
+        rows = candidates[0]
+        for other in candidates[1:]:
+            if not len(rows):
+                break
+            rows = intersect_sorted(rows, other)
+        for phrase in verify:
+            rows = self._verify_phrase(rows, phrase)
+        return rows
@@ -0,0 +1,137 @@
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analytics import canonical_sentiment, parse_review_dates
+
+# Pseudo-aspect used for review-level (overall) sentiment rows.
+ALL_ASPECTS = "*"
+
+AGGREGATE_COLUMNS = ["run_id", "period", "aspect", "sentiment", "count", "score_sum"]
+
+
+def build_daily_aggregates(
+    review_dates: Sequence[object],
+    review_sentiments: Sequence[Optional[str]],
+    review_scores: Sequence[Optional[float]],
+    row_ids: Sequence[int],
+    aspects: Sequence[str],
+    aspect_sentiments: Sequence[Optional[str]],
+    aspect_scores: Sequence[Optional[float]],
+    run_id: str,
+    date_format: Optional[str] = None,
+    dayfirst: bool = True,
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Gom kết quả một lần phân tích thành bảng ngày × aspect × sentiment; dòng
+    aspect "*" là sentiment tổng thể. Ngày được đọc bằng `parse_review_dates`
+    (`date_format`/`dayfirst`). Review không có ngày hợp lệ không vào bảng và
+    được trả về dưới dạng số dòng có ngày không đọc được.
+    """
+
+    dates, unparsed = parse_review_dates(review_dates, date_format, dayfirst)
+    dates = dates.dt.floor("D").to_numpy()
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+
+    overall = pd.DataFrame(
+        {
+            "period": dates,
+            "aspect": ALL_ASPECTS,
+            "sentiment": [canonical_sentiment(s) for s in review_sentiments],
+            "score": pd.to_numeric(pd.Series(review_scores), errors="coerce").to_numpy(),
+        }
+    )
+    per_aspect = pd.DataFrame(
+        {
+            "period": dates[row_ids] if row_ids.size else dates[:0],
+            "aspect": list(aspects),
+            "sentiment": [canonical_sentiment(s) for s in aspect_sentiments],
+            "score": pd.to_numeric(pd.Series(aspect_scores), errors="coerce").to_numpy(),
+        }
+    )
+    combined = pd.concat([overall, per_aspect], ignore_index=True)
+    combined = combined.dropna(subset=["period"])
+    if combined.empty:
+        return pd.DataFrame(columns=AGGREGATE_COLUMNS), unparsed
+
+    aggregated = (
+        combined.groupby(["period", "aspect", "sentiment"])
+        .agg(count=("sentiment", "size"), score_sum=("score", "sum"))
+        .reset_index()
+    )
+    aggregated.insert(0, "run_id", run_id)
+    return aggregated[AGGREGATE_COLUMNS], unparsed
+
+
+class TrendStore:
+    """
+    Kho tổng hợp theo ngày, chỉ ghi nối (append-only) vào một file CSV nhỏ.
+    Mỗi lần upload chỉ thêm các dòng tổng hợp mới; biểu đồ xu hướng đọc
+    đúng các dòng này và cuộn lên tuần/tháng khi cần, không quét lại review gốc.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path or Path(__file__).resolve().parent / "data" / "trends.csv"
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_run_id() -> str:
+        return datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+    def append(self, aggregates: pd.DataFrame) -> int:
+        if aggregates.empty:
+            return 0
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            write_header = not self.path.exists()
+            aggregates[AGGREGATE_COLUMNS].to_csv(
+                self.path,
+                mode="a",
+                header=write_header,
+                index=False,
+                date_format="%Y-%m-%d",
+            )
+        return len(aggregates)
+
+    def load(self) -> pd.DataFrame:
+        if not self.path.exists():
+            return pd.DataFrame(columns=AGGREGATE_COLUMNS)
+        data = pd.read_csv(self.path, parse_dates=["period"])
+        return data
+
+    def version(self) -> float:
+        """
+        Dấu thời gian sửa file, dùng làm khoá cache cho giao diện.
+        """
+
+        return self.path.stat().st_mtime if self.path.exists() else 0.0
+
+    def trend(self, freq: str = "W") -> pd.DataFrame:
+        """
+        Tỉ lệ NEG theo kỳ (`D`, `W` hoặc `M`) cho từng aspect và tổng thể.
+        """
+
+        data = self.load()
+        if data.empty:
+            return pd.DataFrame(
+                columns=["period", "aspect", "mentions", "neg", "neg_ratio", "avg_score"]
+            )
+
+        data["period"] = data["period"].dt.to_period(freq).dt.start_time
+        data["neg"] = np.where(data["sentiment"] == "NEG", data["count"], 0)
+        rolled = (
+            data.groupby(["period", "aspect"])
+            .agg(
+                mentions=("count", "sum"),
+                neg=("neg", "sum"),
+                score_sum=("score_sum", "sum"),
+            )
+            .reset_index()
+        )
+        rolled["neg_ratio"] = rolled["neg"] / rolled["mentions"]
+        rolled["avg_score"] = rolled["score_sum"] / rolled["mentions"]
+        return rolled.drop(columns=["score_sum"]).sort_values("period")
@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from model_service import ABSAService, BatchOptions, BatchResult
+
+EMPTY = "empty"
+TRIVIAL = "trivial"
+LONG = "long"
+NORMAL = "normal"
+CATEGORIES = (EMPTY, TRIVIAL, LONG, NORMAL)
+
+# Long rows are truncated to MAX_LENGTH tokens anyway; small batches keep them
+# from inflating the padded width and memory of the normal batches.
+LONG_BATCH_SIZE = 4
+
+
+@dataclass
+class TriageResult:
+    """
+    Nhãn phân loại cho từng dòng trước khi inference.
+    """
+
+    category: np.ndarray
+
+    def rows(self, category: str) -> np.ndarray:
+        return np.flatnonzero(self.category == category)
+
+    def counts(self) -> Dict[str, int]:
+        return {name: int((self.category == name).sum()) for name in CATEGORIES}
+
+    @property
+    def skipped(self) -> np.ndarray:
+        return np.isin(self.category, [EMPTY, TRIVIAL])
+
+
+def triage_texts(
+    texts: Sequence[object],
+    min_word_chars: int = 2,
+    long_chars: int = 2000,
+) -> TriageResult:
+    """
+    Phân loại theo luật, vector hoá trên cả cột:
+    - `empty`: rỗng hoặc chỉ có khoảng trắng;
+    - `trivial`: ít hơn `min_word_chars` ký tự chữ/số (emoji, dấu câu, 1 ký tự);
+    - `long`: dài hơn `long_chars` ký tự, đi đường xử lý riêng;
+    - `normal`: còn lại.
+    """
+
+    series = pd.Series(texts, dtype=object).fillna("").astype(str)
+    empty = series.str.strip().eq("").to_numpy()
+    trivial = ~empty & (series.str.count(r"\w") < min_word_chars).to_numpy()
+    long = ~empty & ~trivial & (series.str.len() > long_chars).to_numpy()
+    category = np.select([empty, trivial, long], [EMPTY, TRIVIAL, LONG], default=NORMAL)
+    return TriageResult(category=category.astype(object))
+
+
+def analyze_triaged(
+    service: ABSAService,
+    texts: Sequence[str],
+    triage: TriageResult,
+    analyze: Optional[Callable[[List[str]], BatchResult]] = None,
+    options: Optional[BatchOptions] = None,
+) -> BatchResult:
+    """
+    Dòng `empty`/`trivial` nhận kết quả NEU không aspect mà không gọi mô hình,
+    dòng `long` chạy batch nhỏ riêng, dòng `normal` chạy qua `analyze`
+    (mặc định `service.analyze_batch`). Mọi phần dùng cùng một phiên bản mô
+    hình và cùng `options`; kết quả trả về theo thứ tự gốc.
+    """
+
+    texts = [str(t) for t in texts]
+    analyze = analyze or (lambda subset: service.analyze_batch(subset, options=options))
+    parts: List[BatchResult] = []
+    positions: List[np.ndarray] = []
+
+    with service.pinned() as bundle:
+        normal_rows = triage.rows(NORMAL)
+        if normal_rows.size:
+            parts.append(analyze([texts[i] for i in normal_rows]))
+            positions.append(normal_rows)
+        long_rows = triage.rows(LONG)
+        if long_rows.size:
+            parts.append(
+                service.analyze_batch(
+                    [texts[i] for i in long_rows], batch_size=LONG_BATCH_SIZE, options=options
+                )
+            )
+            positions.append(long_rows)
+    skipped_rows = np.flatnonzero(triage.skipped)
+    if skipped_rows.size or not parts:
+        parts.append(
+            BatchResult.constant(
+                [texts[i] for i in skipped_rows],
+                bundle.aspect_names,
+                bundle.sentiment_names,
+                model_version=bundle.version,
+            )
+        )
+        positions.append(skipped_rows)
+
+    merged = BatchResult.concat(parts)
+    order = np.concatenate(positions)
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order))
+    return merged.take(inverse, texts=texts)